@@ -5,12 +5,14 @@ Celery in a single place.
 
 
 from os import environ
+import threading
 
 # -- 3rd party modules -------------------------------------------------------
 from flask import Flask
 
 from . import default_configuration
 from . import celery_init
+from . import service_registry
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 
@@ -30,5 +32,53 @@ if 'VRP_CONFIGURATION' in environ:
 else:
     print("No user-supplied configuration file. Using package defaults.")
 
+# Generation of the configuration, incremented each time it is reloaded so
+# that the responses derived from it are rebuilt.
+_CONFIG_GENERATION = {'value': 0}
+_CONFIG_GENERATION_LOCK = threading.Lock()
+
+
+def get_config_generation():
+    """
+    Get the generation of the configuration.
+    """
+    return _CONFIG_GENERATION['value']
+
+
+# Services compiled from the configuration, validated at startup before
+# anything else is derived from it
+_REGISTRY = {'value': service_registry.ServiceRegistry(
+    APP.config['WORKER_SERVICES'])}
+
 # N.B.: Logs for this function won't work except if initialized before import.
 CELERY_APP = celery_init.configure(APP.config)
+
+
+def get_registry():
+    """
+    Get the registry of the services.
+
+    :returns: :py:class:`~.service_registry.ServiceRegistry`
+    """
+    return _REGISTRY['value']
+
+
+def load_registry(worker_services):
+    """
+    Compile the registry of a new configuration of the services and swap it
+    in, increasing the configuration generation.
+
+    :param worker_services: The new *WORKER_SERVICES* configuration
+                            structure.
+    :returns: The new :py:class:`~.service_registry.ServiceRegistry`
+    :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the
+             configuration is invalid, the current registry being kept.
+    """
+    with _CONFIG_GENERATION_LOCK:
+        generation = _CONFIG_GENERATION['value'] + 1
+        registry = service_registry.ServiceRegistry(worker_services,
+                                                    generation)
+        APP.config['WORKER_SERVICES'] = worker_services
+        _REGISTRY['value'] = registry
+        _CONFIG_GENERATION['value'] = generation
+    return registry
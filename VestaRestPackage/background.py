@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Background workers of the service gateway.
+
+A background worker is a daemon thread calling a function periodically.
+Workers are registered by name so that a given worker runs only once per
+process.
+
+In a process which is about to be forked (see :py:mod:`~.forking`), workers
+are deferred: they are registered without being started, threads not
+surviving a fork, and are started in the forked processes.
+
+A worker started in every gateway process may be given a :py:class:`Lease`
+so that its function is only called by the process holding the lease, e.g.:
+to sweep or dispatch the tasks once per deployment rather than once per
+process.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from uuid import uuid4
+import threading
+import datetime
+import logging
+import socket
+import os
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import DuplicateKeyError
+
+
+class Lease(object):
+    """
+    Lease held by a single process at a time, stored in a MongoDB collection.
+
+    The holder renews the lease each time it acquires it again, other
+    processes acquiring it once it expired, e.g.: when its holder stopped.
+    """
+    def __init__(self, get_collection, name, duration):
+        """
+        :param get_collection: Callable returning the collection of the
+                               leases.
+        :param name: Name of the lease.
+        :param duration: Seconds after which the lease expires unless renewed.
+        """
+        self.get_collection = get_collection
+        self.name = name
+        self.duration = duration
+        self._owner = (None, None)
+
+    @property
+    def owner(self):
+        """
+        Identity of the current process, which changes after a fork.
+        """
+        pid = os.getpid()
+        if self._owner[0] != pid:
+            self._owner = (pid, '{0}:{1}:{2}'.format(socket.gethostname(), pid,
+                                                     uuid4().hex))
+        return self._owner[1]
+
+    def acquire(self):
+        """
+        Acquire or renew the lease.
+
+        :returns: True if the current process holds the lease.
+        """
+        now = datetime.datetime.utcnow()
+        owner = self.owner
+        try:
+            self.get_collection().update_one(
+                {'_id': self.name,
+                 '$or': [{'owner': owner}, {'expires': {'$lte': now}}]},
+                {'$set': {'owner': owner,
+                          'expires': now + datetime.timedelta(
+                              seconds=self.duration)}},
+                upsert=True)
+        except DuplicateKeyError:
+            # Held by another process
+            return False
+        return True
+
+
+class PeriodicWorker(threading.Thread):
+    """
+    Daemon thread calling a function every *interval* seconds until stopped.
+    """
+    def __init__(self, name, interval, function, lease=None):
+        """
+        :param name: Name of the worker.
+        :param interval: Seconds to wait between two calls.
+        :param function: Callable taking no argument.
+        :param lease: :py:class:`Lease` which the process must hold for the
+                      function to be called, None to call it in any case.
+        """
+        super(PeriodicWorker, self).__init__(name=name)
+        self.daemon = True
+        self.interval = interval
+        self.function = function
+        self.lease = lease
+        self._stopped = threading.Event()
+
+    def run(self):
+        logger = logging.getLogger(__name__)
+        logger.info("Starting background worker %s", self.name)
+        while not self._stopped.is_set():
+            try:
+                if self.lease is None or self.lease.acquire():
+                    self.function()
+            except Exception:
+                logger.exception("Background worker %s hit the following "
+                                 "exception", self.name)
+            self._stopped.wait(self.interval)
+        logger.info("Background worker %s stopped", self.name)
+
+    def stop(self):
+        """
+        Ask the worker to stop after its current call.
+        """
+        self._stopped.set()
+
+
+_WORKERS = {}
+_WORKERS_LOCK = threading.Lock()
+_DEFERRED = {'value': False}
+
+
+def start_worker(name, interval, function, lease=None):
+    """
+    Start a background worker unless a worker of that name is running.
+
+    :param name: Name of the worker.
+    :param interval: Seconds to wait between two calls.
+    :param function: Callable taking no argument.
+    :param lease: :py:class:`Lease` which the process must hold for the
+                  function to be called, None to call it in any case.
+    :returns: The running :py:class:`PeriodicWorker` instance.
+    """
+    with _WORKERS_LOCK:
+        worker = _WORKERS.get(name)
+        if _DEFERRED['value']:
+            if worker is None:
+                worker = PeriodicWorker(name, interval, function, lease)
+                _WORKERS[name] = worker
+        elif worker is None or not worker.is_alive():
+            worker = PeriodicWorker(name, interval, function, lease)
+            worker.start()
+            _WORKERS[name] = worker
+        return worker
+
+
+def defer_workers():
+    """
+    Register the workers started from now on without starting them, until
+    :py:func:`start_deferred_workers` is called.
+    """
+    with _WORKERS_LOCK:
+        _DEFERRED['value'] = True
+
+
+def start_deferred_workers():
+    """
+    Start the registered workers in the current process, e.g.: after a fork,
+    whether they were deferred or running in the parent process.
+    """
+    with _WORKERS_LOCK:
+        _DEFERRED['value'] = False
+        for name, worker in list(_WORKERS.items()):
+            if not worker.is_alive():
+                worker = PeriodicWorker(name, worker.interval,
+                                        worker.function, worker.lease)
+                worker.start()
+                _WORKERS[name] = worker
+
+
+def stop_workers():
+    """
+    Stop all the background workers.
+    """
+    with _WORKERS_LOCK:
+        for worker in _WORKERS.values():
+            worker.stop()
+        _WORKERS.clear()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Cached statistics of the broker queues.
+
+The number of messages waiting in a queue and the number of its consumers are
+obtained by a passive declaration of the queue and cached for a few seconds so
+that frequent lookups don't hit the broker every time.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import threading
+import logging
+import time
+
+
+class QueueStats(object):
+    """
+    Cache of the message and consumer counts of broker queues.
+    """
+    def __init__(self, celery_app, max_age):
+        """
+        :param celery_app: Handle to the Celery application.
+        :param max_age: Seconds during which cached counts are used.
+        """
+        self.celery_app = celery_app
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def fetch(self, queue_name):
+        """
+        Get the counts of a queue from the broker.
+
+        :param queue_name: Name of the queue.
+        :returns: Tuple of the number of messages and of consumers, (0, 0) if
+                  the queue doesn't exist.
+        """
+        logger = logging.getLogger(__name__)
+        with self.celery_app.connection_or_acquire() as connection:
+            channel = connection.channel()
+            try:
+                _, messages, consumers = channel.queue_declare(
+                    queue=queue_name, passive=True)
+            except connection.channel_errors:
+                logger.debug("Queue %s doesn't exist", queue_name)
+                messages, consumers = 0, 0
+            finally:
+                channel.close()
+        return messages, consumers
+
+    def get(self, queue_name):
+        """
+        Get the possibly cached counts of a queue.
+
+        :param queue_name: Name of the queue.
+        :returns: Tuple of the number of messages and of consumers.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(queue_name)
+        if cached is not None and now - cached[0] < self.max_age:
+            return cached[1]
+
+        counts = self.fetch(queue_name)
+        with self._lock:
+            self._cache[queue_name] = (now, counts)
+        return counts
+
+    def add_message(self, queue_name):
+        """
+        Count a message published to a queue in its cached counts, so that
+        the counts stay meaningful until they are fetched again.
+
+        :param queue_name: Name of the queue.
+        """
+        with self._lock:
+            cached = self._cache.get(queue_name)
+            if cached is not None:
+                messages, consumers = cached[1]
+                self._cache[queue_name] = (cached[0],
+                                           (messages + 1, consumers))
+
+    def clear(self):
+        """
+        Forget all the cached counts.
+        """
+        with self._lock:
+            self._cache = {}
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Delivery of completion callbacks.
+
+A submission may give a *callback_url* to which the final status of its task
+is POSTed as JSON once the task reaches a terminal state, so that clients
+don't have to poll the status route.
+
+Callback URLs must be http or https URLs. Pending callbacks are flagged in
+the request records. The dispatcher holding the *callback_dispatcher* lease
+(see :py:class:`~.background.Lease`) checks them periodically, reading the
+states of their tasks by batches, and queues those whose task is done to a
+bounded pool of sender threads, leasing them so that other dispatchers leave
+them alone. The flag is only cleared once the callback is delivered or has
+failed, callbacks leased by a crashed dispatcher being delivered again once
+their lease expires, i.e.: at least once. Deliveries are retried with an exponential backoff and signed with an
+HMAC-SHA256 of the body given in the *X-Vesta-Signature* header::
+
+    X-Vesta-Signature: sha256=<hex digest>
+
+The dispatcher runs within the gateway or, with the *IN_GATEWAY* setting
+unset, as a standalone process::
+
+    vrp_callback_dispatcher
+"""
+
+from future.standard_library import install_aliases
+install_aliases()
+
+# -- Standard lib ------------------------------------------------------------
+from urllib.request import Request, urlopen
+from urllib.parse import urlparse
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from logging.config import fileConfig
+from queue import Queue, Empty
+from itertools import islice
+import datetime
+import hashlib
+import logging
+import hmac
+import json
+import time
+
+# -- 3rd party ---------------------------------------------------------------
+from bson import json_util
+
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+from . import background
+
+THIS_DIR = abspath(dirname(__file__))
+
+# Statuses after which a task state doesn't change anymore
+TERMINAL_STATUSES = ('SUCCESS', 'FAILURE', 'REVOKED', 'EXPIRED')
+
+# Schemes of the callback URLs
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+def is_allowed_url(url):
+    """
+    Check if callbacks may be POSTed to a URL, i.e.: if it is an http or https
+    URL, other schemes (e.g.: file) giving access to the gateway host.
+
+    :param url: Callback URL.
+    """
+    url_p = urlparse(url)
+    return url_p.scheme.lower() in ALLOWED_SCHEMES and bool(url_p.netloc)
+
+
+def sign_payload(body, key):
+    """
+    Sign a callback body.
+
+    :param body: Encoded body of the callback.
+    :param key: Signature key.
+    :returns: Hexadecimal HMAC-SHA256 digest of the body.
+    """
+    return hmac.new(key.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class CallbackDispatcher(object):
+    """
+    Dispatcher of the callbacks of finished tasks.
+    """
+    def __init__(self, get_records, get_states, settings, signature_key=None,
+                 lease=None):
+        """
+        :param get_records: Callable returning the
+                            :py:class:`~.request_records.RequestRecords`
+        :param get_states: Callable returning a dict of the states of tasks by
+                           UUID given their request records.
+        :param settings: The *CALLBACKS* configuration structure.
+        :param signature_key: Key signing the callbacks, None to send them
+                              unsigned.
+        :param lease: :py:class:`~.background.Lease` which the process must
+                      hold to check the pending callbacks.
+        """
+        self.get_records = get_records
+        self.get_states = get_states
+        self.settings = settings
+        self.signature_key = signature_key
+        self.lease = lease
+        self._deliveries = Queue(maxsize=settings['QUEUE_SIZE'])
+
+    def start(self):
+        """
+        Start the background workers checking and delivering the callbacks.
+        """
+        background.start_worker('callback_dispatcher',
+                                self.settings['POLL_INTERVAL'],
+                                self.poll,
+                                self.lease)
+        for index in range(self.settings['CONCURRENCY']):
+            background.start_worker('callback_sender_{0}'.format(index),
+                                    0,
+                                    self.send_next)
+
+    def poll(self):
+        """
+        Queue the callbacks of the tasks which reached a terminal state.
+
+        The states are read by batches of QUEUE_SIZE tasks. Blocks while the
+        delivery queue is full.
+        """
+        logger = logging.getLogger(__name__)
+        records = self.get_records()
+        pending = records.find_many(
+            callback_pending=True,
+            callback_lease={'$not': {'$gt': datetime.datetime.utcnow()}})
+        while True:
+            batch = list(islice(pending, self.settings['QUEUE_SIZE']))
+            if not batch:
+                return
+            states = self.get_states(batch)
+            for data in batch:
+                state = states[data['uuid']]
+                if state['status'] not in TERMINAL_STATUSES:
+                    continue
+                # Another dispatcher may have taken this callback meanwhile
+                if not self.lease_callback(records, data['uuid']):
+                    continue
+                logger.debug("Queuing callback of task %s", data['uuid'])
+                self._deliveries.put((data['uuid'], data['callback_url'],
+                                      state))
+                METRICS.incr('callbacks.queued')
+
+    def lease_callback(self, records, uuid):
+        """
+        Lease a pending callback for its delivery by this dispatcher.
+
+        :param records: :py:class:`~.request_records.RequestRecords`
+        :param uuid: UUID of the task.
+        :returns: True if the callback is now leased by this dispatcher.
+        """
+        until = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.settings['LEASE'])
+        return records.lease(uuid, 'callback_pending', 'callback_lease', until)
+
+    def send_next(self):
+        """
+        Deliver the next queued callback, if any.
+        """
+        try:
+            uuid, url, state = self._deliveries.get(timeout=1)
+        except Empty:
+            return
+        self.deliver(uuid, url, state)
+
+    def deliver(self, uuid, url, state):
+        """
+        POST the final state of a task to its callback URL.
+
+        :param uuid: UUID of the task.
+        :param url: Callback URL.
+        :param state: Final state of the task.
+        :returns: True if the callback has been delivered.
+        """
+        logger = logging.getLogger(__name__)
+        records = self.get_records()
+        if not is_allowed_url(url):
+            logger.warning("Not delivering callback of task %s to %s whose "
+                           "scheme isn't allowed", uuid, url)
+            return self.finish(records, uuid, 'failed')
+        # The lease taken while the callback was queued is renewed for the
+        # time of the delivery.
+        records.update(uuid, callback_lease=datetime.datetime.utcnow() +
+                       datetime.timedelta(seconds=self.settings['LEASE']))
+
+        body = json.dumps(state, default=json_util.default).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.signature_key:
+            headers['X-Vesta-Signature'] = 'sha256={0}'.format(
+                sign_payload(body, self.signature_key))
+
+        max_retries = self.settings['MAX_RETRIES']
+        for attempt in range(max_retries + 1):
+            start = time.time()
+            try:
+                response = urlopen(Request(url, body, headers),
+                                   timeout=self.settings['TIMEOUT'])
+                response.close()
+            except Exception as exc:
+                logger.warning("Callback of task %s to %s failed (attempt "
+                               "%s) : %s", uuid, url, attempt + 1, repr(exc))
+                if attempt < max_retries:
+                    METRICS.incr('callbacks.retried')
+                    time.sleep(self.settings['RETRY_BACKOFF'] * 2 ** attempt)
+                continue
+
+            logger.info("Delivered callback of task %s to %s", uuid, url)
+            METRICS.incr('callbacks.delivered')
+            METRICS.observe('callbacks.latency', time.time() - start)
+            return self.finish(records, uuid, 'delivered')
+
+        return self.finish(records, uuid, 'failed')
+
+    def finish(self, records, uuid, status):
+        """
+        Record the outcome of a callback and clear its pending flag.
+
+        :param records: :py:class:`~.request_records.RequestRecords`
+        :param uuid: UUID of the task.
+        :param status: *delivered* or *failed*.
+        :returns: True if the callback has been delivered.
+        """
+        if status == 'failed':
+            METRICS.incr('callbacks.failed')
+        records.update(uuid, callback_status=status)
+        records.claim(uuid, 'callback_pending')
+        return status == 'delivered'
+
+
+def main():
+    """
+    Command line entry point to run the callback dispatcher standalone.
+    """
+    log_conf_fn = join(THIS_DIR, 'logging.ini')
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("-l",
+                        action='store',
+                        default=log_conf_fn,
+                        dest='logging_conf_fn',
+                        help='Set logging configuration filename')
+    args = parser.parse_args()
+    fileConfig(args.logging_conf_fn)
+
+    from .utility_rest import start_callback_dispatcher
+
+    start_callback_dispatcher()
+    while True:
+        time.sleep(60)
+
+if __name__ == '__main__':
+    main()
@@ -11,8 +11,59 @@ This module configures the Celery app using proper config params.
 import logging
 
 # --3rd party modules---------------------------------------------------------
+from kombu.compression import compress
+from kombu import Exchange, Queue
+from celery.app.amqp import AMQP, TaskProducer
 from celery import Celery
 
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+
+
+class SizedTaskProducer(TaskProducer):
+    """
+    Task producer compressing the messages only if they are at least
+    *compression_min_size* bytes once serialized, and reporting the sizes of
+    the messages published with a *metric_name* before and after compression.
+
+    Both are publishing options of :py:meth:`celery.Celery.send_task`, the
+    sizes being those of the message body actually produced by kombu.
+    """
+    _sizing = None
+
+    def publish_task(self, task_name, *args, **kwargs):
+        # Producers are used by a single thread at once
+        self._sizing = (kwargs.pop('metric_name', None),
+                        kwargs.pop('compression_min_size', 0))
+        try:
+            return super(SizedTaskProducer, self).publish_task(
+                task_name, *args, **kwargs)
+        finally:
+            self._sizing = None
+
+    def _prepare(self, body, serializer=None, content_type=None,
+                 content_encoding=None, compression=None, headers=None):
+        metric_name, min_size = self._sizing or (None, 0)
+        body, content_type, content_encoding = super(
+            SizedTaskProducer, self)._prepare(body, serializer, content_type,
+                                              content_encoding, None, headers)
+        size = len(body)
+        if compression and size >= min_size:
+            body, headers['compression'] = compress(body, compression)
+        if metric_name is not None:
+            METRICS.observe('messages.bytes.{0}'.format(metric_name), size)
+            METRICS.observe('messages.wire_bytes.{0}'.format(metric_name),
+                            len(body))
+        return body, content_type, content_encoding
+
+
+class SizedAMQP(AMQP):
+    """
+    AMQP of the Celery application publishing with
+    :py:class:`SizedTaskProducer`.
+    """
+    producer_cls = SizedTaskProducer
+
 
 def configure(config):
     """
@@ -21,6 +72,13 @@ def configure(config):
     A given service name will have its requests route through a queue named
     like the REST route.
 
+    Queues of services having a *max_priority* are declared with the
+    corresponding *x-max-priority* argument. Tasks are published with
+    :py:class:`SizedTaskProducer`.
+
+    The *WORKER_SERVICES* must have been validated beforehand by building
+    their :py:class:`~.service_registry.ServiceRegistry`.
+
     :param config: Dict like object with Celery configuration values.
     :returns: Reference to the Celery application to keep handy.
     """
@@ -28,6 +86,55 @@ def configure(config):
 
     proj_name = config['CELERY_PROJ_NAME']
     logger.debug("Celery project name is %s", proj_name)
-    celery_app = Celery(proj_name)
+    celery_app = Celery(proj_name, amqp=SizedAMQP)
     celery_app.config_from_object(config['CELERY'])
+
+    queues = list(celery_app.conf.CELERY_QUEUES or [])
+    for worker_config in config['WORKER_SERVICES'].values():
+        max_priority = worker_config.get('max_priority')
+        if max_priority is None:
+            continue
+        for queue_name, _ in get_service_queues(worker_config):
+            logger.debug("Queue %s has priorities up to %s",
+                         queue_name, max_priority)
+            queues.append(Queue(queue_name,
+                                Exchange(queue_name),
+                                routing_key=queue_name,
+                                queue_arguments={
+                                    'x-max-priority': max_priority}))
+    if queues:
+        celery_app.conf.CELERY_QUEUES = queues
     return celery_app
+
+
+def get_queues(queue_spec):
+    """
+    Get the queues of a *celery_queue_name* specification.
+
+    The *celery_queue_name* of a service or of its size classes is either a
+    queue name or a list of queues, each given by its name or by a dict
+    holding its *name* and its *weight*.
+
+    :param queue_spec: Value of a *celery_queue_name*
+    :returns: List of (queue name, weight) tuples.
+    """
+    if not isinstance(queue_spec, (list, tuple)):
+        queue_spec = [queue_spec]
+    return [(queue['name'], queue.get('weight', 1))
+            if isinstance(queue, dict) else (queue, 1)
+            for queue in queue_spec]
+
+
+def get_service_queues(worker_config):
+    """
+    Get all the queues of a service, including those of its size classes.
+
+    :param worker_config: Configuration of the service
+    :returns: List of (queue name, weight) tuples.
+    """
+    queues = get_queues(worker_config['celery_queue_name'])
+    for size_class in worker_config.get('size_classes', []):
+        queues.extend(queue for queue in
+                      get_queues(size_class['celery_queue_name'])
+                      if queue not in queues)
+    return queues
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Claim-check offloading of large payloads out of the broker messages.
+
+Payloads larger than the *THRESHOLD* setting once JSON encoded are stored in
+the *claims* GridFS bucket of the gateway database and replaced by a
+reference::
+
+    {'claim_check': {'id': <claim id>, 'url': <claim URL>}}
+
+Workers fetch the payload from the claim URL, served by the gateway and
+authorised by a token signing the id of this claim only. They may offload
+large results the same way by POSTing them to the gateway, which returns a
+reference to give as the task result. Such references are resolved by the
+gateway when reporting the status of a task.
+
+Claims are deleted after the *MAX_AGE* setting.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import logging
+import hashlib
+import hmac
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from gridfs.errors import NoFile
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from bson import json_util
+import gridfs
+
+# -- Project specific --------------------------------------------------------
+from .vesta_exceptions import UnknownClaimError
+from .metrics import METRICS
+
+BUCKET = 'claims'
+
+
+def store(database, body):
+    """
+    Store an encoded payload as a claim.
+
+    :param database: MongoDB database holding the claims.
+    :param body: JSON encoded payload.
+    :returns: Id of the claim.
+    """
+    claim_id = gridfs.GridFS(database, collection=BUCKET).put(
+        body, content_type='application/json')
+    METRICS.incr('claim_check.stored')
+    METRICS.observe('claim_check.bytes', len(body))
+    return str(claim_id)
+
+
+def upload(database, body):
+    """
+    Store an uploaded payload as a claim, e.g.: the result of a worker.
+
+    :param database: MongoDB database holding the claims.
+    :param body: Body of the upload.
+    :returns: Id of the claim.
+    :raises ValueError: If the body isn't a JSON document.
+    """
+    json.loads(body.decode('utf-8'))
+    return store(database, body)
+
+
+def sign(claim_id, key):
+    """
+    Get the token authorising the access to a claim.
+
+    :param claim_id: Id of the claim.
+    :param key: Signature key.
+    :returns: Hexadecimal HMAC-SHA256 digest of the claim id.
+    """
+    return hmac.new(key.encode('utf-8'), claim_id.encode('utf-8'),
+                    hashlib.sha256).hexdigest()
+
+
+def is_valid_token(claim_id, token, key):
+    """
+    Check if a token authorises the access to a claim.
+
+    :param claim_id: Id of the claim.
+    :param token: Token given with the request, if any.
+    :param key: Signature key, if any.
+    """
+    if not key or not token:
+        return False
+    return hmac.compare_digest(sign(claim_id, key).encode('utf-8'),
+                               token.encode('utf-8'))
+
+
+def offload(database, payload, threshold, get_url):
+    """
+    Offload a payload if it is larger than a threshold.
+
+    :param database: MongoDB database holding the claims.
+    :param payload: JSON serializable payload.
+    :param threshold: Size in bytes above which the payload is offloaded.
+    :param get_url: Callable returning the URL of a claim given its id.
+    :returns: The payload itself or a reference to its claim.
+    """
+    logger = logging.getLogger(__name__)
+    body = json.dumps(payload, default=json_util.default).encode('utf-8')
+    if len(body) <= threshold:
+        return payload
+    claim_id = store(database, body)
+    logger.info("Offloaded payload of %s bytes to claim %s",
+                len(body), claim_id)
+    return make_reference(claim_id, get_url(claim_id))
+
+
+def make_reference(claim_id, url):
+    """
+    Build the reference to a claim.
+    """
+    return {'claim_check': {'id': claim_id, 'url': url}}
+
+
+def is_reference(value):
+    """
+    Check if a value is a reference to a claim.
+    """
+    return isinstance(value, dict) and list(value.keys()) == ['claim_check']
+
+
+def fetch(database, claim_id):
+    """
+    Get the encoded payload of a claim.
+
+    :param database: MongoDB database holding the claims.
+    :param claim_id: Id of the claim.
+    :returns: JSON encoded payload or None if the claim doesn't exist.
+    """
+    try:
+        return gridfs.GridFS(database, collection=BUCKET).get(
+            ObjectId(claim_id)).read()
+    except (InvalidId, TypeError, NoFile):
+        return None
+
+
+def resolve(database, value):
+    """
+    Replace a reference to a claim by its payload.
+
+    :param database: MongoDB database holding the claims.
+    :param value: Any value, e.g.: a task result.
+    :returns: The payload of the claim if *value* is a reference to a
+              claim, otherwise *value* itself.
+    :raises UnknownClaimError: If the claim doesn't exist anymore.
+    """
+    logger = logging.getLogger(__name__)
+    if not is_reference(value):
+        return value
+    claim_id = value['claim_check'].get('id')
+    body = fetch(database, claim_id)
+    if body is None:
+        logger.warning("Claim %s doesn't exist anymore", claim_id)
+        raise UnknownClaimError(claim_id)
+    METRICS.incr('claim_check.resolved')
+    return json.loads(body.decode('utf-8'),
+                      object_hook=json_util.object_hook)
+
+
+def purge(database, max_age, bucket=BUCKET):
+    """
+    Delete the claims older than a given age.
+
+    :param database: MongoDB database holding the claims.
+    :param max_age: Age in seconds.
+    :param bucket: GridFS bucket holding the claims.
+    :returns: Number of deleted claims.
+    """
+    logger = logging.getLogger(__name__)
+    limit = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)
+    files = gridfs.GridFS(database, collection=bucket)
+    deleted = 0
+    for grid_out in files.find({'uploadDate': {'$lt': limit}}):
+        files.delete(grid_out._id)
+        deleted += 1
+    if deleted:
+        logger.info("Deleted %s files of bucket %s older than %s",
+                    deleted, bucket, limit)
+    return deleted
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+This module implements a middleware compressing the responses of the Flask
+application with gzip or deflate, as negotiated by the *Accept-Encoding*
+header of requests.
+
+Responses shorter than *MIN_SIZE* bytes, responses already encoded and
+responses whose content type is already compressed (*SKIP_TYPES*) are sent as
+is. Streamed responses, i.e.: without a Content-Length, are compressed as
+they are produced, each chunk being flushed so that clients get it at once,
+e.g.: the lines of NDJSON result pages. The size of the responses before and
+after compression and the compression time are reported in the metrics.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import time
+import zlib
+
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+
+# zlib window bits giving each encoding format
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def negotiate(accept_encoding):
+    """
+    Choose the encoding of a response.
+
+    :param accept_encoding: Value of the Accept-Encoding request header.
+    :returns: 'gzip', 'deflate' or None if neither is accepted.
+    """
+    qualities = {}
+    for entry in accept_encoding.split(','):
+        parts = entry.strip().split(';')
+        coding = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    default = qualities.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in ('gzip', 'deflate'):
+        quality = qualities.get(coding, default)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressedResponses(object):
+    """
+    Class which implements a middleware compressing the responses.
+    """
+    def __init__(self, app, settings):
+        """
+        :param app: WSGI application.
+        :param settings: The *RESPONSE_COMPRESSION* configuration structure.
+        """
+        self.app = app
+        self.settings = settings
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ['REQUEST_METHOD'] == 'HEAD':
+            return self.app(environ, start_response)
+
+        response = {}
+
+        def deferred_start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+            response['exc_info'] = exc_info
+            return response.setdefault('body', []).append
+
+        app_iter = self.app(environ, deferred_start_response)
+        return self.iterate(app_iter, response, encoding, start_response)
+
+    def is_compressible(self, response):
+        """
+        Check if a response may be compressed given its status and headers.
+        """
+        if response['status'][:3] in ('204', '304'):
+            return False
+        headers = dict((name.lower(), value) for
+                       name, value in response['headers'])
+        if 'content-encoding' in headers:
+            return False
+        content_type = headers.get('content-type', '')
+        if any(content_type.startswith(prefix) for
+               prefix in self.settings['SKIP_TYPES']):
+            return False
+        content_length = headers.get('content-length')
+        if content_length is not None and \
+           int(content_length) < self.settings['MIN_SIZE']:
+            return False
+        return True
+
+    def iterate(self, app_iter, response, encoding, start_response):
+        """
+        Produce the body of a response, compressed if suitable.
+
+        The beginning of the body is buffered until it reaches *MIN_SIZE*
+        bytes, so that short responses of unknown length are sent as is.
+        """
+        try:
+            chunks = iter(app_iter)
+            buffered = list(response.get('body', []))
+            size = sum(len(chunk) for chunk in buffered)
+            compress = self.is_compressible(response)
+            while compress and size < self.settings['MIN_SIZE']:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    compress = False
+                    break
+                buffered.append(chunk)
+                size += len(chunk)
+
+            if not compress:
+                start_response(response['status'], response['headers'],
+                               response['exc_info'])
+                for chunk in buffered:
+                    yield chunk
+                for chunk in chunks:
+                    yield chunk
+                return
+
+            streamed = not any(name.lower() == 'content-length' for
+                               name, _ in response['headers'])
+            start_response(response['status'],
+                           self.get_headers(response['headers'], encoding),
+                           response['exc_info'])
+            compressor = zlib.compressobj(self.settings['LEVEL'],
+                                          zlib.DEFLATED, WBITS[encoding])
+            for chunk in self.compress(compressor, buffered, chunks,
+                                       streamed):
+                yield chunk
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def compress(self, compressor, buffered, chunks, streamed=False):
+        """
+        Compress the chunks of a body, recording the metrics.
+
+        :param streamed: Whether each chunk is flushed once compressed instead
+                         of being held by the compressor until it fills its
+                         output buffer.
+        """
+        size_in = size_out = 0
+        elapsed = 0.0
+        for source in (buffered, chunks):
+            for chunk in source:
+                if not chunk:
+                    continue
+                start = time.time()
+                compressed = compressor.compress(chunk)
+                if streamed:
+                    compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+                elapsed += time.time() - start
+                size_in += len(chunk)
+                if compressed:
+                    size_out += len(compressed)
+                    yield compressed
+        start = time.time()
+        compressed = compressor.flush()
+        elapsed += time.time() - start
+        size_out += len(compressed)
+        METRICS.observe('response_compression.bytes_in', size_in)
+        METRICS.observe('response_compression.bytes_out', size_out)
+        METRICS.observe('response_compression.seconds', elapsed)
+        yield compressed
+
+    @staticmethod
+    def get_headers(headers, encoding):
+        """
+        Get the headers of a compressed response.
+
+        The length is dropped since it is unknown until the end of the
+        compression and strong ETags are weakened since the compressed body
+        differs from the original one.
+        """
+        compressed_headers = []
+        vary = []
+        for name, value in headers:
+            lower_name = name.lower()
+            if lower_name == 'content-length':
+                continue
+            if lower_name == 'vary':
+                vary.append(value)
+                continue
+            if lower_name == 'etag' and not value.startswith('W/'):
+                value = 'W/' + value
+            compressed_headers.append((name, value))
+        vary.append('Accept-Encoding')
+        compressed_headers.append(('Vary', ', '.join(vary)))
+        compressed_headers.append(('Content-Encoding', encoding))
+        return compressed_headers
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Cache of the static responses derived from the configuration, e.g.: the
+CANARIE documentation, support and licence pages or the static part of the
+info of services.
+
+Values are built on their first use and kept until the generation of the
+configuration changes, the whole cache being then replaced at once. Responses
+are kept as their body, status and headers, from which a new response object
+is made for each request. Since templates render URLs relative to the root of
+the application, keys of rendered responses should hold the script root of the
+request.
+
+Reads take no lock: the cache is a single (generation, values) tuple replaced
+atomically.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import threading
+
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+
+# Headers recomputed for each response
+VOLATILE_HEADERS = ('content-length', 'date', 'set-cookie')
+
+
+class ConfigurationCache(object):
+    """
+    Class which keeps values built from the configuration.
+    """
+    def __init__(self, get_generation):
+        """
+        :param get_generation: Callable returning the generation of the
+                               configuration.
+        """
+        self.get_generation = get_generation
+        self._lock = threading.Lock()
+        self._cache = (None, {})
+
+    def get_values(self):
+        """
+        Get the values of the current generation.
+        """
+        generation = self.get_generation()
+        cache = self._cache
+        if cache[0] != generation:
+            with self._lock:
+                if self._cache[0] != generation:
+                    self._cache = (generation, {})
+                cache = self._cache
+        return cache[1]
+
+    def get(self, key, build):
+        """
+        Get a value, building it on its first use.
+
+        :param key: Hashable key of the value.
+        :param build: Callable returning the value. Exceptions aren't cached.
+        """
+        values = self.get_values()
+        try:
+            value = values[key]
+        except KeyError:
+            METRICS.incr('configuration_cache.misses')
+            value = values[key] = build()
+        return value
+
+    def get_response(self, response_class, key, build_response):
+        """
+        Get a response, building it on its first use.
+
+        :param response_class: Class of the responses, e.g.:
+                               *APP.response_class*.
+        :param key: Hashable key of the response.
+        :param build_response: Callable returning the response.
+        :returns: New response object.
+        """
+        def build():
+            response = build_response()
+            headers = [(name, value) for name, value in response.headers
+                       if name.lower() not in VOLATILE_HEADERS]
+            return response.get_data(), response.status, headers
+
+        body, status, headers = self.get(key, build)
+        return response_class(body, status=status, headers=headers)
+
+    def clear(self):
+        """
+        Forget all the values.
+        """
+        with self._lock:
+            self._cache = (None, {})
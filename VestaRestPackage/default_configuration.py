@@ -23,11 +23,94 @@ MONGO_URI = "mongodb://localhost:27017/RESTPackage"
 
 # Defines the list of indexes to be created in MongoDB
 # see http://api.mongodb.com/python/current/api/pymongo/collection.html#pymongo.collection.Collection.create_index
+# An index can also be given as a dict holding its key specification under
+# 'key' along with any create_index option (e.g.: 'unique',
+# 'expireAfterSeconds').
+# Requests and Invocations are kept forever by default. TTL indexes may be
+# added as a safety net deleting the documents which haven't been archived in
+# time (see RETENTION), e.g.:
+# {'key': 'datetime', 'expireAfterSeconds': 172800} for Requests and
+# {'key': 'datetime', 'expireAfterSeconds': 7776000} for Invocations.
 MONGO_COLLECTIONS = {
     'Invocations': [[("service",1),('datetime',-1)]],
-    'Requests': ['uuid']
+    'Requests': ['uuid',
+                 {'key': 'callback_pending', 'sparse': True}],
+    # Archived requests are reported as expired for a week.
+    'ExpiredRequests': [{'key': 'datetime', 'expireAfterSeconds': 604800}],
+    # Idempotency keys expire after one day.
+    'Submissions': [{'key': 'datetime', 'expireAfterSeconds': 86400}],
+    # Cached results unused for a week expire.
+    'ResultCache': [{'key': 'last_access', 'expireAfterSeconds': 604800}],
+    # Held submissions are released per service and client, oldest first.
+    'Backlog': [[('service', 1), ('client', 1), ('datetime', 1)]]
 }
 
+# Storage layout of the Requests collection.
+# 'legacy' stores the UUID as a string in an indexed 'uuid' field.
+# 'compact' stores the UUID as a binary UUID in '_id' with short field names
+# ('s': service, 't': datetime, 'a': activity, 'k': cache_key, 'c': cached,
+# 'cu': callback_url, 'cp': callback_pending, 'cs': callback_status,
+# 'cl': callback_lease, 'f': final_status, 'e': expires, 'pr': priority,
+# 'q': queue) so that lookups are primary
+# key hits. With MongoDB 5.3 and above, the Requests
+# collection is then created clustered on '_id'. The Requests indexes of
+# MONGO_COLLECTIONS must use the short field names and the 'uuid' index is no
+# longer needed, e.g.: [{'key': 't', 'expireAfterSeconds': 172800}].
+# Existing records are converted by the vrp_migrate_requests command.
+REQUESTS_STORAGE = 'legacy'
+
+# Type of the Invocations collection, used when init_db creates it.
+# 'regular' is a plain collection, 'timeseries' a time series collection with
+# 'datetime' as time field and 'service' as metadata field whose measurements
+# expire after EXPIRE_AFTER seconds (MongoDB 5.0 and above) and 'capped' a
+# capped collection of CAPPED_SIZE bytes. A capped collection is created
+# instead of a time series collection with older servers. TTL indexes of
+# MONGO_COLLECTIONS are skipped for time series and capped collections, and
+# these are not archived (see RETENTION).
+INVOCATIONS_STORAGE = {
+    'TYPE': 'regular',
+    'GRANULARITY': 'seconds',
+    'EXPIRE_AFTER': 7776000,
+    'CAPPED_SIZE': 1073741824}
+
+# Idempotent submissions.
+# When enabled, a submission carrying the HEADER header returns the UUID of
+# the first submission made by the same client (see CLIENT_IDENTITY) with the
+# same header value for the same service instead of publishing a new task.
+# With FINGERPRINT, submissions without the header are deduplicated on their
+# client, service, document URL and parameters. Submissions arriving while
+# the first one is still being submitted get a 409 Conflict error, unless it
+# has been pending for PENDING_TIMEOUT seconds.
+IDEMPOTENCY = {
+    'ENABLED': False,
+    'HEADER': 'Idempotency-Key',
+    'FINGERPRINT': False,
+    'PENDING_TIMEOUT': 60}
+
+# Result cache.
+# When enabled, results of successful tasks are cached under a key built from
+# the service name, the worker version, the parameters and the identity of the
+# document (storage id, or ETag / Last-Modified of the document URL obtained
+# by a preflight HEAD request, see PREFLIGHT). Submissions matching a cached
+# result get a UUID which is immediately reported as SUCCESS without running
+# the worker.
+# Results larger than MAX_RESULT_SIZE bytes once JSON encoded are not cached
+# and the least recently used entries are evicted past MAX_ENTRIES entries.
+RESULT_CACHE = {
+    'ENABLED': False,
+    'MAX_RESULT_SIZE': 1048576,
+    'MAX_ENTRIES': 10000}
+
+# Document preflight.
+# HEAD requests on document URLs, used by the result cache and by the size
+# classes of services, time out after TIMEOUT seconds. Their responses are
+# cached for MAX_AGE seconds, then revalidated with their ETag, for up to
+# MAX_ENTRIES URLs.
+PREFLIGHT = {
+    'TIMEOUT': 5,
+    'MAX_AGE': 300,
+    'MAX_ENTRIES': 10000}
+
 
 CELERY_PROJ_NAME = "worker"
 
@@ -39,6 +122,193 @@ CELERY = {
     'CELERY_ACCEPT_CONTENT': ["json"],
     'CELERY_TASK_RESULT_EXPIRES': 7200}
 
+# Retention of request records and invocation logs.
+# Documents of each collection of COLLECTIONS older than the given number of
+# seconds are reported as expired, then archived into gzip compressed NDJSON
+# files of ARCHIVE_DIR and deleted by the vrp_archive command, BATCH_SIZE
+# documents at a time.
+# No collection has a retention period by default, enable it with e.g.:
+# 'COLLECTIONS': {'Requests': 86400, 'Invocations': 2592000}
+# The retention period of Requests is counted from the submission so it must
+# exceed the longest task duration plus CELERY_TASK_RESULT_EXPIRES.
+RETENTION = {
+    'ARCHIVE_DIR': "archives",
+    'BATCH_SIZE': 1000,
+    'COLLECTIONS': {}}
+
+# Completion callbacks.
+# When enabled, submissions may give an http or https callback_url to which
+# the final status of the task is POSTed once it reaches a terminal state.
+# The body is signed by an HMAC-SHA256 keyed by SECURITY['AUTHORISATION_KEY']
+# given in the X-Vesta-Signature header. Pending callbacks are checked every
+# POLL_INTERVAL seconds by the single process holding the callback_dispatcher
+# lease of the Leases collection, reading the task states QUEUE_SIZE at a
+# time, and delivered by CONCURRENCY threads from a queue of
+# QUEUE_SIZE callbacks, with a TIMEOUT in seconds. Failed deliveries are
+# retried MAX_RETRIES times with an exponential backoff starting at
+# RETRY_BACKOFF seconds. A callback stays pending until it is delivered or
+# has failed, being leased for LEASE seconds by the dispatcher delivering it
+# so that the callbacks of a crashed dispatcher are delivered again. LEASE
+# must exceed the time taken by all the attempts of a delivery. The
+# dispatcher runs in the gateway processes when IN_GATEWAY is set, otherwise
+# use the vrp_callback_dispatcher command.
+CALLBACKS = {
+    'ENABLED': False,
+    'IN_GATEWAY': True,
+    'POLL_INTERVAL': 5,
+    'CONCURRENCY': 4,
+    'QUEUE_SIZE': 100,
+    'TIMEOUT': 10,
+    'MAX_RETRIES': 5,
+    'RETRY_BACKOFF': 1,
+    'LEASE': 300}
+
+# Sweeper of stale tasks.
+# Every INTERVAL seconds, the request records of unfinished tasks are scanned
+# BATCH_SIZE at a time to turn on the activity flag of started tasks and to
+# flag finished and expired tasks. Tasks still PENDING ORPHAN_AGE seconds
+# after their submission are flagged as expired and revoked if REVOKE_ORPHANS
+# is set. Records of unfinished tasks older than ORPHAN_AGE plus
+# CELERY_TASK_RESULT_EXPIRES are flagged as expired at once without reading
+# their state. The index through which the records are scanned is created on
+# Requests whatever MONGO_COLLECTIONS holds. The sweeper runs in the gateway processes when IN_GATEWAY is set,
+# otherwise use the vrp_sweeper command. In both cases, a single process sweeps
+# at a time, the one holding the sweeper lease of the Leases collection.
+SWEEPER = {
+    'ENABLED': True,
+    'IN_GATEWAY': True,
+    'INTERVAL': 60,
+    'BATCH_SIZE': 500,
+    'ORPHAN_AGE': 86400,
+    'REVOKE_ORPHANS': False}
+
+# Maximal number of seconds to the deadline which clients may give to their
+# submissions, after which their task is discarded by workers.
+MAX_DEADLINE = 2592000
+
+# Identity of the clients used for per-client limits: 'remote_addr' or 'jwt'
+# (the CLIENT_IDENTITY_CLAIM of the JWT given in the Authorization header,
+# once validated like by the SECURITY check). Clients without a valid token
+# holding this claim as a string are identified as 'anonymous'.
+CLIENT_IDENTITY = 'remote_addr'
+CLIENT_IDENTITY_CLAIM = 'sub'
+
+# Task priorities.
+# Submissions to services having a max_priority may give a priority, from 0
+# (lowest) to max_priority, which is given to the broker as the message
+# priority. Clients get their limit from CLIENT_LIMITS (by client identity)
+# or DEFAULT_LIMIT, higher priorities being lowered to it. Submissions without
+# a priority get DEFAULT_PRIORITY.
+PRIORITIES = {
+    'DEFAULT_PRIORITY': 0,
+    'DEFAULT_LIMIT': 5,
+    'CLIENT_LIMITS': {}}
+
+# Weighted fair scheduling.
+# Submissions to services having fair_scheduling set are held in per-client
+# virtual queues (Backlog collection) instead of being published right away.
+# Every INTERVAL seconds, they are released to the broker in weighted
+# round-robin across clients while the queue of the service holds fewer than
+# max_queue_depth messages. Clients get their weight, i.e.: the number of
+# submissions released in each round, from CLIENT_WEIGHTS (by client identity)
+# or DEFAULT_WEIGHT. Weights are non negative numbers rounded down, the
+# submissions of clients with a weight of 0 staying held. The scheduler runs
+# in the gateway processes when IN_GATEWAY is set, otherwise use the
+# vrp_fair_scheduler command. In both cases, a single process releases the
+# submissions at a time, the one holding the fair_scheduler lease of the
+# Leases collection.
+FAIR_SCHEDULING = {
+    'IN_GATEWAY': True,
+    'INTERVAL': 1,
+    'DEFAULT_WEIGHT': 1,
+    'CLIENT_WEIGHTS': {}}
+
+# Seconds during which the message and consumer counts of the broker queues
+# are cached (used by fair scheduling and multi-queue balancing).
+BROKER_STATS_MAX_AGE = 1
+
+# Claim-check offloading.
+# When enabled, the misc payload of submissions larger than THRESHOLD bytes
+# once JSON encoded is stored in GridFS and replaced in the message by a
+# claim_check reference holding its id and the URL from which workers fetch it
+# (the /claim_check route, authorised by a token of the URL signing the claim
+# id with the AUTHORISATION_KEY). Workers may offload large JSON results by
+# POSTing them to the same route with an Authorization header and returning
+# the reference it gives, which is resolved in status responses. Claims are
+# purged every PURGE_INTERVAL seconds once older than MAX_AGE seconds.
+CLAIM_CHECK = {
+    'ENABLED': False,
+    'THRESHOLD': 65536,
+    'MAX_AGE': 172800,
+    'PURGE_INTERVAL': 3600}
+
+# Size in bytes of the JSON encoded task messages below which they aren't
+# compressed, for services having a compression.
+COMPRESSION_MIN_SIZE = 1024
+
+# Encoder of the JSON responses and logged documents: 'json', 'simplejson',
+# 'ujson' (version 5 or later) or 'auto' for the fastest installed one.
+JSON_ENCODER = 'auto'
+
+# Format of the dates of the JSON responses and logged documents: 'http' (the
+# RFC 1123 format of flask.jsonify, e.g.: Wed, 10 Sep 2014 12:23:19 GMT) or
+# 'iso' (ISO 8601, e.g.: 2014-09-10T12:23:19).
+JSON_DATE_FORMAT = 'http'
+
+# Store giving the state of tasks for status requests.
+# TYPE is 'celery' (the Celery result backend, see CELERY_RESULT_BACKEND),
+# 'mongo' (the TASKMETA_COLLECTION documents written in the gateway database
+# by the Celery MongoDB result backend, read by batches) or 'memory' (tests).
+# The mongo and memory stores replace results larger than MAX_RESULT_SIZE
+# bytes (0 for no limit) by a description of their size in status responses.
+# Cached, streamed and called back results are always whole.
+STATUS_STORE = {
+    'TYPE': 'celery',
+    'TASKMETA_COLLECTION': 'celery_taskmeta',
+    'MAX_RESULT_SIZE': 0}
+
+# Streaming of large task results.
+# When enabled, results larger than MIN_SIZE bytes once JSON encoded are stored
+# in GridFS as NDJSON, one line per item of list results, and described in
+# status responses by their item count, their size and the URL of the result
+# route. That route streams the items by pages given by offset and limit
+# arguments, limit defaulting to PAGE_SIZE and bounded by MAX_PAGE_SIZE. The
+# position of every CHECKPOINT_INTERVAL items is kept to reach pages
+# directly. Stored results are purged every PURGE_INTERVAL seconds once older
+# than MAX_AGE seconds.
+RESULT_STREAMING = {
+    'ENABLED': False,
+    'MIN_SIZE': 1048576,
+    'PAGE_SIZE': 1000,
+    'MAX_PAGE_SIZE': 10000,
+    'CHECKPOINT_INTERVAL': 1000,
+    'MAX_AGE': 172800,
+    'PURGE_INTERVAL': 3600}
+
+# Compression of the responses.
+# When enabled, responses are compressed with gzip or deflate as negotiated
+# by the Accept-Encoding header of requests, at the given zlib LEVEL, unless
+# they are shorter than MIN_SIZE bytes or their content type starts with one
+# of SKIP_TYPES (already compressed contents).
+RESPONSE_COMPRESSION = {
+    'ENABLED': False,
+    'MIN_SIZE': 1024,
+    'LEVEL': 6,
+    'SKIP_TYPES': ['image/', 'video/', 'audio/', 'application/zip',
+                   'application/gzip', 'application/x-gzip']}
+
+# Hot reload of WORKER_SERVICES without restarting the gateway, polled every
+# INTERVAL seconds. SOURCE is 'file' to watch the configuration file PATH
+# (the VRP_CONFIGURATION file by default) or 'mongo' to read the COLLECTION
+# of the gateway database, holding one document per service whose _id is the
+# route of the service. New queues with a max_priority need a restart.
+REGISTRY_RELOAD = {
+    'ENABLED': False,
+    'SOURCE': 'file',
+    'PATH': None,
+    'COLLECTION': 'Services',
+    'INTERVAL': 10}
+
 # Timeout for AMQP async calls
 AMQP_TIMEOUT = 5
 
@@ -82,8 +352,22 @@ POST_ANNOTATIONS_REQ_URL = ("http://localhost:5001/"
 #     # The celery queue name.
 #     # Must match the queue name specified when starting the worker
 #     # (by the -Q switch)
+#     # May also be a list of queues among which submissions are balanced,
+#     # each given by its name or by a dict holding its name and its weight,
+#     # i.e.: the relative throughput of one of its consumers (default 1).
+#     # Submissions go to the queue with the lowest estimated wait, e.g.:
+#     # ['my_service_gpu', {'name': 'my_service_cpu', 'weight': 0.25}]
 #     'celery_queue_name': 'my_service',
 #
+#     # Optional: Size classes routing documents, by their size and type given
+#     # by a preflight HEAD request (see PREFLIGHT), to their own queues. The
+#     # first class whose max_size (in bytes) and content_types (type
+#     # prefixes, optional) match the document gives the celery_queue_name,
+#     # the others go to the service celery_queue_name.
+#     'size_classes': [{'max_size': 10485760,
+#                       'content_types': ['audio/'],
+#                       'celery_queue_name': 'my_service_fast'}],
+#
 #     # Following parameters are required by the CANARIE API (info request)
 #     'name': 'My service',
 #     'synopsis': "RESTful service providing my_service.",
@@ -122,6 +406,26 @@ POST_ANNOTATIONS_REQ_URL = ("http://localhost:5001/"
 #     # Specify if the service should work without any parameters supplied.
 #     'noparams': False,
 #
+#     # Optional number of seconds after which a submitted task is discarded
+#     # by workers instead of being run, and reported as EXPIRED. Clients may
+#     # shorten it with the deadline parameter of their submission.
+#     'task_expires': 3600,
+#
+#     # Optional highest priority of the tasks of the service. The queue is
+#     # then declared with this x-max-priority argument (an existing queue must
+#     # be deleted first) and submissions may give a priority (see PRIORITIES).
+#     'max_priority': 9,
+#     # Optional: Hold submissions in per-client virtual queues and release
+#     # them fairly while the service queue holds fewer than max_queue_depth
+#     # messages (see FAIR_SCHEDULING).
+#     'fair_scheduling': True,
+#     'max_queue_depth': 20,
+#     # Optional: Compression of the task messages (zlib, bzip2 or any other
+#     # compression registered in kombu) larger than compression_min_size
+#     # bytes, which defaults to COMPRESSION_MIN_SIZE.
+#     'compression': 'zlib',
+#     'compression_min_size': 2048,
+#
 #     'os_args': {'image': 'my_service_image_name_v_0.1.0',
 #                 'instance_type': 'm1.large'},
 #     # Process-request to spawn VM ratio
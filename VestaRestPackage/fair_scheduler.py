@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Weighted fair scheduling of submissions across clients.
+
+Submissions to services with fair scheduling aren't published to the broker
+right away. They are held in per-client virtual queues, stored in the
+*Backlog* collection, and released to the broker in weighted round-robin
+across clients whenever the queue of the service has room, i.e.: holds fewer
+messages than the *max_queue_depth* of the service. A client filling the
+service with submissions then only delays its own ones.
+
+The scheduler runs within the gateway or, with the *IN_GATEWAY* setting unset,
+as a standalone process::
+
+    vrp_fair_scheduler
+
+Submissions are released by a single process at a time, the one holding the
+*fair_scheduler* lease (see :py:class:`~.background.Lease`), so that the room
+of the queues is only counted once.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from logging.config import fileConfig
+import datetime
+import logging
+import numbers
+import time
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo import ASCENDING
+
+# -- Project specific --------------------------------------------------------
+from .vesta_exceptions import SettingsException
+from .metrics import METRICS
+from . import background
+
+THIS_DIR = abspath(dirname(__file__))
+
+
+def hold(collection, task_id, service_name, client_id, params, expires=None):
+    """
+    Hold a submission in the virtual queue of its client.
+
+    :param collection: MongoDB collection holding the backlog.
+    :param task_id: UUID of the task to publish.
+    :param service_name: Name of the service which is requested.
+    :param client_id: Identity of the client.
+    :param params: Publishing parameters of the task, without the Celery app.
+    :param expires: UTC time after which the task must not be run anymore.
+    """
+    collection.insert_one({'_id': task_id,
+                           'service': service_name,
+                           'client': client_id,
+                           'datetime': datetime.datetime.utcnow(),
+                           'expires': expires,
+                           'params': params})
+
+
+def drop(collection, task_id):
+    """
+    Drop a held submission, e.g.: when it is cancelled.
+
+    :returns: True if the submission was held.
+    """
+    return collection.delete_one({'_id': task_id}).deleted_count == 1
+
+
+def get_weight(name, weight):
+    """
+    Get the integer weight of a client.
+
+    :param name: Name of the setting giving the weight.
+    :param weight: Weight of the client.
+    :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the weight
+             isn't a non negative number.
+    """
+    if isinstance(weight, bool) or not isinstance(weight, numbers.Real) or \
+       not 0 <= weight < float('inf'):
+        raise SettingsException('Fair scheduling weight {0} of {1} must be a '
+                                'non negative number'.format(weight, name))
+    return int(weight)
+
+
+def get_client_backlog(collection, service_name):
+    """
+    Get the number of held submissions of each client of a service.
+
+    :returns: Dict of submission counts by client.
+    """
+    pipeline = [{'$match': {'service': service_name}},
+                {'$group': {'_id': '$client', 'count': {'$sum': 1}}}]
+    return dict((entry['_id'], entry['count']) for
+                entry in collection.aggregate(pipeline))
+
+
+class FairScheduler(object):
+    """
+    Scheduler releasing held submissions to the broker.
+    """
+    def __init__(self, get_collection, get_services, get_queue_depth,
+                 publish, settings, lease=None):
+        """
+        :param get_collection: Callable returning the backlog collection.
+        :param get_services: Callable returning a dict of the maximum queue
+                             depth of each fairly scheduled service by name.
+        :param get_queue_depth: Callable returning the number of messages in
+                                the queue of a service given its name.
+        :param publish: Callable publishing a task given its service name and
+                        its publishing parameters.
+        :param settings: The *FAIR_SCHEDULING* configuration structure.
+        :param lease: :py:class:`~.background.Lease` which the process must
+                      hold to release submissions.
+        :raises: :py:exc:`~.vesta_exceptions.SettingsException` if a weight
+                 isn't a non negative number.
+        """
+        self.get_collection = get_collection
+        self.get_services = get_services
+        self.get_queue_depth = get_queue_depth
+        self.publish = publish
+        self.settings = settings
+        self.lease = lease
+        self.default_weight = get_weight('DEFAULT_WEIGHT',
+                                         settings['DEFAULT_WEIGHT'])
+        self.weights = dict((client_id, get_weight(client_id, weight)) for
+                            client_id, weight in
+                            settings['CLIENT_WEIGHTS'].items())
+
+    def start(self):
+        """
+        Start the background worker releasing submissions.
+        """
+        background.start_worker('fair_scheduler', self.settings['INTERVAL'],
+                                self.release_all, self.lease)
+
+    def release_all(self):
+        """
+        Release the submissions of all the fairly scheduled services.
+        """
+        for service_name, max_depth in self.get_services().items():
+            room = max_depth - self.get_queue_depth(service_name)
+            if room > 0:
+                self.release(service_name, room)
+
+    def weight(self, client_id):
+        """
+        Get the weight of a client.
+        """
+        return self.weights.get(client_id, self.default_weight)
+
+    def release(self, service_name, room):
+        """
+        Release up to *room* submissions of a service in weighted round-robin
+        across its clients, oldest submissions first for each client.
+
+        The submissions of clients having a weight of 0 stay held. The
+        release stops at the first submission which can't be published, to be
+        tried again at the next round.
+
+        :param service_name: Name of the service.
+        :param room: Maximum number of submissions to release.
+        :returns: Number of released submissions.
+        """
+        logger = logging.getLogger(__name__)
+        collection = self.get_collection()
+        clients = sorted(client_id for client_id in
+                         get_client_backlog(collection, service_name)
+                         if self.weight(client_id) > 0)
+        released = 0
+        while clients and released < room:
+            for client_id in list(clients):
+                quota = min(self.weight(client_id), room - released)
+                held = list(collection.find({'service': service_name,
+                                             'client': client_id}).
+                            sort('datetime', ASCENDING).limit(quota))
+                if len(held) < quota:
+                    clients.remove(client_id)
+                for submission in held:
+                    try:
+                        if self.release_one(collection, submission):
+                            released += 1
+                    except Exception:
+                        logger.exception("Cannot release submission %s, "
+                                         "holding it until the next round",
+                                         submission['_id'])
+                        return released
+                if released >= room:
+                    break
+        return released
+
+    def release_one(self, collection, submission):
+        """
+        Publish a held submission.
+
+        :returns: True if the submission has been published by this call.
+        :raises: The exception of the publication, the submission being held
+                 again.
+        """
+        logger = logging.getLogger(__name__)
+        # Another scheduler may have released this submission meanwhile
+        if collection.find_one_and_delete({'_id': submission['_id']}) is None:
+            return False
+
+        params = dict(submission['params'])
+        expires = submission.get('expires')
+        if expires is not None:
+            params['expires'] = \
+                (expires - datetime.datetime.utcnow()).total_seconds()
+            if params['expires'] <= 0:
+                logger.info("Dropping submission %s which expired while "
+                            "held", submission['_id'])
+                return False
+
+        try:
+            self.publish(submission['service'], params)
+        except Exception:
+            collection.insert_one(submission)
+            raise
+
+        wait = datetime.datetime.utcnow() - submission['datetime']
+        METRICS.observe('fair_scheduler.hold_time.{0}'.
+                        format(submission['service']),
+                        wait.total_seconds())
+        logger.debug("Released submission %s of client %s",
+                     submission['_id'], submission['client'])
+        return True
+
+
+def main():
+    """
+    Command line entry point to run the fair scheduler standalone.
+    """
+    log_conf_fn = join(THIS_DIR, 'logging.ini')
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("-l",
+                        action='store',
+                        default=log_conf_fn,
+                        dest='logging_conf_fn',
+                        help='Set logging configuration filename')
+    args = parser.parse_args()
+    fileConfig(args.logging_conf_fn)
+
+    from .utility_rest import start_fair_scheduler
+
+    start_fair_scheduler()
+    while True:
+        time.sleep(60)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Fork safety of the gateway processes.
+
+Preforking servers such as gunicorn with *preload_app* import the application
+once in their master process, then fork it into workers. Sockets to MongoDB
+and to the broker must not be shared by processes and threads don't survive a
+fork, so:
+
+* :py:func:`prepare_fork` is called in the master before the application is
+  imported, so that its background workers are registered without being
+  started;
+* :py:func:`after_fork` is called in each forked worker. It runs the hooks
+  registered with :py:func:`register_after_fork`, which re-create the
+  connections and clear the caches of the process, then starts the
+  background workers.
+
+The gunicorn configuration :py:mod:`~.gunicorn_config` does both.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import logging
+import os
+
+# -- Project specific --------------------------------------------------------
+from . import background
+
+_HOOKS = []
+
+
+def register_after_fork(function):
+    """
+    Register a function to call in forked processes.
+
+    :param function: Callable taking no argument. Hooks are called in the
+                     order of their registration.
+    """
+    _HOOKS.append(function)
+
+
+def prepare_fork():
+    """
+    Prepare the current process to be forked, before importing the
+    application.
+    """
+    background.defer_workers()
+
+
+def after_fork():
+    """
+    Make a forked process use its own connections, caches and background
+    workers.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Resetting process %s after fork", os.getpid())
+    for hook in _HOOKS:
+        hook()
+    background.start_deferred_workers()
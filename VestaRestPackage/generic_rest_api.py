@@ -22,28 +22,75 @@ import logging
 
 # -- 3rd party ---------------------------------------------------------------
 from flask import render_template
-from flask import jsonify
+from flask import request
+from werkzeug.routing import Map
 
 # -- Setup and configuration -------------------------------------------------
-from .app_objects import APP, CELERY_APP
+from .app_objects import APP, CELERY_APP, get_config_generation
+from .app_objects import get_registry
 
 # -- Project specific --------------------------------------------------------
 from .utility_rest import set_html_as_default_response
 from .utility_rest import get_canarie_api_response
 from .utility_rest import validate_service_route
+from .utility_rest import get_service
 from .utility_rest import make_error_response
 from .utility_rest import request_wants_json
+from .utility_rest import make_json_response
+from .utility_rest import make_data_response
+from .utility_rest import request_wants_xml
+from .utility_rest import conditional_response
+from .utility_rest import CONFIGURATION_CACHE
+from .utility_rest import start_callback_dispatcher
+from .utility_rest import start_sweeper
+from .utility_rest import start_fair_scheduler
+from .utility_rest import get_backlog
+from .utility_rest import start_claim_purge
+from .utility_rest import get_claim_url
+from .utility_rest import start_result_purge
+from .utility_rest import start_registry_reload
+from .utility_rest import get_result_page
+from .utility_rest import make_status_response
 from .utility_rest import mongo
 from .reverse_proxied import ReverseProxied
+from .compressed_responses import CompressedResponses
 from .utility_rest import AnyIntConverter
+from .metrics import METRICS
+from .fair_scheduler import get_client_backlog
+from .request_authorisation import validate_authorisation
+from .vesta_exceptions import UnknownClaimError
+from .vesta_exceptions import InvalidParameterError
+from . import claim_check
 from . import __meta__
 
+# Compress responses for clients accepting it
+if APP.config['RESPONSE_COMPRESSION']['ENABLED']:
+    APP.wsgi_app = CompressedResponses(APP.wsgi_app,
+                                       APP.config['RESPONSE_COMPRESSION'])
+
 # Handle Reverse Proxy setups
 APP.wsgi_app = ReverseProxied(APP.wsgi_app)
 
 START_UTC_TIME = datetime.datetime.utcnow()
 FL_API_URL = APP.config['FLOWER_API_URL']
 
+if APP.config['CALLBACKS']['ENABLED'] and \
+   APP.config['CALLBACKS']['IN_GATEWAY']:
+    start_callback_dispatcher()
+
+if APP.config['SWEEPER']['ENABLED'] and APP.config['SWEEPER']['IN_GATEWAY']:
+    start_sweeper()
+
+if APP.config['FAIR_SCHEDULING']['IN_GATEWAY'] and \
+   any(service.fair_scheduling for service in get_registry()):
+    start_fair_scheduler()
+
+if APP.config['CLAIM_CHECK']['ENABLED']:
+    start_claim_purge()
+
+if APP.config['RESULT_STREAMING']['ENABLED']:
+    start_result_purge()
+
 # REST requests required by CANARIE
 CANARIE_API_VALID_REQUESTS = ['doc',
                               'releasenotes',
@@ -127,8 +174,10 @@ def global_info():
     Return an overview of the services hosted by this REST instance
     """
     info_ = {'version': __meta__.API_VERSION,
-             'services': APP.config['WORKER_SERVICES']}
-    return jsonify(info_)
+             'services': dict((service.route, service.config) for
+                              service in get_registry())}
+    return conditional_response((get_config_generation(), 'global_info'),
+                                lambda: make_data_response(info_))
 
 
 @APP.route("/info")
@@ -147,58 +196,93 @@ def info(service_route='.'):
 
     # Handle the special case where info is requested without any route
     # In this case we return the global info
-    if service_route == '.' and \
-       service_route not in APP.config['WORKER_SERVICES']:
+    if service_route == '.' and service_route not in get_registry():
         return global_info()
 
-    service_name = validate_service_route(service_route)
-
-    service_info_categories = ['name',
-                               'synopsis',
-                               'institution',
-                               'releaseTime',
-                               'supportEmail',
-                               'category',
-                               'researchSubject']
-    worker_config = APP.config['WORKER_SERVICES'][service_name]
-    service_info = []
-    service_info.append(('version', '{0}_{1}'.
-                         format(__meta__.API_VERSION,
-                                worker_config['version'])))
-    for category in service_info_categories:
-        cat = worker_config[category]
-        service_info.append((category, cat))
-
-    tags = worker_config['tags']
-    service_info.append(('tags', tags.split(',')))
+    service = get_service(service_route)
+    service_name = service.service_name
 
     # Get information on registered workers ---------------------
-    queue_name = worker_config['celery_queue_name']
+    queue_names = [queue_name for queue_name, _ in service.service_queues]
     logger.info("Refreshing knowledge on all worker queues")
     inspector = CELERY_APP.control.inspect()
     active_queues = inspector.active_queues()
 
     logger.debug("Worker info : %s", active_queues)
-    logger.debug("Queue info : %s", queue_name)
+    logger.debug("Queue info : %s", queue_names)
 
     active_workers = 0
 
     if active_queues:
         for _ql_ in active_queues.values():
             for _q_ in _ql_:
-                if queue_name in _q_['name']:
+                if any(queue_name in _q_['name'] for
+                       queue_name in queue_names):
                     active_workers += 1
 
     logger.info("There are %s known workers found", active_workers)
+
+    client_backlog = None
+    if service.fair_scheduling:
+        client_backlog = get_client_backlog(get_backlog(), service_name)
+
+    # The body only changes with the configuration and the workers
+    version = (get_config_generation(), service_name, active_workers,
+               repr(client_backlog))
+    return conditional_response(
+        version, lambda: render_info(service_name, active_workers,
+                                     client_backlog))
+
+
+def render_info(service_name, active_workers, client_backlog):
+    """
+    Render the info of a service.
+
+    :param service_name: Name of the service.
+    :param active_workers: Number of workers consuming the service queues.
+    :param client_backlog: Held submissions by client for services with fair
+                           scheduling, otherwise None.
+    """
+    service_info = list(CONFIGURATION_CACHE.get(
+        ('info', service_name), lambda: get_static_info(service_name)))
     service_info.append(('activeWorkers', active_workers))
 
+    if client_backlog is not None:
+        service_info.append(('clientBacklog', client_backlog))
+
     service_info = collections.OrderedDict(service_info)
 
-    if request_wants_json():
-        return jsonify(service_info)
+    if request_wants_json() or request_wants_xml():
+        return make_data_response(service_info)
     return render_template('default.html', Title="Info", Tags=service_info)
 
 
+def get_static_info(service_name):
+    """
+    Get the part of the info of a service given by its configuration.
+
+    :param service_name: Name of the service.
+    :returns: Tuple of the (name, value) info items.
+    """
+    service_info_categories = ['name',
+                               'synopsis',
+                               'institution',
+                               'releaseTime',
+                               'supportEmail',
+                               'category',
+                               'researchSubject']
+    service = get_registry().get_by_name(service_name)
+    service_info = []
+    service_info.append(('version', '{0}_{1}'.
+                         format(__meta__.API_VERSION, service.version)))
+    for category in service_info_categories:
+        cat = service.config[category]
+        service_info.append((category, cat))
+
+    service_info.append(('tags', list(service.tags)))
+    return tuple(service_info)
+
+
 @APP.route("/stats")
 @APP.route("/<service_route>/stats")
 @APP.route("/<service_route>/service/stats")
@@ -217,14 +301,94 @@ def stats(service_route='.'):
 
     service_stats = {}
     service_stats['lastReset'] = START_UTC_TIME.strftime('%Y-%m-%dT%H:%M:%SZ')
-    service_stats['invocations'] = mongo.db.Invocations.count({"datetime": {"$gt": START_UTC_TIME}, "service": service_name})
+    service_stats['invocations'] = mongo.db.Invocations.count_documents(
+        {"datetime": {"$gt": START_UTC_TIME}, "service": service_name})
 
-    if request_wants_json():
-        return jsonify(service_stats)
+    version = (service_name, service_stats['lastReset'],
+               service_stats['invocations'])
+    return conditional_response(version,
+                                lambda: render_stats(service_stats))
+
+
+def render_stats(service_stats):
+    """
+    Render the stats of a service.
+    """
+    if request_wants_json() or request_wants_xml():
+        return make_data_response(service_stats)
 
     return render_template('default.html', Title="Stats", Tags=service_stats)
 
 
+@APP.route("/metrics")
+def metrics():
+    """
+    Return the metrics of the current gateway process, to authorised clients
+    only.
+    """
+    validate_authorisation(request, APP.config['SECURITY'])
+    return make_json_response(METRICS.snapshot())
+
+
+@APP.route("/status")
+@APP.route("/<service_route>/status")
+def task_status(service_route='.'):
+    """
+    Get the state of the task given by the *uuid* argument, with an ETag so
+    that pollers get *304 Not Modified* until the state changes.
+    """
+    return make_status_response('status', service_route)
+
+
+@APP.route("/cancel")
+@APP.route("/<service_route>/cancel")
+def task_cancel(service_route='.'):
+    """
+    Cancel the task given by the *uuid* argument and get its state.
+    """
+    return make_status_response('cancel', service_route)
+
+
+@APP.route("/result")
+@APP.route("/<service_route>/result")
+def result(service_route='.'):
+    """
+    Stream a page of the items of a task result as NDJSON, given by the
+    *offset* and *limit* arguments.
+    """
+    return get_result_page(service_route)
+
+
+@APP.route("/claim_check", methods=['POST'])
+@APP.route("/claim_check/<claim_id>")
+def claim(claim_id=None):
+    """
+    Get the payload of a claim, or store the JSON body of the request as a
+    claim and return its reference, e.g.: for a worker offloading a large
+    result.
+
+    Claims are fetched with the *token* of their URL, uploads are authorised
+    by the Authorization header.
+    """
+    security = APP.config['SECURITY']
+    if claim_id is None or not claim_check.is_valid_token(
+            claim_id, request.args.get('token'),
+            security.get('AUTHORISATION_KEY')):
+        validate_authorisation(request, security)
+    if claim_id is None:
+        try:
+            claim_id = claim_check.upload(mongo.db, request.get_data())
+        except ValueError:
+            raise InvalidParameterError('body', 'not a JSON document')
+        return make_json_response(
+            claim_check.make_reference(claim_id, get_claim_url(claim_id)))
+
+    body = claim_check.fetch(mongo.db, claim_id)
+    if body is None:
+        raise UnknownClaimError(claim_id)
+    return APP.response_class(body, mimetype='application/json')
+
+
 @APP.route("/")
 @APP.route("/<any(" +
            ",".join(CANARIE_API_VALID_REQUESTS) + "):api_request>")
@@ -245,6 +409,10 @@ def simple_requests_handler(api_request='home', service_route='.'):
     return get_canarie_api_response(service_route, api_request)
 
 
+# Rule of the home route, replaced when the services are reloaded
+_HOME_ROUTE = {'rule': None, 'configured': False}
+
+
 def configure_home_route():
     """
     Configure the route /<service_route>
@@ -258,15 +426,76 @@ def configure_home_route():
     logger.debug("Root path is %s", APP.root_path)
     logger.info("Static path is %s", APP.static_folder)
 
-    known_services_routes = list(APP.config['WORKER_SERVICES'].keys())
+    known_services_routes = get_registry().routes()
     logger.info("Configuring home route for services %s",
                 known_services_routes)
 
-    routes = [r for r in known_services_routes if r != '.']
+    routes = sorted(r for r in known_services_routes if r != '.')
 
+    rule = None
     if len(routes) > 0:
         rule = '/<any({0}):service_route>/'.format(','.join(routes))
+
+    if _HOME_ROUTE['configured']:
+        if rule != _HOME_ROUTE['rule']:
+            logger.debug("Replacing route rule {0} by {1}"
+                         .format(_HOME_ROUTE['rule'], rule))
+            APP.url_map = rebuild_url_map(APP.url_map, _HOME_ROUTE['rule'],
+                                          rule)
+    elif rule is not None:
         logger.debug("Adding route rule : {0}".format(rule))
         APP.add_url_rule(rule, None, simple_requests_handler)
+    _HOME_ROUTE['rule'] = rule
+    _HOME_ROUTE['configured'] = True
+
+    logger.debug("Flask url map: {0}".format(APP.url_map))
+
+
+def rebuild_url_map(url_map, old_rule, new_rule):
+    """
+    Copy the URL map of the application replacing the home route rule.
+
+    The new map is swapped in at once so that requests being routed keep
+    using the old one.
+
+    :param url_map: Current URL map.
+    :param old_rule: Home route rule to remove, if any.
+    :param new_rule: Home route rule to add, if any.
+    :returns: New URL map.
+    """
+    new_map = Map(converters=url_map.converters,
+                  strict_slashes=url_map.strict_slashes,
+                  redirect_defaults=url_map.redirect_defaults,
+                  default_subdomain=url_map.default_subdomain,
+                  host_matching=url_map.host_matching)
+    for rule in url_map.iter_rules():
+        if rule.rule != old_rule:
+            rule_copy = rule.empty()
+            rule_copy.provide_automatic_options = getattr(
+                rule, 'provide_automatic_options', False)
+            new_map.add(rule_copy)
+    if new_rule is not None:
+        home_rule = APP.url_rule_class(
+            new_rule, endpoint=simple_requests_handler.__name__,
+            methods=['GET', 'HEAD', 'OPTIONS'])
+        home_rule.provide_automatic_options = True
+        new_map.add(home_rule)
+    return new_map
+
+
+def reconfigure_services(registry):
+    """
+    Update what depends on the services once the registry is reloaded.
+
+    :param registry: The new service registry.
+    """
+    if _HOME_ROUTE['configured']:
+        configure_home_route()
+    if APP.config['FAIR_SCHEDULING']['IN_GATEWAY'] and \
+       any(service.fair_scheduling for service in registry):
+        start_fair_scheduler()
+
 
-    logger.debug("Flask url map: {0}".format(APP.url_map))
\ No newline at end of file
+# Reload the services when their configuration changes
+if APP.config['REGISTRY_RELOAD']['ENABLED']:
+    start_registry_reload(reconfigure_services)
\ No newline at end of file
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Gunicorn configuration of a service gateway.
+
+The application is imported once by the master and forked into the workers,
+each re-creating its connections and starting its background workers (see
+:py:mod:`~.forking`). Use it with::
+
+   gunicorn -c python:VestaRestPackage.gunicorn_config my_service.rest_api:APP
+
+The number of workers and the bind address are given by the VRP_WORKERS
+(default 4) and VRP_BIND (default 127.0.0.1:8000) environment variables, any
+other setting by the command line.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from os import environ
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage import forking
+
+# Background workers are started by the forked workers only
+forking.prepare_fork()
+
+preload_app = True
+workers = int(environ.get('VRP_WORKERS', 4))
+bind = environ.get('VRP_BIND', '127.0.0.1:8000')
+
+
+def post_fork(server, worker):
+    """
+    Reset the connections, caches and background workers of a new worker.
+    """
+    forking.after_fork()
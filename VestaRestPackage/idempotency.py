@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+This module implements idempotent task submissions.
+
+A submission is identified by a key which is either supplied by the client
+through a request header or computed as a fingerprint of the service, the
+document URL and the request parameters, keys being scoped by client. The
+first submission claims the key in MongoDB along with the UUID of the task it
+publishes while later submissions of the same key get this UUID back instead
+of publishing the task again.
+
+A claimed key is pending until its request record is stored, later
+submissions being rejected meanwhile so that they never get a UUID which
+can't be looked up yet. A key left pending longer than the pending timeout,
+e.g.: by a crashed process, is claimed again.
+
+Keys are stored as the *_id* of their document so that MongoDB enforces their
+uniqueness. Their lifetime is controlled by a TTL index on the *datetime*
+field (see the *Submissions* entry of *MONGO_COLLECTIONS* in
+:py:mod:`~.VestaRestPackage.default_configuration`).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import hashlib
+import logging
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import DuplicateKeyError
+from bson import json_util
+
+# -- Project specific --------------------------------------------------------
+from .vesta_exceptions import PendingSubmissionError
+
+
+def hash_submission(submission):
+    """
+    Get the SHA-256 hex digest of a JSON serializable submission.
+    """
+    encoded = json.dumps(submission, sort_keys=True, default=json_util.default)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def get_idempotency_key(settings, headers, service_name, client_id, doc_url,
+                        params):
+    """
+    Get the idempotency key of a submission.
+
+    :param settings: The *IDEMPOTENCY* configuration structure.
+    :param headers: Headers of the submission request.
+    :param service_name: Name of the service which is requested.
+    :param client_id: Identity of the client making the submission.
+    :param doc_url: URL of the document to process.
+    :param params: Parameters which will be given to the worker.
+    :returns: The key or None if the submission must not be deduplicated.
+    """
+    logger = logging.getLogger(__name__)
+    if not settings.get('ENABLED', False):
+        return None
+
+    client_key = headers.get(settings.get('HEADER', 'Idempotency-Key'))
+    if client_key:
+        logger.debug("Submission has idempotency key %s", client_key)
+        return u'{0}:key:{1}'.format(service_name,
+                                     hash_submission([client_id, client_key]))
+
+    if settings.get('FINGERPRINT', False):
+        fingerprint = hash_submission({'service': service_name,
+                                       'client': client_id,
+                                       'doc_url': doc_url,
+                                       'params': params})
+        logger.debug("Submission has fingerprint %s", fingerprint)
+        return u'{0}:fp:{1}'.format(service_name, fingerprint)
+
+    return None
+
+
+def claim_key(collection, key, task_uuid, pending_timeout):
+    """
+    Claim an idempotency key for a task which is about to be submitted.
+
+    The key is pending until :py:func:`confirm_key` is called.
+
+    :param collection: MongoDB collection holding the idempotency keys.
+    :param key: Idempotency key of the submission.
+    :param task_uuid: UUID of the task which will be submitted.
+    :param pending_timeout: Seconds after which a pending key is considered
+                            abandoned and may be claimed again.
+    :returns: None if the key is now owned by *task_uuid*, else the UUID of
+              the task which already owns the key.
+    :raises: :py:exc:`~.vesta_exceptions.PendingSubmissionError` if the key
+             is pending.
+    """
+    logger = logging.getLogger(__name__)
+    now = datetime.datetime.utcnow()
+    document = {'_id': key, 'uuid': task_uuid, 'datetime': now,
+                'pending': True}
+    try:
+        collection.insert_one(document)
+        return None
+    except DuplicateKeyError:
+        data = collection.find_one({'_id': key})
+        if data is None:
+            logger.debug("Idempotency key %s expired meanwhile, claiming "
+                         "it again", key)
+            return claim_key(collection, key, task_uuid, pending_timeout)
+        if not data.get('pending'):
+            logger.info("Idempotency key %s is owned by task %s",
+                        key, data['uuid'])
+            return data['uuid']
+        if data['datetime'] > now - datetime.timedelta(
+                seconds=pending_timeout):
+            logger.info("Idempotency key %s is pending for task %s",
+                        key, data['uuid'])
+            raise PendingSubmissionError()
+
+    logger.warning("Idempotency key %s has been pending since %s, claiming it "
+                   "again", key, data['datetime'])
+    result = collection.replace_one(
+        {'_id': key, 'uuid': data['uuid'], 'pending': True}, document)
+    if result.matched_count:
+        return None
+    return claim_key(collection, key, task_uuid, pending_timeout)
+
+
+def confirm_key(collection, key, task_uuid):
+    """
+    Make the UUID of a key available to later submissions, once the request
+    record of its task is stored.
+
+    :param collection: MongoDB collection holding the idempotency keys.
+    :param key: Idempotency key of the submission.
+    :param task_uuid: UUID of the task which owns the key.
+    """
+    collection.update_one({'_id': key, 'uuid': task_uuid},
+                          {'$unset': {'pending': ''}})
+
+
+def release_key(collection, key, task_uuid):
+    """
+    Release an idempotency key, e.g.: when its task could not be submitted.
+
+    :param collection: MongoDB collection holding the idempotency keys.
+    :param key: Idempotency key of the submission.
+    :param task_uuid: UUID of the task which owns the key.
+    """
+    logger = logging.getLogger(__name__)
+    logger.debug("Releasing idempotency key %s of task %s", key, task_uuid)
+    collection.delete_one({'_id': key, 'uuid': task_uuid})
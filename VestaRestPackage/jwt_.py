@@ -33,6 +33,22 @@ def generate_token(signature_key, audience, algorithm, duration):
     return signed_token
 
 
+def decode_token(signed_token, signature_key, audience):
+    """
+    Get the claims of a token after checking its validity.
+
+    :param Signed Token, HS512: HMAC using SHA-512 hash algorithm
+    :returns: Dict of the claims of the token
+    :raises: :py:exc:`jwt.InvalidTokenError` if the token isn't valid.
+    """
+    decoded_signature = base64.b64decode(signature_key)
+
+    return jwt.decode(signed_token,
+                      decoded_signature,
+                      audience=audience,
+                      leeway=10)
+
+
 def validate_token(signed_token, signature_key, audience):
     """
     Check the validity of a token.
@@ -41,12 +57,7 @@ def validate_token(signed_token, signature_key, audience):
     """
     logger = logging.getLogger(__name__)
 
-    decoded_signature = base64.b64decode(signature_key)
-
-    claim = jwt.decode(signed_token,
-                       decoded_signature,
-                       audience=audience,
-                       leeway=10)
+    claim = decode_token(signed_token, signature_key, audience)
     logger.info("Successfully validated JWT : %s", claim)
 
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+In-process metrics of the service gateway.
+
+Metrics are either counters, incremented by :py:meth:`Metrics.incr`, or
+observations, recorded by :py:meth:`Metrics.observe`, for which the count, sum
+and maximum of the observed values are kept. They are exposed by the
+*/metrics* route.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import threading
+
+
+class Metrics(object):
+    """
+    Thread-safe register of counters and observations.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._observations = {}
+
+    def incr(self, name, value=1):
+        """
+        Increment a counter.
+
+        :param name: Name of the counter.
+        :param value: Increment.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """
+        Record an observed value, e.g.: a latency or a size.
+
+        :param name: Name of the observation.
+        :param value: Observed value.
+        """
+        with self._lock:
+            count, total, maximum = self._observations.get(name, (0, 0, value))
+            self._observations[name] = (count + 1,
+                                        total + value,
+                                        max(maximum, value))
+
+    def snapshot(self):
+        """
+        Get the current value of all the metrics.
+
+        :returns: Dict of counter values and of observations summaries by
+                  name.
+        """
+        with self._lock:
+            metrics = dict(self._counters)
+            for name, (count, total, maximum) in self._observations.items():
+                metrics[name] = {'count': count,
+                                 'sum': total,
+                                 'mean': float(total) / count,
+                                 'max': maximum}
+        return metrics
+
+    def reset(self):
+        """
+        Reset all the metrics.
+        """
+        with self._lock:
+            self._counters = {}
+            self._observations = {}
+
+
+# Metrics of the current process
+METRICS = Metrics()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Preflight of the documents submitted for processing.
+
+A HEAD request on the URL of a document tells its size, type and validators
+(*ETag*, *Last-Modified*) without downloading it. Responses are cached by URL
+for *MAX_AGE* seconds, after which they are revalidated by a conditional
+request with their *ETag*, so that repeated submissions of a document cost
+nothing or a *304 Not Modified* response.
+
+The preflight identifies documents for the result cache and routes
+submissions to the size-class queues of a service: small documents can then be
+sent to a fast lane instead of waiting behind large ones.
+"""
+
+from future.standard_library import install_aliases
+install_aliases()
+
+# -- Standard lib ------------------------------------------------------------
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from collections import OrderedDict
+import threading
+import logging
+import time
+
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+
+# Returned by a conditional HEAD request when the document wasn't modified
+NOT_MODIFIED = object()
+
+
+class Preflight(object):
+    """
+    Cache of the HEAD responses of document URLs.
+    """
+    def __init__(self, settings):
+        """
+        :param settings: The *PREFLIGHT* configuration structure.
+        """
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def head(self, url, max_age=None):
+        """
+        Get the information of a document.
+
+        :param url: URL of the document.
+        :param max_age: Seconds during which a cached response is used without
+                        revalidation, defaults to the *MAX_AGE* setting.
+        :returns: Dict holding the *content_length*, *content_type*, *etag*
+                  and *last_modified* of the document, any of which may be
+                  None, or None if the HEAD request failed.
+        """
+        if max_age is None:
+            max_age = self.settings['MAX_AGE']
+        with self._lock:
+            cached = self._cache.get(url)
+        if cached is not None and time.time() - cached[0] < max_age:
+            METRICS.incr('preflight.hits')
+            return cached[1]
+
+        etag = cached[1]['etag'] if cached is not None else None
+        doc_info = self.fetch(url, etag)
+        if doc_info is NOT_MODIFIED:
+            METRICS.incr('preflight.revalidated')
+            doc_info = cached[1]
+        elif doc_info is None:
+            return None
+        else:
+            METRICS.incr('preflight.misses')
+
+        with self._lock:
+            self._cache.pop(url, None)
+            self._cache[url] = (time.time(), doc_info)
+            while len(self._cache) > self.settings['MAX_ENTRIES']:
+                self._cache.popitem(last=False)
+        return doc_info
+
+    def fetch(self, url, etag=None):
+        """
+        Issue a HEAD request on a document URL.
+
+        :param url: URL of the document.
+        :param etag: ETag of the cached response, if any, making the request
+                     conditional.
+        :returns: Dict of the document information, :py:data:`NOT_MODIFIED`
+                  if the document wasn't modified since *etag* or None if the
+                  request failed.
+        """
+        logger = logging.getLogger(__name__)
+        head_request = Request(url)
+        head_request.get_method = lambda: 'HEAD'
+        if etag is not None:
+            head_request.add_header('If-None-Match', etag)
+        try:
+            response = urlopen(head_request, timeout=self.settings['TIMEOUT'])
+        except HTTPError as exc:
+            if exc.code == 304 and etag is not None:
+                return NOT_MODIFIED
+            logger.warning("Preflight of document %s failed : %s",
+                           url, repr(exc))
+            self.forget(url)
+            return None
+        except Exception as exc:
+            logger.warning("Preflight of document %s failed : %s",
+                           url, repr(exc))
+            self.forget(url)
+            return None
+        headers = response.info()
+        response.close()
+
+        content_length = headers.get('Content-Length')
+        try:
+            content_length = int(content_length)
+        except (TypeError, ValueError):
+            content_length = None
+        return {'content_length': content_length,
+                'content_type': headers.get('Content-Type'),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')}
+
+    def forget(self, url):
+        """
+        Drop the cached response of a document URL.
+        """
+        with self._lock:
+            self._cache.pop(url, None)
+
+    def clear(self):
+        """
+        Drop all the cached responses.
+        """
+        with self._lock:
+            self._cache.clear()
+
+
+def match_size_class(size_classes, doc_info):
+    """
+    Get the first size class matching a document.
+
+    A size class matches documents whose size is at most its *max_size* and,
+    if it gives *content_types*, whose type starts with one of them.
+
+    :param size_classes: List of size classes of a service.
+    :param doc_info: Information of the document given by
+                     :py:meth:`Preflight.head`.
+    :returns: The matching size class or None.
+    """
+    if doc_info is None or doc_info['content_length'] is None:
+        return None
+    content_type = doc_info['content_type'] or ''
+    for size_class in size_classes:
+        if doc_info['content_length'] > size_class['max_size']:
+            continue
+        content_types = size_class.get('content_types')
+        if content_types and \
+           not any(content_type.startswith(prefix) for
+                   prefix in content_types):
+            continue
+        return size_class
+    return None
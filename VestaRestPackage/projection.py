@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Projection of responses on the fields requested by clients.
+
+A field specification is a comma separated list of dotted paths, e.g.:
+``status,result.current``. It is compiled once into a tree of the requested
+fields, cached by specification, which is then applied to responses.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import threading
+
+# Maximal number of cached compiled projections
+MAX_CACHED_PROJECTIONS = 256
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def compile_projection(spec):
+    """
+    Compile a field specification.
+
+    :param spec: Comma separated list of dotted paths.
+    :returns: Tree of the requested fields, as nested dicts whose leaves are
+              True.
+    """
+    with _CACHE_LOCK:
+        tree = _CACHE.get(spec)
+    if tree is not None:
+        return tree
+
+    tree = {}
+    for path in spec.split(','):
+        keys = [key for key in path.strip().split('.') if key]
+        if not keys:
+            continue
+        node = tree
+        for key in keys[:-1]:
+            child = node.get(key)
+            if child is True:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = True
+
+    with _CACHE_LOCK:
+        if len(_CACHE) >= MAX_CACHED_PROJECTIONS:
+            _CACHE.clear()
+        _CACHE[spec] = tree
+    return tree
+
+
+def apply_projection(value, tree):
+    """
+    Keep the requested fields of a value.
+
+    :param value: Dict to project. Values which aren't dicts are kept whole.
+    :param tree: Compiled projection given by :py:func:`compile_projection`.
+    :returns: Projected copy of *value*.
+    """
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is True:
+            projected[key] = value[key]
+        else:
+            projected[key] = apply_projection(value[key], subtree)
+    return projected
+
+
+def clear_cache():
+    """
+    Forget the compiled projections.
+    """
+    with _CACHE_LOCK:
+        _CACHE.clear()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Hot reload of the service registry without restarting the gateway.
+
+The *WORKER_SERVICES* configuration is polled every *INTERVAL* seconds of the
+*REGISTRY_RELOAD* setting from its *SOURCE*:
+
+* *file*: a configuration file defining *WORKER_SERVICES*, given by *PATH* or
+  by the VRP_CONFIGURATION environment variable. It is only read when its
+  modification time or size changes;
+* *mongo*: the *COLLECTION* of the gateway database, holding one document per
+  service whose *_id* is the route of the service.
+
+When the configuration changes, a new registry is compiled and swapped in at
+once, increasing the configuration generation, and a callback then updates
+what depends on the services, e.g.: the home route. Requests keep reading the
+registry without any lock. A configuration failing validation, or which is
+empty or lacks *WORKER_SERVICES*, is logged and ignored until it changes
+again, the current registry being kept.
+
+Services are added, updated or removed this way, but the queues declared with
+a *max_priority* are only declared again by a restart.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from os import environ, stat
+import hashlib
+import logging
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from flask import Config
+from bson import json_util
+
+# -- Project specific --------------------------------------------------------
+from .vesta_exceptions import SettingsException
+from . import background
+
+
+class FileSource(object):
+    """
+    Source reading *WORKER_SERVICES* from a configuration file.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of the configuration file.
+        """
+        self.path = path
+
+    def read(self, fingerprint):
+        """
+        Read the configuration if it changed.
+
+        :param fingerprint: Fingerprint of the last read configuration.
+        :returns: Tuple of the fingerprint of the configuration and of the
+                  configuration or of None if it didn't change.
+        """
+        status = stat(self.path)
+        new_fingerprint = (status.st_mtime, status.st_size)
+        if new_fingerprint == fingerprint:
+            return fingerprint, None
+        config = Config('')
+        config.from_pyfile(self.path)
+        # A missing configuration is as invalid as an empty one
+        return new_fingerprint, config.get('WORKER_SERVICES') or {}
+
+
+class MongoSource(object):
+    """
+    Source reading *WORKER_SERVICES* from a MongoDB collection.
+    """
+    def __init__(self, get_collection):
+        """
+        :param get_collection: Callable returning the collection of the
+                               services.
+        """
+        self.get_collection = get_collection
+
+    def read(self, fingerprint):
+        """
+        Read the configuration if it changed.
+
+        :param fingerprint: Fingerprint of the last read configuration.
+        :returns: Tuple of the fingerprint of the configuration and of the
+                  configuration or of None if it didn't change.
+        """
+        worker_services = {}
+        for document in self.get_collection().find():
+            route = document.pop('_id')
+            worker_services[route] = document
+        encoded = json.dumps(worker_services, sort_keys=True,
+                             default=json_util.default)
+        new_fingerprint = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+        if new_fingerprint == fingerprint:
+            return fingerprint, None
+        return new_fingerprint, worker_services
+
+
+def open_source(settings, get_database):
+    """
+    Get the source selected by the configuration.
+
+    :param settings: The *REGISTRY_RELOAD* configuration structure.
+    :param get_database: Callable returning the gateway MongoDB database.
+    :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the source
+             can't be used.
+    """
+    if settings['SOURCE'] == 'mongo':
+        return MongoSource(lambda: get_database()[settings['COLLECTION']])
+    if settings['SOURCE'] == 'file':
+        path = settings['PATH'] or environ.get('VRP_CONFIGURATION')
+        if not path:
+            raise SettingsException('Registry reload from a file needs a '
+                                    'PATH or a VRP_CONFIGURATION')
+        return FileSource(path)
+    raise SettingsException('Unknown registry reload source {0}'
+                            .format(settings['SOURCE']))
+
+
+class RegistryReloader(object):
+    """
+    Class which reloads the service registry when its source changes.
+    """
+    def __init__(self, source, load_registry, on_reload, settings):
+        """
+        :param source: Source of the configuration, e.g.:
+                       :py:class:`FileSource`.
+        :param load_registry: Callable compiling and swapping in the registry
+                              of a *WORKER_SERVICES* configuration, raising
+                              SettingsException if it is invalid.
+        :param on_reload: Callable taking the new registry, called once it is
+                          swapped in.
+        :param settings: The *REGISTRY_RELOAD* configuration structure.
+        """
+        self.source = source
+        self.load_registry = load_registry
+        self.on_reload = on_reload
+        self.settings = settings
+        self.fingerprint = None
+
+    def start(self):
+        """
+        Start reloading in a background worker of the current process.
+        """
+        return background.start_worker('registry_reload',
+                                       self.settings['INTERVAL'],
+                                       self.check)
+
+    def check(self):
+        """
+        Reload the registry if its configuration changed.
+
+        :returns: The new registry or None if it wasn't reloaded.
+        """
+        logger = logging.getLogger(__name__)
+        fingerprint, worker_services = self.source.read(self.fingerprint)
+        if worker_services is None:
+            return None
+        self.fingerprint = fingerprint
+        if not isinstance(worker_services, dict) or not worker_services:
+            logger.error("Ignoring the empty or invalid configuration of the "
+                         "services")
+            return None
+        try:
+            registry = self.load_registry(worker_services)
+        except SettingsException:
+            logger.exception("Ignoring the invalid configuration of the "
+                             "services")
+            return None
+        logger.info("Reloaded services %s, configuration generation is %s",
+                    registry.routes(), registry.generation)
+        self.on_reload(registry)
+        return registry
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Storage of the request records kept in the *Requests* collection.
+
+Two layouts are available, selected by the *REQUESTS_STORAGE* configuration
+value:
+
+legacy
+   The task UUID is stored as a string in a *uuid* field which needs its own
+   index alongside the default *_id* index.
+
+compact
+   The task UUID is stored as a binary UUID (BSON subtype 4) in *_id* and
+   fields have short names, so that lookups by UUID are primary key hits and
+   the *_id* index is the only one needed.
+
+Both layouts expose request records as dicts with the same field names
+(*uuid*, *service*, *datetime*, *activity*, ...).
+
+Records stored in the legacy layout are converted to the compact layout with::
+
+    vrp_migrate_requests
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from logging.config import fileConfig
+import datetime
+import logging
+import uuid as uuid_
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import BulkWriteError
+from bson.binary import Binary, UUID_SUBTYPE
+
+THIS_DIR = abspath(dirname(__file__))
+
+
+class RequestRecords(object):
+    """
+    Request records stored in the legacy layout.
+    """
+    def __init__(self, collection):
+        """
+        :param collection: MongoDB collection holding the request records.
+        """
+        self.collection = collection
+
+    def field(self, name):
+        """
+        Get the stored name of a field, e.g.: to build queries and indexes.
+
+        :param name: Name of the field in request records.
+        """
+        return name
+
+    def selector(self, uuid):
+        """
+        Get the query selecting the record of a UUID.
+
+        :param uuid: UUID of a given request
+        :returns: Query or None if the UUID cannot exist.
+        """
+        return {'uuid': uuid}
+
+    def document_id(self, data):
+        """
+        Get the *_id* of the stored document of a request record, e.g.: to
+        paginate on it.
+
+        :param data: Request record.
+        """
+        return data['_id']
+
+    def to_document(self, uuid, fields):
+        """
+        Convert a request record into a document to store.
+        """
+        document = dict(fields)
+        document['uuid'] = uuid
+        return document
+
+    def from_document(self, document):
+        """
+        Convert a stored document into a request record.
+        """
+        return document
+
+    def insert(self, uuid, **fields):
+        """
+        Store the record of a request.
+
+        :param uuid: UUID of a given request
+        :param fields: Fields of the request record.
+        """
+        self.collection.insert_one(self.to_document(uuid, fields))
+
+    def find(self, uuid):
+        """
+        Get the record of a request.
+
+        :param uuid: UUID of a given request
+        :returns: The request record or None if there is none.
+        """
+        selector = self.selector(uuid)
+        if selector is None:
+            return None
+        document = self.collection.find_one(selector)
+        if document is None:
+            return None
+        return self.from_document(document)
+
+    def update(self, uuid, **fields):
+        """
+        Update fields of the record of a request.
+
+        :param uuid: UUID of a given request
+        :param fields: Fields to set.
+        """
+        update = dict((self.field(name), value) for
+                      name, value in fields.items())
+        self.collection.update_one(self.selector(uuid), {'$set': update})
+
+    def update_many(self, conditions, **fields):
+        """
+        Update fields of the records matching the given field conditions.
+
+        :param conditions: Dict of the field values or query operators of the
+                           records.
+        :param fields: Fields to set.
+        :returns: Number of updated records.
+        """
+        query = dict((self.field(name), value) for
+                     name, value in conditions.items())
+        update = dict((self.field(name), value) for
+                      name, value in fields.items())
+        return self.collection.update_many(query,
+                                           {'$set': update}).modified_count
+
+    def find_many(self, sort=None, limit=0, **fields):
+        """
+        Iterate over the records matching the given field conditions.
+
+        :param sort: List of (field name, direction) pairs to sort on.
+        :param limit: Maximum number of records, 0 for no limit.
+        :param fields: Field values or query operators (e.g.:
+                       {'$exists': False}) of the records.
+        :returns: Generator of request records.
+        """
+        query = dict((self.field(name), value) for
+                     name, value in fields.items())
+        cursor = self.collection.find(query).limit(limit)
+        if sort:
+            cursor = cursor.sort([(self.field(name), direction) for
+                                  name, direction in sort])
+        for document in cursor:
+            yield self.from_document(document)
+
+    def claim(self, uuid, flag):
+        """
+        Atomically unset a flag of the record of a request.
+
+        :param uuid: UUID of a given request
+        :param flag: Name of the flag field.
+        :returns: True if the flag was set and has been unset by this call.
+        """
+        selector = dict(self.selector(uuid))
+        selector[self.field(flag)] = True
+        result = self.collection.update_one(
+            selector, {'$unset': {self.field(flag): ''}})
+        return result.modified_count == 1
+
+    def lease(self, uuid, flag, lease_field, until):
+        """
+        Atomically lease the record of a request whose flag is set, e.g.: to
+        process it in a single process until the lease expires.
+
+        :param uuid: UUID of a given request
+        :param flag: Name of the flag field.
+        :param lease_field: Name of the field holding the end of the lease.
+        :param until: UTC datetime at which the lease expires.
+        :returns: True if the flag is set and the record is now leased by
+                  this call.
+        """
+        selector = dict(self.selector(uuid))
+        selector[self.field(flag)] = True
+        selector[self.field(lease_field)] = {
+            '$not': {'$gt': datetime.datetime.utcnow()}}
+        result = self.collection.update_one(
+            selector, {'$set': {self.field(lease_field): until}})
+        return result.modified_count == 1
+
+
+class CompactRequestRecords(RequestRecords):
+    """
+    Request records stored in the compact layout.
+    """
+    FIELDS = {'service': 's',
+              'datetime': 't',
+              'activity': 'a',
+              'cache_key': 'k',
+              'cached': 'c',
+              'callback_url': 'cu',
+              'callback_pending': 'cp',
+              'callback_status': 'cs',
+              'callback_lease': 'cl',
+              'final_status': 'f',
+              'expires': 'e',
+              'priority': 'pr',
+              'queue': 'q'}
+    NAMES = dict((short, name) for name, short in FIELDS.items())
+
+    def field(self, name):
+        return self.FIELDS.get(name, name)
+
+    def selector(self, uuid):
+        try:
+            return {'_id': Binary(uuid_.UUID(uuid).bytes, UUID_SUBTYPE)}
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def document_id(self, data):
+        return self.selector(data['uuid'])['_id']
+
+    def to_document(self, uuid, fields):
+        document = dict((self.field(name), value) for
+                        name, value in fields.items())
+        document['_id'] = Binary(uuid_.UUID(uuid).bytes, UUID_SUBTYPE)
+        return document
+
+    def from_document(self, document):
+        record = dict((self.NAMES.get(name, name), value) for
+                      name, value in document.items() if name != '_id')
+        # Depending on the pymongo version, binary UUIDs are decoded as UUID
+        # or as Binary instances.
+        task_uuid = document['_id']
+        if not isinstance(task_uuid, uuid_.UUID):
+            task_uuid = uuid_.UUID(bytes=bytes(task_uuid))
+        record['uuid'] = str(task_uuid)
+        return record
+
+
+def open_records(collection, storage):
+    """
+    Get the request records of a collection.
+
+    :param collection: MongoDB collection holding the request records.
+    :param storage: Storage layout, either 'legacy' or 'compact'.
+    """
+    if storage == 'compact':
+        return CompactRequestRecords(collection)
+    return RequestRecords(collection)
+
+
+def collection_size(database, name):
+    """
+    Get the size information of a collection.
+
+    :returns: Dict with the number of documents, the data size, the average
+              document size and the total index size in bytes.
+    """
+    stats = database.command('collStats', name)
+    return dict((key, stats.get(key, 0)) for key in
+                ['count', 'size', 'avgObjSize', 'totalIndexSize'])
+
+
+def migrate(collection, batch_size):
+    """
+    Convert the legacy request records of a collection to the compact layout.
+
+    Records are converted in batches and the migration can be resumed if
+    interrupted. Legacy records are deleted only once their converted record
+    is stored.
+
+    :param collection: MongoDB collection holding the request records.
+    :param batch_size: Number of records converted at once.
+    :returns: Number of converted records.
+    :raises: :py:exc:`~pymongo.errors.BulkWriteError` if converted records
+             cannot be stored for another reason than being already stored,
+             :py:exc:`RuntimeError` if their storage cannot be confirmed.
+    """
+    logger = logging.getLogger(__name__)
+    legacy = RequestRecords(collection)
+    compact = CompactRequestRecords(collection)
+    migrated = 0
+    while True:
+        documents = list(collection.find({'uuid': {'$exists': True}}).
+                         limit(batch_size))
+        if not documents:
+            break
+        converted = {}
+        for document in documents:
+            record = dict(legacy.from_document(document))
+            del record['_id']
+            uuid = record.pop('uuid')
+            converted[document['_id']] = compact.to_document(uuid, record)
+        try:
+            collection.insert_many(list(converted.values()), ordered=False)
+        except BulkWriteError as exc:
+            # Only the records converted by a previous interrupted migration
+            # may already exist.
+            details = exc.details
+            if details.get('writeConcernErrors') or \
+               any(error['code'] != 11000 for error in details['writeErrors']):
+                raise
+        # Legacy records are only deleted once their conversion is stored
+        stored = set(document['_id'] for document in collection.find(
+            {'_id': {'$in': [d['_id'] for d in converted.values()]}},
+            projection=['_id']))
+        done = [legacy_id for legacy_id, document in converted.items()
+                if document['_id'] in stored]
+        collection.delete_many({'_id': {'$in': done}})
+        migrated += len(done)
+        logger.info("Converted %s request records", migrated)
+        if len(done) < len(documents):
+            raise RuntimeError("{0} request records couldn't be converted".
+                               format(len(documents) - len(done)))
+
+    if 'uuid_1' in collection.index_information():
+        logger.info("Dropping the index on uuid")
+        collection.drop_index('uuid_1')
+    return migrated
+
+
+def main():
+    """
+    Command line entry point to convert request records to the compact layout
+    and report the space saved.
+    """
+    log_conf_fn = join(THIS_DIR, 'logging.ini')
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--batch_size", type=int, default=1000,
+                        help="Number of records converted at once")
+    parser.add_argument("-l",
+                        action='store',
+                        default=log_conf_fn,
+                        dest='logging_conf_fn',
+                        help='Set logging configuration filename')
+    args = parser.parse_args()
+    fileConfig(args.logging_conf_fn)
+
+    from .utility_rest import mongo
+
+    before = collection_size(mongo.db, 'Requests')
+    migrate(mongo.db.Requests, args.batch_size)
+    after = collection_size(mongo.db, 'Requests')
+    for key in sorted(before):
+        print("{key}: {before} -> {after}".format(key=key,
+                                                  before=before[key],
+                                                  after=after[key]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+This module implements a content-addressed cache of task results.
+
+A result is cached under a key built from the service name, the worker version,
+the normalized request parameters and the identity of the processed document.
+The document identity is its storage id when the document comes from the
+storage service, otherwise it is derived from the *ETag* (or *Last-Modified*
+and *Content-Length*) headers returned by the preflight HEAD request on its URL
+(see :py:mod:`~.VestaRestPackage.preflight`). Documents whose URL does not
+provide any of these headers are never cached.
+
+Entries are kept in MongoDB. Their size is bounded by the *MAX_RESULT_SIZE*
+setting and their number by the *MAX_ENTRIES* setting, the least recently used
+entries being evicted first. A TTL index on the *last_access* field expires
+unused entries (see the *ResultCache* entry of *MONGO_COLLECTIONS* in
+:py:mod:`~.VestaRestPackage.default_configuration`).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import hashlib
+import logging
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import DuplicateKeyError
+from pymongo import ASCENDING
+from bson import json_util
+
+
+def get_document_identity(storage_doc_id, doc_url, preflight):
+    """
+    Get a value identifying the contents of a document.
+
+    :param storage_doc_id: Id of the document in the storage service or None.
+    :param doc_url: URL of the document.
+    :param preflight: Instance of :py:class:`~.preflight.Preflight` used to
+                      get the validators of *doc_url*, which are always
+                      revalidated.
+    :returns: Document identity or None if it cannot be established.
+    """
+    logger = logging.getLogger(__name__)
+    if storage_doc_id is not None:
+        return u'storage:{0}'.format(storage_doc_id)
+    if not doc_url:
+        return None
+
+    doc_info = preflight.head(doc_url, max_age=0)
+    if doc_info is None:
+        logger.warning("Cannot identify document %s for caching", doc_url)
+        return None
+
+    if doc_info['etag']:
+        return u'url:{0}:etag:{1}'.format(doc_url, doc_info['etag'])
+    if doc_info['last_modified']:
+        return u'url:{0}:modified:{1}:{2}'.format(
+            doc_url, doc_info['last_modified'], doc_info['content_length'])
+    logger.debug("Document %s provides no validator, it won't be cached",
+                 doc_url)
+    return None
+
+
+def get_cache_key(service_name, version, params, doc_identity):
+    """
+    Build the cache key of a submission.
+
+    :param service_name: Name of the service which is requested.
+    :param version: Version of the worker of the service.
+    :param params: Parameters which will be given to the worker.
+    :param doc_identity: Identity of the document as given by
+                         :py:func:`get_document_identity`.
+    :returns: The cache key.
+    """
+    submission = json.dumps({'service': service_name,
+                             'version': version,
+                             'params': params,
+                             'document': doc_identity},
+                            sort_keys=True,
+                            default=json_util.default)
+    return hashlib.sha256(submission.encode('utf-8')).hexdigest()
+
+
+def lookup(collection, key):
+    """
+    Get a cached result.
+
+    :param collection: MongoDB collection holding the cached results.
+    :param key: Cache key as given by :py:func:`get_cache_key`.
+    :returns: The cached result or None if there is no such entry.
+    """
+    entry = collection.find_one_and_update(
+        {'_id': key},
+        {'$set': {'last_access': datetime.datetime.utcnow()},
+         '$inc': {'hits': 1}},
+        projection={'result': True})
+    if entry is None:
+        return None
+    return json.loads(entry['result'], object_hook=json_util.object_hook)
+
+
+def store(collection, key, result, max_result_size, max_entries):
+    """
+    Cache a result unless it is already cached or too large.
+
+    The least recently used entries are evicted if the cache holds more than
+    *max_entries* entries afterwards.
+
+    :param collection: MongoDB collection holding the cached results.
+    :param key: Cache key as given by :py:func:`get_cache_key`.
+    :param result: Result of a successful task.
+    :param max_result_size: Maximum size in bytes of the JSON encoded result.
+    :param max_entries: Maximum number of entries in the cache.
+    """
+    logger = logging.getLogger(__name__)
+    if collection.find_one({'_id': key}, projection={'_id': True}):
+        return
+
+    encoded_result = json.dumps(result, default=json_util.default)
+    if len(encoded_result) > max_result_size:
+        logger.info("Result for cache key %s is too large to be cached "
+                    "(%s bytes)", key, len(encoded_result))
+        return
+
+    try:
+        collection.insert_one({'_id': key,
+                               'result': encoded_result,
+                               'hits': 0,
+                               'last_access': datetime.datetime.utcnow()})
+    except DuplicateKeyError:
+        return
+    logger.info("Cached result under key %s", key)
+
+    excess = collection.estimated_document_count() - max_entries
+    if excess > 0:
+        evicted = [entry['_id'] for entry in
+                   collection.find(projection={'_id': True}).
+                   sort('last_access', ASCENDING).limit(excess)]
+        collection.delete_many({'_id': {'$in': evicted}})
+        logger.info("Evicted %s entries from the result cache", len(evicted))
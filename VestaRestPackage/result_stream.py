@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Out of band storage and streaming of large task results.
+
+Results larger than the *MIN_SIZE* setting once JSON encoded are stored once
+in the *results* GridFS bucket as NDJSON, one line per item for list results
+or a single line otherwise. Status responses then describe the stored result
+instead of including it and clients get its items from the result route by
+pages (*offset* / *limit*), streamed without loading the result in memory.
+
+Byte positions of every *CHECKPOINT_INTERVAL* items are kept with the stored
+result so that a page is reached without reading the items before it.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from itertools import islice
+import logging
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from gridfs.errors import FileExists, NoFile
+from bson import json_util
+import gridfs
+
+# -- Project specific --------------------------------------------------------
+from .metrics import METRICS
+from . import claim_check
+
+BUCKET = 'results'
+
+
+def encode_item(item):
+    """
+    Encode a result item as an NDJSON line.
+    """
+    return json.dumps(item, default=json_util.default).encode('utf-8') + b'\n'
+
+
+def store(database, uuid, result, checkpoint_interval):
+    """
+    Store a task result as NDJSON.
+
+    :param database: MongoDB database holding the results.
+    :param uuid: UUID of the task.
+    :param result: Result of the task.
+    :param checkpoint_interval: Number of items between two checkpoints.
+    """
+    logger = logging.getLogger(__name__)
+    items = result if isinstance(result, list) else [result]
+    results = gridfs.GridFS(database, collection=BUCKET)
+    checkpoints = []
+    position = 0
+    try:
+        grid_in = results.new_file(_id=uuid,
+                                   content_type='application/x-ndjson')
+        for index, item in enumerate(items):
+            if index % checkpoint_interval == 0:
+                checkpoints.append(position)
+            line = encode_item(item)
+            grid_in.write(line)
+            position += len(line)
+        grid_in.count = len(items)
+        grid_in.checkpoints = checkpoints
+        grid_in.checkpoint_interval = checkpoint_interval
+        grid_in.close()
+    except FileExists:
+        logger.debug("Result of task %s is already stored", uuid)
+        return
+    METRICS.incr('result_stream.stored')
+    METRICS.observe('result_stream.bytes', position)
+    logger.info("Stored result of task %s : %s items in %s bytes",
+                uuid, len(items), position)
+
+
+def describe(database, uuid, url):
+    """
+    Describe a stored result.
+
+    :param database: MongoDB database holding the results.
+    :param uuid: UUID of the task.
+    :param url: URL from which the result items are obtained.
+    :returns: Dict describing the stored result or None if the result of the
+              task isn't stored.
+    """
+    document = database['{0}.files'.format(BUCKET)].find_one(
+        {'_id': uuid}, projection=['length', 'count'])
+    if document is None or 'count' not in document:
+        return None
+    return {'streamed': True,
+            'count': document['count'],
+            'size': document['length'],
+            'url': url}
+
+
+def offload(database, uuid, result, min_size, checkpoint_interval, url):
+    """
+    Store a result out of band if it is large.
+
+    :param database: MongoDB database holding the results.
+    :param uuid: UUID of the task.
+    :param result: Result of the task.
+    :param min_size: Size in bytes from which results are stored.
+    :param checkpoint_interval: Number of items between two checkpoints.
+    :param url: URL from which the result items are obtained.
+    :returns: The result itself or the description of the stored result.
+    """
+    if len(json.dumps(result, default=json_util.default)) < min_size:
+        return result
+    store(database, uuid, result, checkpoint_interval)
+    return describe(database, uuid, url)
+
+
+def open_page(database, uuid, offset, limit):
+    """
+    Get a page of the items of a stored result.
+
+    :param database: MongoDB database holding the results.
+    :param uuid: UUID of the task.
+    :param offset: Index of the first item of the page.
+    :param limit: Maximal number of items of the page.
+    :returns: Tuple of the number of items of the result and of a generator
+              of the NDJSON lines of the page, or None if the result of the
+              task isn't stored.
+    :raises ValueError: If the offset or the limit is negative.
+    """
+    if offset < 0 or limit < 0:
+        raise ValueError('Negative offset {0} or limit {1}'.format(offset,
+                                                                   limit))
+    try:
+        grid_out = gridfs.GridFS(database, collection=BUCKET).get(uuid)
+    except NoFile:
+        return None
+    count = grid_out.count
+    METRICS.incr('result_stream.pages')
+    if offset >= count or limit == 0:
+        # Pages past the end are empty
+        grid_out.close()
+        return count, iter([])
+
+    checkpoint = min(offset // grid_out.checkpoint_interval,
+                     len(grid_out.checkpoints) - 1)
+    if checkpoint >= 0:
+        grid_out.seek(grid_out.checkpoints[checkpoint])
+        skipped = offset - checkpoint * grid_out.checkpoint_interval
+    else:
+        skipped = 0
+
+    def generate_lines():
+        try:
+            lines = iter(grid_out.readline, b'')
+            for line in islice(lines, skipped,
+                               skipped + min(limit, count - offset)):
+                yield line
+        finally:
+            grid_out.close()
+
+    return count, generate_lines()
+
+
+def purge(database, max_age):
+    """
+    Delete the stored results older than a given age.
+
+    :param database: MongoDB database holding the results.
+    :param max_age: Age in seconds.
+    :returns: Number of deleted results.
+    """
+    return claim_check.purge(database, max_age, BUCKET)
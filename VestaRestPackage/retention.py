@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Archival of expired request records and invocation logs.
+
+Documents of the collections listed in the *RETENTION* configuration structure
+which are older than their retention period are streamed into a gzip
+compressed NDJSON file, one JSON document per line, then deleted from MongoDB.
+The UUIDs of archived requests are kept as tombstones in the
+*ExpiredRequests* collection so that they can be reported as expired rather
+than unknown.
+
+This module is meant to be run periodically, e.g.: from cron::
+
+    vrp_archive
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from logging.config import fileConfig
+from functools import partial
+import datetime
+import logging
+import json
+import gzip
+import os
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import BulkWriteError
+from bson import json_util
+
+THIS_DIR = abspath(dirname(__file__))
+
+
+def store_tombstones(collection, records, documents):
+    """
+    Remember the UUIDs of archived requests.
+
+    :param collection: MongoDB collection holding the tombstones.
+    :param records: Instance of :py:class:`~.request_records.RequestRecords`
+    :param documents: Archived request documents.
+    """
+    now = datetime.datetime.utcnow()
+    tombstones = []
+    for document in documents:
+        data = records.from_document(document)
+        tombstones.append({'_id': data['uuid'],
+                           'service': data['service'],
+                           'datetime': now})
+    try:
+        collection.insert_many(tombstones, ordered=False)
+    except BulkWriteError:
+        # Tombstones of requests archived by a previous interrupted run.
+        pass
+
+
+def archive_collection(collection, max_age, archive_dir, batch_size,
+                       on_batch=None, time_field='datetime'):
+    """
+    Archive then delete the documents of a collection older than *max_age*.
+
+    Documents are streamed from the cursor to the archive file so that memory
+    usage doesn't depend on the number of documents. They are deleted only
+    once the archive file is complete.
+
+    :param collection: MongoDB collection to archive.
+    :param max_age: Retention period in seconds.
+    :param archive_dir: Directory in which the archive file is written.
+    :param batch_size: Number of documents fetched per cursor batch.
+    :param on_batch: Callable invoked with each batch of archived documents.
+    :param time_field: Name of the field holding the document creation time.
+    :returns: Tuple of the archive filename and the number of archived
+              documents.
+    """
+    logger = logging.getLogger(__name__)
+    now = datetime.datetime.utcnow()
+    query = {time_field: {'$lt': now - datetime.timedelta(seconds=max_age)}}
+
+    filename = join(archive_dir, '{coll}-{date}.ndjson.gz'.
+                    format(coll=collection.name,
+                           date=now.strftime('%Y%m%dT%H%M%SZ')))
+    partial_filename = filename + '.part'
+    logger.info("Archiving documents of %s older than %s seconds into %s",
+                collection.name, max_age, filename)
+
+    archived = 0
+    batch = []
+    archive_file = gzip.open(partial_filename, 'wb')
+    try:
+        for document in collection.find(query, batch_size=batch_size):
+            line = json.dumps(document, default=json_util.default) + '\n'
+            archive_file.write(line.encode('utf-8'))
+            archived += 1
+            if on_batch is not None:
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    on_batch(batch)
+                    batch = []
+        if batch:
+            on_batch(batch)
+    finally:
+        archive_file.close()
+
+    if not archived:
+        os.remove(partial_filename)
+        logger.info("Nothing to archive for %s", collection.name)
+        return None, 0
+
+    os.rename(partial_filename, filename)
+    deleted = collection.delete_many(query).deleted_count
+    logger.info("Archived %s and deleted %s documents of %s",
+                archived, deleted, collection.name)
+    return filename, archived
+
+
+def archive(database, settings, records):
+    """
+    Archive all the collections listed in the retention settings.
+
+    :param database: MongoDB database.
+    :param settings: The *RETENTION* configuration structure.
+    :param records: Instance of :py:class:`~.request_records.RequestRecords`
+    """
+    logger = logging.getLogger(__name__)
+    archive_dir = settings['ARCHIVE_DIR']
+    if not os.path.isdir(archive_dir):
+        os.makedirs(archive_dir)
+
+    for name, max_age in settings['COLLECTIONS'].items():
+        options = database[name].options()
+        if options.get('capped') or 'timeseries' in options:
+            logger.info("Skipping %s whose size is bounded by the server",
+                        name)
+            continue
+
+        on_batch = None
+        time_field = 'datetime'
+        if name == 'Requests':
+            on_batch = partial(store_tombstones, database.ExpiredRequests,
+                               records)
+            time_field = records.field('datetime')
+        archive_collection(database[name], max_age, archive_dir,
+                           settings['BATCH_SIZE'], on_batch, time_field)
+
+
+def main():
+    """
+    Command line entry point to archive expired documents.
+    """
+    log_conf_fn = join(THIS_DIR, 'logging.ini')
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("-l",
+                        action='store',
+                        default=log_conf_fn,
+                        dest='logging_conf_fn',
+                        help='Set logging configuration filename')
+    args = parser.parse_args()
+    fileConfig(args.logging_conf_fn)
+
+    from .app_objects import APP
+    from .utility_rest import mongo, get_request_records
+
+    archive(mongo.db, APP.config['RETENTION'], get_request_records())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+JSON and XML encoding of the responses and of the logged documents.
+
+The encoder is selected by the *JSON_ENCODER* setting among:
+
+* *json*: the standard library encoder;
+* *simplejson*: the simplejson encoder and its C speedups, if installed;
+* *ujson*: the ujson encoder, if an installed version supports the *default*
+  hook (ujson 5 or later);
+* *auto*: the fastest installed encoder, in the reverse order of this list.
+
+All encoders give the same documents: dates and times are encoded in the
+format given by the *JSON_DATE_FORMAT* setting, either *http* (the RFC 1123
+format of :py:func:`flask.jsonify`, by default) or *iso* (ISO 8601), and the
+other BSON types (ObjectId, Binary, etc.) as :py:mod:`bson.json_util` does.
+Documents are compact and their keys aren't sorted.
+
+Values are also encoded as XML by :py:func:`iter_xml`, in the format of
+*dicttoxml* (a *root* element, list items as *item* elements and a *type*
+attribute on every element), as a stream of chunks rather than a whole
+document built in memory.
+
+The encoders are benchmarked by *benchmarks/bench_serialization.py*.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import logging
+from xml.sax.saxutils import escape, quoteattr
+import numbers
+import json
+import re
+
+# -- 3rd party ---------------------------------------------------------------
+from future.utils import text_type
+from werkzeug.http import http_date
+from bson import json_util
+
+# -- Project specific --------------------------------------------------------
+from .vesta_exceptions import SettingsException
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
+try:
+    import ujson
+    ujson.dumps(None, default=str)
+except (ImportError, TypeError):
+    # Versions of ujson without the default hook encode dates incorrectly
+    ujson = None
+
+
+def encode_http_date(value):
+    """
+    Encode a date or a date and time in the RFC 1123 format, as
+    :py:func:`flask.jsonify` does.
+    """
+    return http_date(value.timetuple())
+
+
+def encode_iso_date(value):
+    """
+    Encode a date or a date and time in the ISO 8601 format.
+    """
+    return value.isoformat()
+
+
+DATE_FORMATS = {'http': encode_http_date,
+                'iso': encode_iso_date}
+
+
+def default(value):
+    """
+    Encode the values which aren't natively JSON serializable.
+
+    :raises: TypeError if the value can't be encoded.
+    """
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return _ENCODER['encode_date'](value)
+    return json_util.default(value)
+
+
+def dumps_json(value):
+    """
+    Encode a value with the standard library encoder.
+    """
+    return json.dumps(value, default=default, separators=(',', ':'))
+
+
+def dumps_simplejson(value):
+    """
+    Encode a value with simplejson.
+    """
+    return simplejson.dumps(value, default=default, separators=(',', ':'))
+
+
+def dumps_ujson(value):
+    """
+    Encode a value with ujson.
+    """
+    return ujson.dumps(value, default=default, escape_forward_slashes=False)
+
+
+# Installed encoders, from the slowest to the fastest
+ENCODERS = [('json', dumps_json)]
+if simplejson is not None:
+    ENCODERS.append(('simplejson', dumps_simplejson))
+if ujson is not None:
+    ENCODERS.append(('ujson', dumps_ujson))
+
+_ENCODER = {'name': 'json',
+            'dumps': dumps_json,
+            'encode_date': encode_http_date}
+
+
+def get_encoder(name):
+    """
+    Get an installed encoder.
+
+    :param name: Name of the encoder or *auto* for the fastest one.
+    :returns: Tuple of the name of the encoder and of its function.
+    :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the encoder
+             isn't installed.
+    """
+    if name == 'auto':
+        return ENCODERS[-1]
+    for encoder in ENCODERS:
+        if encoder[0] == name:
+            return encoder
+    raise SettingsException('JSON encoder {0} is not installed, available '
+                            'encoders are : {1}'.format(
+                                name, [encoder[0] for encoder in ENCODERS]))
+
+
+def configure(name, date_format='http'):
+    """
+    Select the encoder used by :py:func:`dumps` and its format of dates.
+
+    :param name: Name of the encoder or *auto* for the fastest one.
+    :param date_format: *http* or *iso*.
+    :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the encoder
+             isn't installed or the date format is unknown.
+    """
+    logger = logging.getLogger(__name__)
+    if date_format not in DATE_FORMATS:
+        raise SettingsException('Unknown JSON date format {0}, available '
+                                'formats are : {1}'.format(
+                                    date_format, sorted(DATE_FORMATS)))
+    encoder_name, encoder_dumps = get_encoder(name)
+    _ENCODER['name'] = encoder_name
+    _ENCODER['dumps'] = encoder_dumps
+    _ENCODER['encode_date'] = DATE_FORMATS[date_format]
+    logger.info("Using the %s JSON encoder with %s dates",
+                encoder_name, date_format)
+
+
+def dumps(value):
+    """
+    Encode a value as JSON with the selected encoder.
+
+    :returns: JSON document as a string.
+    """
+    return _ENCODER['dumps'](value)
+
+
+# Size in bytes of the chunks of the XML documents
+XML_CHUNK_SIZE = 65536
+
+# Valid XML element names
+XML_NAME = re.compile(r'^[A-Za-z_][\w.-]*$', re.UNICODE)
+
+
+def get_xml_type(value):
+    """
+    Get the dicttoxml type of a value.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, numbers.Integral):
+        return 'int'
+    if isinstance(value, numbers.Number):
+        return 'float'
+    if isinstance(value, dict):
+        return 'dict'
+    if isinstance(value, (list, tuple, set)):
+        return 'list'
+    return 'str'
+
+
+def get_xml_tag(key):
+    """
+    Get the element name and extra attributes of a dict key.
+    """
+    key = text_type(key).replace(' ', '_')
+    if key.isdigit():
+        key = u'n' + key
+    if XML_NAME.match(key) and not key.lower().startswith('xml'):
+        return key, u''
+    return u'key', u' name={0}'.format(quoteattr(key))
+
+
+def iter_xml_elements(tag, value, attributes=u''):
+    """
+    Generate the text of the XML element of a value.
+    """
+    xml_type = get_xml_type(value)
+    if xml_type == 'str' and not isinstance(value, (bytes, text_type)):
+        value = default(value)
+        xml_type = get_xml_type(value)
+    start = u'<{0}{1} type="{2}"'.format(tag, attributes, xml_type)
+    if xml_type == 'dict':
+        yield start + u'>'
+        for key, item in value.items():
+            item_tag, item_attributes = get_xml_tag(key)
+            for text in iter_xml_elements(item_tag, item, item_attributes):
+                yield text
+        yield u'</{0}>'.format(tag)
+    elif xml_type == 'list':
+        yield start + u'>'
+        for item in value:
+            for text in iter_xml_elements(u'item', item):
+                yield text
+        yield u'</{0}>'.format(tag)
+    elif xml_type == 'null':
+        yield start + u'></{0}>'.format(tag)
+    else:
+        if xml_type == 'bool':
+            text = u'true' if value else u'false'
+        elif isinstance(value, bytes):
+            text = escape(value.decode('utf-8'))
+        else:
+            text = escape(text_type(value))
+        yield u'{0}>{1}</{2}>'.format(start, text, tag)
+
+
+def iter_xml(value, root=u'root'):
+    """
+    Encode a value as an XML document, by chunks.
+
+    :param value: Value to encode, which may hold dates and BSON values.
+    :param root: Name of the root element.
+    :returns: Generator of the UTF-8 encoded chunks of the document.
+    """
+    chunk = [u'<?xml version="1.0" encoding="UTF-8" ?>']
+    size = 0
+    for text in iter_xml_elements(root, value):
+        chunk.append(text)
+        size += len(text)
+        if size >= XML_CHUNK_SIZE:
+            yield u''.join(chunk).encode('utf-8')
+            chunk = []
+            size = 0
+    yield u''.join(chunk).encode('utf-8')
+
+
+def dumps_xml(value):
+    """
+    Encode a value as a whole XML document.
+    """
+    return b''.join(iter_xml(value))
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Registry of the services of the gateway, compiled from the *WORKER_SERVICES*
+configuration.
+
+Each service is described by an immutable :py:class:`ServiceDescriptor`
+holding the settings used when handling requests, already parsed (queues,
+tags, etc.), so that a request gets everything about its service with a
+single lookup. The configuration is validated when the registry is built so
+that missing settings are reported at startup instead of failing requests.
+"""
+
+# -- 3rd party ---------------------------------------------------------------
+from kombu.compression import get_encoder
+
+# -- Project specific --------------------------------------------------------
+from .celery_init import get_queues, get_service_queues
+from .vesta_exceptions import SettingsException, UnknownServiceError
+
+# Settings which every service must define
+REQUIRED_KEYS = ('route_keyword',
+                 'celery_task_name',
+                 'celery_queue_name',
+                 'version',
+                 'name',
+                 'synopsis',
+                 'institution',
+                 'releaseTime',
+                 'supportEmail',
+                 'category',
+                 'researchSubject',
+                 'tags')
+
+# Settings giving the responses to the CANARIE API requests
+CANARIE_KEYS = ('home',
+                'doc',
+                'releasenotes',
+                'support',
+                'source',
+                'tryme',
+                'licence',
+                'provenance')
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict, which is still serialized as a dict.
+    """
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Service settings are read-only')
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """
+    Get a read-only copy of a setting.
+
+    :param value: Setting from the configuration.
+    :returns: The setting whose dicts are copied as :py:class:`FrozenDict`
+              and whose lists are copied as tuples.
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ServiceDescriptor(object):
+    """
+    Immutable description of a service.
+
+    Its settings, e.g.: *config* and *canarie*, are read-only copies of the
+    configuration.
+    """
+    __slots__ = ('route',
+                 'service_name',
+                 'celery_task_name',
+                 'version',
+                 'queues',
+                 'service_queues',
+                 'size_classes',
+                 'task_expires',
+                 'max_priority',
+                 'fair_scheduling',
+                 'max_queue_depth',
+                 'compression',
+                 'compression_min_size',
+                 'tags',
+                 'canarie',
+                 'config')
+
+    def __init__(self, route, worker_config):
+        """
+        :param route: Route of the service, i.e.: its key in
+                      *WORKER_SERVICES*.
+        :param worker_config: Configuration of the service.
+        :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the
+                 configuration is invalid.
+        """
+        if not isinstance(worker_config, dict):
+            raise SettingsException('Service {0} has an invalid '
+                                    'configuration'.format(route))
+        missing = [key for key in REQUIRED_KEYS if key not in worker_config]
+        if missing:
+            raise SettingsException('Service {0} lacks the required settings '
+                                    '{1}'.format(route, ', '.join(missing)))
+        fair_scheduling = bool(worker_config.get('fair_scheduling'))
+        if fair_scheduling and 'max_queue_depth' not in worker_config:
+            raise SettingsException('Service {0} uses fair scheduling but '
+                                    'has no max_queue_depth'.format(route))
+        for size_class in worker_config.get('size_classes', []):
+            if 'celery_queue_name' not in size_class:
+                raise SettingsException('A size class of service {0} has no '
+                                        'celery_queue_name'.format(route))
+        try:
+            queues = get_queues(worker_config['celery_queue_name'])
+            service_queues = get_service_queues(worker_config)
+            # Size classes along with their parsed queues
+            size_classes = [
+                freeze(dict(size_class, queues=get_queues(
+                    size_class['celery_queue_name'])))
+                for size_class in worker_config.get('size_classes', [])]
+        except (KeyError, TypeError, AttributeError):
+            raise SettingsException('Service {0} has an invalid '
+                                    'celery_queue_name'.format(route))
+        compression = worker_config.get('compression')
+        if compression is not None:
+            try:
+                get_encoder(compression)
+            except KeyError:
+                raise SettingsException('Unknown compression {0} for service '
+                                        '{1}'.format(compression, route))
+
+        values = {
+            'route': route,
+            'service_name': worker_config['route_keyword'],
+            'celery_task_name': worker_config['celery_task_name'],
+            'version': worker_config['version'],
+            'queues': tuple(queues),
+            'service_queues': tuple(service_queues),
+            'size_classes': tuple(size_classes),
+            'task_expires': worker_config.get('task_expires'),
+            'max_priority': worker_config.get('max_priority'),
+            'fair_scheduling': fair_scheduling,
+            'max_queue_depth': worker_config.get('max_queue_depth'),
+            'compression': compression,
+            'compression_min_size':
+                worker_config.get('compression_min_size'),
+            'tags': tuple(worker_config['tags'].split(',')),
+            'canarie': freeze(dict((key, worker_config[key]) for
+                                   key in CANARIE_KEYS
+                                   if key in worker_config)),
+            'config': freeze(worker_config)}
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Service descriptors are immutable')
+
+    def __repr__(self):
+        return 'ServiceDescriptor({0!r}, {1!r})'.format(self.route,
+                                                        self.service_name)
+
+
+class ServiceRegistry(object):
+    """
+    Immutable registry of the services by route and by name.
+    """
+    __slots__ = ('generation', '_by_route', '_by_name')
+
+    def __init__(self, worker_services, generation=0):
+        """
+        :param worker_services: The *WORKER_SERVICES* configuration
+                                structure.
+        :param generation: Generation of the configuration.
+        :raises: :py:exc:`~.vesta_exceptions.SettingsException` if the
+                 configuration of a service is invalid.
+        """
+        by_route = dict((route, ServiceDescriptor(route, worker_config)) for
+                        route, worker_config in worker_services.items())
+        by_name = dict((service.service_name, service) for
+                       service in by_route.values())
+        object.__setattr__(self, 'generation', generation)
+        object.__setattr__(self, '_by_route', by_route)
+        object.__setattr__(self, '_by_name', by_name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Service registries are immutable')
+
+    def __contains__(self, service_route):
+        return service_route in self._by_route
+
+    def __iter__(self):
+        return iter(self._by_route.values())
+
+    def __len__(self):
+        return len(self._by_route)
+
+    def routes(self):
+        """
+        Get the routes of the services.
+        """
+        return list(self._by_route.keys())
+
+    def get(self, service_route):
+        """
+        Get a service by its route.
+
+        :param service_route: Route name of the service coming from the URL.
+        :returns: :py:class:`ServiceDescriptor` of the service.
+        :raises: :py:exc:`~.vesta_exceptions.UnknownServiceError`
+        """
+        try:
+            return self._by_route[service_route]
+        except KeyError:
+            raise UnknownServiceError(service_route)
+
+    def get_by_name(self, service_name):
+        """
+        Get a service by its name, i.e.: its *route_keyword*.
+
+        :param service_name: Name of the service.
+        :returns: :py:class:`ServiceDescriptor` of the service.
+        :raises: KeyError if there is no such service.
+        """
+        return self._by_name[service_name]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Stores giving the state of tasks for status requests.
+
+Three stores are available, selected by the *TYPE* of the *STATUS_STORE*
+setting:
+
+* *celery* reads the states through the Celery result backend, as
+  :py:func:`VestaService.request_process_mesg.get_request_info` does;
+* *mongo* reads the task documents written by the Celery MongoDB result
+  backend directly from the gateway database, through the existing client,
+  by batches of UUIDs using the index on *_id*. The result backend must then
+  be configured to write in the gateway database
+  (CELERY_MONGODB_BACKEND_SETTINGS);
+* *memory* keeps the states in a dict, for tests.
+
+All stores give states as dicts holding the *uuid*, *status* and *result* of
+a task and raise :py:exc:`~VestaService.request_process_mesg.
+WorkerExceptionWrapper` for failed, retried and revoked tasks. The *mongo* and
+*memory* stores replace results larger than *MAX_RESULT_SIZE* bytes once
+encoded by a description of their size, unless the whole results are
+requested, e.g.: to be cached, streamed or given to completion callbacks. The
+*mongo* store doesn't load the results of successful and running tasks when
+they aren't requested.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import threading
+import logging
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from VestaService.request_process_mesg import (WorkerExceptionWrapper,
+                                               get_request_info)
+from bson import json_util
+
+# Statuses for which the result holds the exception of the worker
+EXCEPTION_STATUSES = ('FAILURE', 'RETRY', 'REVOKED')
+
+
+def bound_result(result, size, max_result_size):
+    """
+    Replace a result by a description of its size if it is too large.
+
+    :param result: Result of a task.
+    :param size: Size in bytes of the encoded result.
+    :param max_result_size: Maximal size in bytes, 0 for no limit.
+    """
+    if max_result_size and size > max_result_size:
+        return {'truncated': True, 'size': size}
+    return result
+
+
+def get_encoded_size(result):
+    """
+    Get the size in bytes of a JSON encoded result.
+    """
+    return len(json.dumps(result, default=json_util.default))
+
+
+class StatusStore(object):
+    """
+    Base class of the status stores.
+    """
+    # Whether get_many reads all the states at once
+    BATCHED = False
+
+    # Maximal size in bytes of the results, 0 for no limit
+    max_result_size = 0
+
+    def get(self, uuid, include_result=True, bounded=True):
+        """
+        Get the state of a task.
+
+        :param uuid: UUID of the task.
+        :param include_result: Whether the result is requested, stores may
+                               then give None as the result of tasks which
+                               didn't fail.
+        :param bounded: Whether results larger than the maximal result size
+                        are replaced by a description of their size.
+        :returns: Dict holding the *uuid*, *status* and *result* of the task.
+        :raises: :py:exc:`~VestaService.request_process_mesg.
+                 WorkerExceptionWrapper` for failed tasks.
+        """
+        raise NotImplementedError()
+
+    def get_many(self, uuids, include_result=True, bounded=True):
+        """
+        Get the states of several tasks.
+
+        :param uuids: UUIDs of the tasks.
+        :param include_result: Whether the results are requested.
+        :param bounded: Whether large results are replaced by a description of
+                        their size.
+        :returns: Dict of states by UUID, in which failed tasks get the
+                  :py:exc:`~VestaService.request_process_mesg.
+                  WorkerExceptionWrapper` instance instead of their state.
+        """
+        states = {}
+        for uuid in uuids:
+            try:
+                states[uuid] = self.get(uuid, include_result, bounded)
+            except WorkerExceptionWrapper as exc:
+                states[uuid] = exc
+        return states
+
+    def bound(self, result):
+        """
+        Replace a result read whole by a description of its size if it is
+        larger than the maximal result size.
+        """
+        if not self.max_result_size:
+            return result
+        return bound_result(result, get_encoded_size(result),
+                            self.max_result_size)
+
+
+class CeleryStatusStore(StatusStore):
+    """
+    Status store reading the Celery result backend.
+    """
+    def __init__(self, celery_app):
+        """
+        :param celery_app: Handle to the Celery application.
+        """
+        self.celery_app = celery_app
+
+    def get(self, uuid, include_result=True, bounded=True):
+        return get_request_info(uuid, self.celery_app)
+
+
+class MongoStatusStore(StatusStore):
+    """
+    Status store reading the task documents of the Celery MongoDB result
+    backend.
+    """
+    BATCHED = True
+
+    def __init__(self, get_database, collection_name, celery_app,
+                 max_result_size=0):
+        """
+        :param get_database: Callable returning the database of the task
+                             documents.
+        :param collection_name: Name of the collection of the task documents.
+        :param celery_app: Handle to the Celery application, whose result
+                           serializer decodes the documents.
+        :param max_result_size: Maximal size in bytes of the results.
+        """
+        self.get_database = get_database
+        self.collection_name = collection_name
+        self.celery_app = celery_app
+        self.max_result_size = max_result_size
+
+    def get(self, uuid, include_result=True, bounded=True):
+        state = self.get_many([uuid], include_result, bounded)[uuid]
+        if isinstance(state, WorkerExceptionWrapper):
+            raise state
+        return state
+
+    def get_many(self, uuids, include_result=True, bounded=True):
+        collection = self.get_database()[self.collection_name]
+        fields = ['status', 'result', 'traceback'] if include_result \
+            else ['status']
+        documents = list(collection.find({'_id': {'$in': list(uuids)}},
+                                         projection=fields))
+        if not include_result:
+            # Failed tasks always need their exception
+            failed = [document['_id'] for document in documents
+                      if document['status'] in EXCEPTION_STATUSES]
+            if failed:
+                documents = [document for document in documents
+                             if document['_id'] not in failed]
+                documents.extend(collection.find(
+                    {'_id': {'$in': failed}},
+                    projection=['status', 'result', 'traceback']))
+        states = dict((uuid, {'uuid': uuid, 'status': 'PENDING',
+                              'result': None}) for uuid in uuids)
+        for document in documents:
+            states[document['_id']] = self.to_state(document, bounded)
+        return states
+
+    def decode(self, value):
+        """
+        Decode a value encoded by the result backend.
+
+        :returns: Tuple of the decoded value and of its encoded size.
+        """
+        if isinstance(value, (bytes, type(u''))):
+            return self.celery_app.backend.decode(value), len(value)
+        return value, get_encoded_size(value)
+
+    def to_state(self, document, bounded=True):
+        """
+        Get the state of a task from its document.
+
+        :param document: Document of the task.
+        :param bounded: Whether a large result is replaced by a description of
+                        its size.
+        """
+        uuid = document['_id']
+        status = document['status']
+        result, size = self.decode(document.get('result'))
+        if status in EXCEPTION_STATUSES:
+            traceback = self.decode(document.get('traceback'))[0]
+            return WorkerExceptionWrapper(
+                uuid, status,
+                self.celery_app.backend.exception_to_python(result),
+                traceback)
+        if status in ('RECEIVED', 'STARTED'):
+            result = None
+        elif bounded:
+            result = bound_result(result, size, self.max_result_size)
+        return {'uuid': uuid, 'status': status, 'result': result}
+
+
+class MemoryStatusStore(StatusStore):
+    """
+    Status store keeping the states in memory.
+    """
+    BATCHED = True
+
+    def __init__(self, max_result_size=0):
+        """
+        :param max_result_size: Maximal size in bytes of the results.
+        """
+        self.max_result_size = max_result_size
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def set(self, uuid, status, result=None, traceback=None):
+        """
+        Set the state of a task.
+
+        :param uuid: UUID of the task.
+        :param status: Status of the task.
+        :param result: Result of the task, its exception for failed tasks.
+        :param traceback: Traceback of the exception of failed tasks.
+        """
+        size = 0
+        if self.max_result_size and status not in EXCEPTION_STATUSES:
+            size = get_encoded_size(result)
+        with self._lock:
+            self._states[uuid] = (status, result, traceback, size)
+
+    def get(self, uuid, include_result=True, bounded=True):
+        with self._lock:
+            status, result, traceback, size = self._states.get(
+                uuid, ('PENDING', None, None, 0))
+        if status in EXCEPTION_STATUSES:
+            raise WorkerExceptionWrapper(uuid, status, result, traceback)
+        if bounded:
+            result = bound_result(result, size, self.max_result_size)
+        return {'uuid': uuid, 'status': status, 'result': result}
+
+
+def open_store(settings, celery_app, get_database):
+    """
+    Get the status store selected by the configuration.
+
+    :param settings: The *STATUS_STORE* configuration structure.
+    :param celery_app: Handle to the Celery application.
+    :param get_database: Callable returning the gateway MongoDB database.
+    :returns: Instance of :py:class:`StatusStore`
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Using the %s status store", settings['TYPE'])
+    if settings['TYPE'] == 'mongo':
+        return MongoStatusStore(get_database,
+                                settings['TASKMETA_COLLECTION'],
+                                celery_app,
+                                settings['MAX_RESULT_SIZE'])
+    if settings['TYPE'] == 'memory':
+        return MemoryStatusStore(settings['MAX_RESULT_SIZE'])
+    return CeleryStatusStore(celery_app)
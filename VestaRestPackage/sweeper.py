@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Background sweeper of stale tasks.
+
+The sweeper periodically scans the request records of unfinished tasks, in
+batches through the index on (*activity*, *datetime*, *_id*), and:
+
+* turns on the activity flag of tasks which left the PENDING status, recording
+  how long they waited in their queue;
+* flags tasks which reached a terminal status as finished so that they aren't
+  scanned anymore;
+* flags as expired the tasks which are reported PENDING after they started,
+  meaning that their result expired, and the tasks still PENDING long after
+  their submission, which are optionally revoked.
+
+Only the records submitted within the horizon of the sweeper are scanned:
+older records of unfinished tasks, whose result has expired or which have
+been pending too long anyway, are flagged as expired at once by a single
+update per activity flag. The states are read without the results.
+
+Status requests only read these flags. The sweeper runs within the gateway or,
+with the *IN_GATEWAY* setting unset, as a standalone process::
+
+    vrp_sweeper
+
+Sweeps are run by a single process at a time, the one holding the *sweeper*
+lease (see :py:class:`~.background.Lease`).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from logging.config import fileConfig
+import datetime
+import logging
+import time
+
+# -- Project specific --------------------------------------------------------
+from .callbacks import TERMINAL_STATUSES
+from .metrics import METRICS
+from . import background
+
+THIS_DIR = abspath(dirname(__file__))
+
+
+class Sweeper(object):
+    """
+    Sweeper of the request records of unfinished tasks.
+    """
+    def __init__(self, get_records, get_states, revoke, settings,
+                 lease=None, horizon=None):
+        """
+        :param get_records: Callable returning the
+                            :py:class:`~.request_records.RequestRecords`
+        :param get_states: Callable returning a dict of the states of tasks by
+                           UUID given their request records, without their
+                           results.
+        :param revoke: Callable revoking a task given its UUID.
+        :param settings: The *SWEEPER* configuration structure.
+        :param lease: :py:class:`~.background.Lease` which the process must
+                      hold to sweep.
+        :param horizon: Age in seconds past which the records of unfinished
+                        tasks are flagged as expired without reading their
+                        state, None to scan all the records.
+        """
+        self.get_records = get_records
+        self.get_states = get_states
+        self.revoke = revoke
+        self.settings = settings
+        self.lease = lease
+        self.horizon = horizon
+
+    def start(self):
+        """
+        Start the background worker running the sweeps.
+        """
+        background.start_worker('sweeper', self.settings['INTERVAL'],
+                                self.sweep, self.lease)
+
+    def sweep(self):
+        """
+        Sweep the records of all the unfinished tasks.
+        """
+        logger = logging.getLogger(__name__)
+        start = time.time()
+        expired = self.expire_records()
+        swept = self.sweep_records(False) + self.sweep_records(True)
+        logger.info("Swept %s request records and expired %s older ones in "
+                    "%.3f seconds", swept, expired, time.time() - start)
+
+    def expire_records(self):
+        """
+        Flag as expired the records of unfinished tasks older than the
+        horizon.
+
+        :returns: Number of expired records.
+        """
+        if self.horizon is None:
+            return 0
+        records = self.get_records()
+        oldest = datetime.datetime.utcnow() - \
+            datetime.timedelta(seconds=self.horizon)
+        expired = 0
+        for activity in (False, True):
+            expired += records.update_many(
+                {'activity': activity,
+                 'final_status': {'$exists': False},
+                 'datetime': {'$lt': oldest}},
+                final_status='EXPIRED')
+        if expired:
+            METRICS.incr('sweeper.expired', expired)
+        return expired
+
+    def sweep_records(self, activity):
+        """
+        Sweep the records of unfinished tasks with a given activity flag.
+
+        :param activity: Value of the activity flag.
+        :returns: Number of swept records.
+        """
+        logger = logging.getLogger(__name__)
+        records = self.get_records()
+        datetime_field = records.field('datetime')
+        swept = 0
+        last = None
+        while True:
+            conditions = {'activity': activity,
+                          'final_status': {'$exists': False}}
+            # Records sharing the datetime of the last one of the previous
+            # batch are told apart by their _id.
+            if last is not None:
+                last_datetime, last_id = last
+                conditions['$or'] = [
+                    {datetime_field: {'$gt': last_datetime}},
+                    {datetime_field: last_datetime, '_id': {'$gt': last_id}}]
+            batch = list(records.find_many(sort=[('datetime', 1), ('_id', 1)],
+                                           limit=self.settings['BATCH_SIZE'],
+                                           **conditions))
+            if not batch:
+                return swept
+            states = self.get_states(batch)
+            now = datetime.datetime.utcnow()
+            for data in batch:
+                try:
+                    self.sweep_record(records, data, states[data['uuid']],
+                                      now)
+                except Exception:
+                    logger.exception("Cannot sweep the record of task %s",
+                                     data['uuid'])
+            swept += len(batch)
+            last = (batch[-1]['datetime'], records.document_id(batch[-1]))
+
+    def sweep_record(self, records, data, state, now):
+        """
+        Update the record of a task according to its state.
+
+        :param records: Instance of
+                        :py:class:`~.request_records.RequestRecords`
+        :param data: Request record of the task.
+        :param state: State of the task.
+        :param now: Current UTC time.
+        """
+        logger = logging.getLogger(__name__)
+        uuid = data['uuid']
+        status = state['status']
+
+        if status in TERMINAL_STATUSES:
+            logger.debug("Task %s is finished with status %s", uuid, status)
+            records.update(uuid, activity=True, final_status=status)
+            METRICS.incr('sweeper.finished')
+            if status == 'EXPIRED':
+                METRICS.incr('sweeper.expired')
+
+        elif status != 'PENDING':
+            if not data['activity']:
+                logger.debug("Task %s has started", uuid)
+                records.update(uuid, activity=True)
+                metric = 'tasks.queue_wait.{0}'.format(data['service'])
+                if data.get('priority') is not None:
+                    metric += '.p{0}'.format(data['priority'])
+                METRICS.observe(metric,
+                                (now - data['datetime']).total_seconds())
+
+        elif now - data['datetime'] > \
+                datetime.timedelta(seconds=self.settings['ORPHAN_AGE']):
+            logger.info("Task %s is still pending since %s, flagging it as "
+                        "expired", uuid, data['datetime'])
+            records.update(uuid, final_status='EXPIRED')
+            METRICS.incr('sweeper.orphaned')
+            if self.settings['REVOKE_ORPHANS']:
+                self.revoke(uuid)
+
+
+def main():
+    """
+    Command line entry point to run the sweeper standalone.
+    """
+    log_conf_fn = join(THIS_DIR, 'logging.ini')
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("-l",
+                        action='store',
+                        default=log_conf_fn,
+                        dest='logging_conf_fn',
+                        help='Set logging configuration filename')
+    args = parser.parse_args()
+    fileConfig(args.logging_conf_fn)
+
+    from .utility_rest import start_sweeper
+
+    start_sweeper()
+    while True:
+        time.sleep(60)
+
+if __name__ == '__main__':
+    main()
@@ -17,9 +17,9 @@ import configparser as ConfigParser
 from urllib.parse import urlparse
 import http.client as httplib
 from os import path, getcwd
+from uuid import uuid4
 import datetime
-import json
-from bson import json_util
+import hashlib
 import traceback
 import threading
 import logging
@@ -27,6 +27,7 @@ import sys
 import re
 
 # -- 3rd party ---------------------------------------------------------------
+from future.utils import string_types
 from werkzeug.datastructures import MIMEAccept
 from werkzeug.routing import BaseConverter
 from flask import render_template
@@ -34,41 +35,274 @@ from flask import make_response
 from flask import current_app
 from flask import redirect
 from flask import request
-from flask import jsonify
+from flask import url_for
 from flask import Markup
+import jwt
 
 # -- Project specific --------------------------------------------------------
 from VestaService.request_process_mesg import (WorkerExceptionWrapper,
-                                               send_task_request,
-                                               get_request_info,
                                                cancel_request)
+from VestaService import Message
 from .vesta_exceptions import (DocumentUrlNotValidException,
                                MissingParameterError,
                                VersionMismatchError,
-                               UnknownServiceError,
                                UnknownUUIDError,
+                               ExpiredUUIDError,
+                               InvalidParameterError,
+                               UnknownClaimError,
                                VestaExceptions,
                                AMQPError)
-from .app_objects import APP, CELERY_APP
+from .app_objects import APP, CELERY_APP, get_config_generation
+from .app_objects import get_registry, load_registry
+from . import request_records
+from . import result_cache
+from . import idempotency
+from . import callbacks
+from . import sweeper
+from . import fair_scheduler
+from . import broker_stats
+from . import preflight
+from . import claim_check
+from . import background
+from . import status_store
+from . import result_stream
+from . import registry_reload
+from . import serialization
+from .configuration_cache import ConfigurationCache
+from .projection import compile_projection, apply_projection
+from .projection import clear_cache as clear_projection_cache
+from . import forking
+from .metrics import METRICS
+from .jwt_ import decode_token
 from flask_pymongo import PyMongo
 
 # MongoDB database connection
 mongo = PyMongo(APP)
 
+# Cached depths of the broker queues
+QUEUE_STATS = broker_stats.QueueStats(CELERY_APP,
+                                      APP.config['BROKER_STATS_MAX_AGE'])
+
+# Cached HEAD responses of document URLs
+PREFLIGHT = preflight.Preflight(APP.config['PREFLIGHT'])
+
+
+def get_database():
+    """
+    Get the gateway MongoDB database.
+    """
+    return mongo.db
+
+# Store giving the state of tasks
+STATUS_STORE = status_store.open_store(APP.config['STATUS_STORE'],
+                                       CELERY_APP,
+                                       get_database)
+
+serialization.configure(APP.config['JSON_ENCODER'],
+                        APP.config['JSON_DATE_FORMAT'])
+
+# Responses and values derived from the configuration
+CONFIGURATION_CACHE = ConfigurationCache(get_config_generation)
+
+
+def reset_after_fork():
+    """
+    Re-create the connections and clear the caches inherited from the parent
+    process.
+
+    The inherited connections are dropped without being closed since the
+    parent process may still use their sockets.
+    """
+    # The client connects on its first use
+    mongo.init_app(APP)
+
+    # Celery keeps its broker connection pools and its result backend, which
+    # holds its own connections, on the application (per thread from Celery
+    # 4).
+    CELERY_APP._pool = None
+    amqp = CELERY_APP.__dict__.get('amqp')
+    if amqp is not None:
+        amqp._producer_pool = None
+    CELERY_APP.__dict__.pop('backend', None)
+    if hasattr(CELERY_APP, '_local'):
+        CELERY_APP._local = threading.local()
+
+    QUEUE_STATS.clear()
+    PREFLIGHT.clear()
+    CONFIGURATION_CACHE.clear()
+    clear_projection_cache()
+    METRICS.reset()
+
+forking.register_after_fork(reset_after_fork)
+
+# Submission arguments which control how the gateway handles the submission
+# and which aren't given to workers.
+SUBMISSION_CONTROL_ARGS = ['callback_url', 'deadline', 'priority']
+
 
 def init_db():
     """
     Create index in the mongo database using configuration
+
+    An index is either given as a key specification or as a dict holding the
+    key specification under *key* along with any option accepted by
+    :py:meth:`pymongo.collection.Collection.create_index` (e.g.: *unique*,
+    *expireAfterSeconds*).
+
+    Collections which must be of a special type are created beforehand.
     """
     logger = logging.getLogger(__name__)
+    server_version = tuple(mongo.cx.server_info()['versionArray'][:2])
+    existing_collections = mongo.db.list_collection_names()
+
+    if APP.config['REQUESTS_STORAGE'] == 'compact' and \
+       'Requests' not in existing_collections and server_version >= (5, 3):
+        logger.info("Creating collection Requests clustered on _id")
+        mongo.db.create_collection(
+            'Requests', clusteredIndex={'key': {'_id': 1}, 'unique': True})
+
+    if 'Invocations' not in existing_collections:
+        create_invocations_collection(server_version)
+    invocations_type = get_collection_type('Invocations')
+    if invocations_type != APP.config['INVOCATIONS_STORAGE']['TYPE']:
+        logger.warning("Collection Invocations is %s instead of %s, it must "
+                       "be dropped to change its type",
+                       invocations_type,
+                       APP.config['INVOCATIONS_STORAGE']['TYPE'])
+
     for collection,indexes in APP.config['MONGO_COLLECTIONS'].iteritems():
+        collection_type = get_collection_type(collection)
         for index in indexes:
+            options = {'background': True}
+            if isinstance(index, dict):
+                options.update(index)
+                index = options.pop('key')
+            if 'expireAfterSeconds' in options and collection_type != 'regular':
+                logger.info("Skipping TTL index %s on %s collection %s",
+                            index, collection_type, collection)
+                continue
             logger.info("Adding index %s to collection %s", index, collection)
-            mongo.db[collection].create_index(index, background=True)
+            mongo.db[collection].create_index(index, **options)
+
+    if APP.config['SWEEPER']['ENABLED']:
+        create_sweeper_index()
+
+
+def create_sweeper_index():
+    """
+    Create the index on the request records of unfinished tasks through which
+    the sweeper scans them, whatever the Requests indexes of
+    MONGO_COLLECTIONS.
+    """
+    logger = logging.getLogger(__name__)
+    records = get_request_records()
+    index = [(records.field(name), 1) for name in ('activity', 'datetime')]
+    index.append(('_id', 1))
+    logger.info("Adding index %s to collection Requests", index)
+    mongo.db.Requests.create_index(
+        index,
+        background=True,
+        partialFilterExpression={
+            records.field('final_status'): {'$exists': False}})
+
+
+def create_invocations_collection(server_version):
+    """
+    Create the Invocations collection with the type set by
+    INVOCATIONS_STORAGE.
+
+    A time series collection needs MongoDB 5.0 or above, a capped collection
+    is created instead with older servers.
+
+    :param server_version: Tuple of the major and minor MongoDB versions.
+    """
+    logger = logging.getLogger(__name__)
+    settings = APP.config['INVOCATIONS_STORAGE']
+    collection_type = settings['TYPE']
+    if collection_type == 'timeseries' and server_version < (5, 0):
+        logger.warning("MongoDB %s.%s doesn't support time series "
+                       "collections", *server_version)
+        collection_type = 'capped'
+
+    logger.info("Creating %s collection Invocations", collection_type)
+    if collection_type == 'timeseries':
+        mongo.db.create_collection(
+            'Invocations',
+            timeseries={'timeField': 'datetime',
+                        'metaField': 'service',
+                        'granularity': settings['GRANULARITY']},
+            expireAfterSeconds=settings['EXPIRE_AFTER'])
+    elif collection_type == 'capped':
+        mongo.db.create_collection('Invocations',
+                                   capped=True,
+                                   size=settings['CAPPED_SIZE'])
+
+
+def get_collection_type(name):
+    """
+    Get the type of a collection.
+
+    :param name: Name of the collection
+    :returns: 'timeseries', 'capped' or 'regular'
+    """
+    options = mongo.db[name].options()
+    if 'timeseries' in options:
+        return 'timeseries'
+    if options.get('capped'):
+        return 'capped'
+    return 'regular'
 
 init_db()
 
 
+def get_request_records():
+    """
+    Get the request records in the storage layout set by REQUESTS_STORAGE.
+
+    :returns: Instance of :py:class:`~.request_records.RequestRecords`
+    """
+    return request_records.open_records(mongo.db.Requests,
+                                        APP.config['REQUESTS_STORAGE'])
+
+
+def make_json_response(value, status=200):
+    """
+    Make a JSON response with the encoder selected by the configuration.
+
+    :param value: JSON serializable value, which may hold dates and BSON
+                  values.
+    :param status: HTTP status code of the response.
+    :returns: Flask response.
+    """
+    return APP.response_class(serialization.dumps(value), status=status,
+                              mimetype='application/json')
+
+
+def make_xml_response(value, status=200):
+    """
+    Make an XML response streamed as it is encoded.
+
+    :param value: Value to encode, which may hold dates and BSON values.
+    :param status: HTTP status code of the response.
+    :returns: Flask response.
+    """
+    return APP.response_class(serialization.iter_xml(value), status=status,
+                              mimetype='application/xml')
+
+
+def make_data_response(value, status=200):
+    """
+    Make an XML response if the request prefers XML, otherwise a JSON one.
+
+    :param value: Value to encode, which may hold dates and BSON values.
+    :param status: HTTP status code of the response.
+    :returns: Flask response.
+    """
+    if request_wants_xml():
+        return make_xml_response(value, status)
+    return make_json_response(value, status)
+
+
 def request_wants_json():
     """
     Check if the request type is of type JSON.
@@ -130,10 +364,19 @@ def validate_service_route(service_route):
     :returns: Service name associated with the route
     :raises: :py:exc:`~.vesta_exceptions.UnknownServiceError`
     """
-    if service_route not in APP.config['WORKER_SERVICES']:
-        raise UnknownServiceError(service_route)
-    route = APP.config['WORKER_SERVICES'][service_route]['route_keyword']
-    return route
+    return get_registry().get(service_route).service_name
+
+
+def get_service(service_route):
+    """
+    Get the descriptor of a service given its route.
+
+    :param service_route: Route name of the service coming from the URL e.g.:
+                          ['diarisation', 'stt', etc.]
+    :returns: :py:class:`~.service_registry.ServiceDescriptor`
+    :raises: :py:exc:`~.vesta_exceptions.UnknownServiceError`
+    """
+    return get_registry().get(service_route)
 
 
 def validate_uuid(uuid, service_name):
@@ -144,33 +387,77 @@ def validate_uuid(uuid, service_name):
     :type uuid: Unicode
     :param service_name: Name of the service which is requested.
     :type service_name: string
+    :returns: The request record of the UUID
     :raises: UnknownUUIDError in case that the UUID
              isn't owned by the given service.
+    :raises: ExpiredUUIDError in case that the request of the UUID is past
+             its retention period.
     """
     logger = logging.getLogger(__name__)
 
     logger.debug("Accessing information for request %s to %s",
                  uuid, service_name)
 
-    data = mongo.db.Requests.find_one({"uuid": uuid})
-    if not data or data['service'] != service_name :
+    data = get_request_records().find(uuid)
+    if not data:
+        tombstone = mongo.db.ExpiredRequests.find_one({"_id": uuid})
+        if tombstone and tombstone['service'] == service_name:
+            raise ExpiredUUIDError(uuid)
         raise UnknownUUIDError(uuid)
+    if data['service'] != service_name :
+        raise UnknownUUIDError(uuid)
+
+    retention = APP.config['RETENTION']['COLLECTIONS'].get('Requests')
+    if retention is not None:
+        age = datetime.datetime.utcnow() - data['datetime']
+        if age > datetime.timedelta(seconds=retention):
+            logger.debug("Request %s is %s old and has expired", uuid, age)
+            raise ExpiredUUIDError(uuid)
+    return data
 
 
-def validate_state(uuid, service_name, state):
+def is_past_expiry(data):
+    """
+    Check if a task is past the time after which it must not be run.
+
+    :param data: The request record of the task
+    """
+    expires = data.get('expires')
+    return expires is not None and expires <= datetime.datetime.utcnow()
+
+
+def has_expired(data):
+    """
+    Check if a task reported as PENDING has actually expired.
+
+    This is the case when the task already started (its result expired), when
+    the sweeper flagged it as expired or when it is past its expiry.
+
+    :param data: The request record of the task
+    """
+    return bool(data['activity'] or
+                data.get('final_status') == 'EXPIRED' or
+                is_past_expiry(data))
+
+
+def validate_state(uuid, service_name, state, data=None):
     """
     Validate the state of a given task.
 
-    - Check that the activity flag is True
-        if the task has leave the PENDING status
+    - Report a PENDING task as EXPIRED if its activity flag is True, if the
+      sweeper flagged it as expired or if it is past its expiry
     - Check that the worker version in the payload fit the configuration one
 
+    The request record isn't modified: the activity flag is turned on by the
+    sweeper (see :py:mod:`~.VestaRestPackage.sweeper`).
+
     :param uuid: UUID of a given request
     :type uuid: Unicode
     :param service_name: Name of the service which is requested.
     :type service_name: string
     :param state: The state of the task
     :type state: Dictionary containing task status
+    :param data: The request record of the task, looked up if not given
     :raises: :py:exc:`~.vesta_exceptions.VersionMismatchError` in case of a
        version mismatch
     """
@@ -178,7 +465,8 @@ def validate_state(uuid, service_name, state):
     logger.debug("Verifying the activity flag in DB "
                  "for request %s to %s", uuid, service_name)
 
-    data = mongo.db.Requests.find_one({"uuid": uuid})
+    if data is None:
+        data = get_request_records().find(uuid)
     activity_flag = data['activity']
     logger.debug("Activity flag is: %s", activity_flag)
     logger.debug("State is: %s", state)
@@ -186,23 +474,18 @@ def validate_state(uuid, service_name, state):
     if state['status'] == 'PENDING':
         # The task is pending: Check the activity flag, in case it is on,
         #                      the task has expired and is no more PENDING
-        if activity_flag:
+        if has_expired(data):
             state['status'] = 'EXPIRED'
 
             logger.debug('Status of task %s for %s is reported as PENDING, '
-                         'but the task has been running. The task queue has '
-                         'EXPIRED', uuid, service_name)
+                         'but the task has been running, has been abandoned '
+                         'or is past its expiry. The task queue has EXPIRED',
+                         uuid, service_name)
 
-    elif not activity_flag:
-        # The task is being executed: Ensure that the activity flag is on.
-
-        logger.debug("Turning on the activity flag in db "
-                     "of task %s for %s", uuid, service_name)
-        mongo.db.Requests.find_one_and_update({"uuid":uuid},{"$set": {"activity": True}})
-
-    if state['status'] == 'PROGRESS':
+    # The result may not have been read when it isn't requested
+    if state['status'] == 'PROGRESS' and state['result'] is not None:
         payload_ver = state['result']['worker_id_version']
-        decl_ver = APP.config['WORKER_SERVICES'][service_name]['version']
+        decl_ver = get_registry().get_by_name(service_name).version
 
         if payload_ver != decl_ver:
             msg = ('Service {serv} declares the version {decl_ver} '
@@ -216,7 +499,7 @@ def validate_state(uuid, service_name, state):
     return state
 
 
-def store_uuid(uuid, service_name):
+def store_uuid(uuid, service_name, **fields):
     """
     Store a UUID so it can be validated later.
 
@@ -224,15 +507,16 @@ def store_uuid(uuid, service_name):
     :type uuid: Unicode
     :param service_name: Name of the service which is requested.
     :type service_name: string
+    :param fields: Extra fields to store in the request record.
     """
     logger = logging.getLogger(__name__)
     logger.debug("Keeping track of request «%s» for %s", uuid, service_name)
 
     data = {"datetime": datetime.datetime.utcnow(),
             "service": service_name,
-            "uuid": uuid,
             "activity": False}
-    mongo.db.Requests.insert_one(data)
+    data.update(fields)
+    get_request_records().insert(uuid, **data)
 
 
 def async_fct_wrapper(out_dict, fct, *args, **kwargs):
@@ -281,6 +565,52 @@ def async_call(fct, *args, **kwargs):
     return out_dict['return_value']
 
 
+def publish_task(url, name, app, queue, misc=None, ann_srv_url=None,
+                 compression=None, compression_min_size=0, **options):
+    """
+    Send a request for a process on URL.
+
+    Builds the same message as
+    :py:func:`VestaService.request_process_mesg.send_task_request` but forwards
+    any extra publishing option (e.g.: *task_id*) to
+    :py:meth:`celery.Celery.send_task`.
+
+    Messages are compressed if they are at least *compression_min_size* bytes
+    once serialized, their size before and after compression being reported
+    in the metrics (see :py:class:`~.celery_init.SizedTaskProducer`).
+
+    :param url: URL of the file to process
+    :param name: Name of the process.
+    :param app: Handle to the Celery application.
+    :param queue: AMQP Queue to which the MSG will be sent.
+    :param misc: Optional data that can be passed to a celery worker.
+    :param ann_srv_url: URL to where the final annotations will be stored.
+    :param compression: Compression method of the message or None.
+    :param compression_min_size: Minimal size of compressed messages.
+    :param options: Extra options given to :py:meth:`celery.Celery.send_task`
+    :returns: Instance of :py:class:`celery.result.AsyncResult`
+    """
+    logger = logging.getLogger(__name__)
+    msg = Message.request_message_factory()
+    msg['service']['document']['url'] = url
+    msg['service']['type'] = name
+    msg['service']['misc'] = misc or {}
+    msg['annotation_service']['url'] = ann_srv_url
+
+    # Explicitly give the queue name, otherwise Celery will use the
+    # CELERY_ROUTES configuration structure which reduces tasks routes to task
+    # names.
+    task_name = '{}.{}'.format(app.main, name)
+    if compression is not None:
+        options['compression'] = compression
+        options['compression_min_size'] = compression_min_size
+        options['metric_name'] = name
+    result = app.send_task(task_name, queue=queue, args=(msg,), **options)
+    logger.info("Sent message %s to queue %s with options %s",
+                msg, queue, options)
+    return result
+
+
 def get_request_url(request_type, kwargs):
     logger = logging.getLogger(__name__)
     logger.debug("Arguments are : %s", kwargs)
@@ -288,6 +618,501 @@ def get_request_url(request_type, kwargs):
     return request_url.format(**kwargs)
 
 
+def get_request_state(data, info=None, include_result=True):
+    """
+    Get the state of a task outside of any status request, e.g.: for its
+    completion callback.
+
+    :param data: The request record of the task
+    :param info: State of the task already read from the status store, or
+                 its :py:exc:`WorkerExceptionWrapper` instance. The state is
+                 otherwise read with its whole result.
+    :param include_result: Whether the result of the task is needed. Results
+                           of successful tasks are otherwise neither loaded by
+                           status stores supporting it nor resolved from their
+                           claim.
+    :returns: Dictionary containing task status, with the code and message of
+              the worker exception for failed tasks.
+    """
+    if data.get('cached'):
+        return get_cached_state(data['uuid'], data['cache_key'])
+    if info is None:
+        try:
+            info = async_call(STATUS_STORE.get, data['uuid'], include_result,
+                              False)
+        except WorkerExceptionWrapper as exc:
+            info = exc
+    if isinstance(info, WorkerExceptionWrapper):
+        exc = info
+        if exc.task_status == 'REVOKED' and is_past_expiry(data):
+            return {'uuid': exc.task_uuid, 'status': 'EXPIRED', 'result': None}
+        vesta_exc_instance = VestaExceptions.Instance()
+        get_x_code = vesta_exc_instance.get_exception_code
+        return {'uuid': exc.task_uuid,
+                'status': exc.task_status,
+                'result': {'code': get_x_code(exc.worker_exception),
+                           'message': repr(exc.worker_exception)}}
+    state = info
+    if state['status'] == 'PENDING' and has_expired(data):
+        state['status'] = 'EXPIRED'
+    elif state['status'] == 'SUCCESS' and include_result:
+        resolve_result(state)
+    return state
+
+
+def get_request_states(records, include_result=True):
+    """
+    Get the states of several tasks, reading them at once from status stores
+    supporting batched reads.
+
+    :param records: Request records of the tasks
+    :param include_result: Whether the results of the tasks are needed.
+    :returns: Dict of the states given by :py:func:`get_request_state` by
+              UUID.
+    """
+    infos = {}
+    uuids = [data['uuid'] for data in records if not data.get('cached')]
+    if uuids and STATUS_STORE.BATCHED:
+        infos = STATUS_STORE.get_many(uuids, include_result, False)
+    return dict((data['uuid'], get_request_state(data, infos.get(data['uuid']),
+                                                 include_result))
+                for data in records)
+
+
+def start_callback_dispatcher():
+    """
+    Start the dispatcher of completion callbacks in the current process,
+    checking the pending callbacks only while it holds the callback
+    dispatcher lease.
+    """
+    settings = APP.config['CALLBACKS']
+    dispatcher = callbacks.CallbackDispatcher(
+        get_request_records,
+        get_request_states,
+        settings,
+        APP.config['SECURITY'].get('AUTHORISATION_KEY'),
+        get_lease('callback_dispatcher',
+                  max(10, 2 * settings['POLL_INTERVAL'])))
+    dispatcher.start()
+
+
+def revoke_task(uuid):
+    """
+    Revoke a task without terminating it if it is running.
+
+    :param uuid: UUID of the task
+    """
+    CELERY_APP.control.revoke(uuid)
+
+
+def get_lease(name, duration):
+    """
+    Get a lease held by a single gateway process at a time.
+
+    :param name: Name of the lease.
+    :param duration: Seconds after which the lease expires unless renewed.
+    :returns: :py:class:`~.background.Lease`
+    """
+    return background.Lease(lambda: mongo.db.Leases, name, duration)
+
+
+def start_sweeper():
+    """
+    Start the sweeper of stale tasks in the current process, sweeping only
+    while it holds the sweeper lease.
+
+    Records older than the ORPHAN_AGE of the sweeper plus the expiry of the
+    task results are flagged as expired without being scanned.
+    """
+    settings = APP.config['SWEEPER']
+    result_expires = APP.config['CELERY'].get('CELERY_TASK_RESULT_EXPIRES',
+                                              86400)
+    horizon = None
+    if result_expires is not None:
+        if isinstance(result_expires, datetime.timedelta):
+            result_expires = result_expires.total_seconds()
+        horizon = settings['ORPHAN_AGE'] + result_expires
+    sweeper.Sweeper(get_request_records,
+                    lambda records: get_request_states(records, False),
+                    revoke_task,
+                    settings,
+                    get_lease('sweeper', 2 * settings['INTERVAL']),
+                    horizon).start()
+
+
+def get_backlog():
+    """
+    Get the collection holding the fairly scheduled submissions.
+    """
+    return mongo.db.Backlog
+
+
+def get_fair_services():
+    """
+    Get the maximum queue depth of each fairly scheduled service.
+
+    :returns: Dict of maximum queue depths by service name.
+    """
+    return dict((service.service_name, service.max_queue_depth) for
+                service in get_registry() if service.fair_scheduling)
+
+
+def get_queue_depth(service_name):
+    """
+    Get the number of messages waiting in the queue of a service.
+
+    :param service_name: Name of the service
+    """
+    service = get_registry().get_by_name(service_name)
+    return sum(QUEUE_STATS.get(queue_name)[0] for
+               queue_name, _ in service.service_queues)
+
+
+def select_queue(service, doc_url=None):
+    """
+    Select the queue of a service with the lowest estimated wait.
+
+    Services with size classes first get the queues of the size class of the
+    document, given by its preflight.
+    The wait of a queue is estimated from its cached number of waiting
+    messages divided by the throughput of its consumers, i.e.: their number
+    times the queue weight. Queues without consumers are selected last.
+
+    :param service: Descriptor of the service
+    :param doc_url: URL of the document to process
+    :returns: Name of the selected queue.
+    """
+    queues = service.queues
+    if service.size_classes and doc_url:
+        size_class = preflight.match_size_class(service.size_classes,
+                                                PREFLIGHT.head(doc_url))
+        if size_class is not None:
+            queues = size_class['queues']
+
+    if len(queues) == 1:
+        return queues[0][0]
+
+    def estimated_wait(queue):
+        queue_name, weight = queue
+        messages, consumers = QUEUE_STATS.get(queue_name)
+        return (consumers == 0,
+                (messages + 1.0) / (weight * max(consumers, 1)))
+
+    queue_name = min(queues, key=estimated_wait)[0]
+    QUEUE_STATS.add_message(queue_name)
+    return queue_name
+
+
+def release_task(service_name, params):
+    """
+    Publish a submission released by the fair scheduler.
+
+    :param service_name: Name of the service which is requested.
+    :param params: Publishing parameters of the task, without the Celery app
+                   nor the queue.
+    """
+    service = get_registry().get_by_name(service_name)
+    queue_name = select_queue(service, params['url'])
+    async_call(publish_task, app=CELERY_APP, queue=queue_name, **params)
+    if len(service.service_queues) > 1:
+        get_request_records().update(params['task_id'], queue=queue_name)
+
+
+def hold_task(service_name, params, expires):
+    """
+    Hold a submission in the virtual queue of its client until the fair
+    scheduler releases it.
+
+    :param service_name: Name of the service which is requested.
+    :param params: Publishing parameters of the task.
+    :param expires: UTC time after which the task must not be run anymore.
+    :returns: UUID of the task
+    """
+    params.setdefault('task_id', str(uuid4()))
+    held_params = dict((key, value) for key, value in params.items()
+                       if key not in ('app', 'expires'))
+    fair_scheduler.hold(get_backlog(), params['task_id'], service_name,
+                        get_client_id(), held_params, expires)
+    return params['task_id']
+
+
+def start_fair_scheduler():
+    """
+    Start the fair scheduler of held submissions in the current process,
+    releasing them only while it holds the fair scheduler lease.
+    """
+    settings = APP.config['FAIR_SCHEDULING']
+    fair_scheduler.FairScheduler(
+        get_backlog,
+        get_fair_services,
+        get_queue_depth,
+        release_task,
+        settings,
+        get_lease('fair_scheduler', max(10, 2 * settings['INTERVAL']))).start()
+
+
+def start_registry_reload(on_reload):
+    """
+    Start the hot reload of the service registry in the current process.
+
+    :param on_reload: Callable taking the new registry, called once it is
+                      swapped in.
+    """
+    settings = APP.config['REGISTRY_RELOAD']
+    registry_reload.RegistryReloader(
+        registry_reload.open_source(settings, get_database),
+        load_registry, on_reload, settings).start()
+
+
+def get_claim_url(claim_id):
+    """
+    Get the URL from which workers fetch the payload of a claim, holding a
+    token authorising the access to this claim only.
+
+    :param claim_id: Id of the claim
+    """
+    key = APP.config['SECURITY'].get('AUTHORISATION_KEY')
+    if not key:
+        return url_for('claim', claim_id=claim_id, _external=True)
+    return url_for('claim',
+                   claim_id=claim_id,
+                   token=claim_check.sign(claim_id, key),
+                   _external=True)
+
+
+def resolve_result(state):
+    """
+    Replace the claim-check reference given as result of a successful task by
+    its payload, failing the task if the claim doesn't exist anymore.
+
+    :param state: State of a successful task
+    :returns: The state given
+    """
+    try:
+        state['result'] = claim_check.resolve(mongo.db, state['result'])
+    except UnknownClaimError as exc:
+        get_x_code = VestaExceptions.Instance().get_exception_code
+        state['status'] = 'FAILURE'
+        state['result'] = {'code': get_x_code(exc), 'message': repr(exc)}
+    return state
+
+
+def purge_claims():
+    """
+    Delete the claims older than their maximum age.
+    """
+    claim_check.purge(mongo.db, APP.config['CLAIM_CHECK']['MAX_AGE'])
+
+
+def start_claim_purge():
+    """
+    Start the periodic purge of claims in the current process.
+    """
+    background.start_worker('claim_purge',
+                            APP.config['CLAIM_CHECK']['PURGE_INTERVAL'],
+                            purge_claims)
+
+
+def get_result_url(uuid, service_route='.'):
+    """
+    Get the URL from which clients get the items of a stored result.
+
+    :param uuid: UUID of the task
+    :param service_route: service route of the task
+    """
+    if service_route == '.':
+        return url_for('result', uuid=uuid, _external=True)
+    return url_for('result', service_route=service_route, uuid=uuid,
+                   _external=True)
+
+
+def purge_results():
+    """
+    Delete the stored results older than their maximum age.
+    """
+    result_stream.purge(mongo.db, APP.config['RESULT_STREAMING']['MAX_AGE'])
+
+
+def start_result_purge():
+    """
+    Start the periodic purge of stored results in the current process.
+    """
+    background.start_worker('result_purge',
+                            APP.config['RESULT_STREAMING']['PURGE_INTERVAL'],
+                            purge_results)
+
+
+def get_int_arg(name, default):
+    """
+    Get a non negative integer argument of the current request.
+
+    :param name: Name of the argument
+    :param default: Value of the argument when it isn't given
+    :raises: :py:exc:`~.vesta_exceptions.InvalidParameterError`
+    """
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise InvalidParameterError(name, value)
+    if value < 0:
+        raise InvalidParameterError(name, value)
+    return value
+
+
+def get_result_page(service_route='.'):
+    """
+    Stream a page of the items of a task result as NDJSON.
+
+    Results of successful tasks are stored out of band if they aren't
+    already. Responses give the number of items of the result in the
+    X-Total-Count header and, unless the page is the last one, the offset of
+    the next page in the X-Next-Offset header.
+
+    :param service_route: service route to obtain the requested service name
+    :returns: Streamed response, or the JSON status of unfinished tasks.
+    :raises: :py:exc:`~.vesta_exceptions.MissingParameterError`
+    :raises: :py:exc:`~.vesta_exceptions.InvalidParameterError` if the
+             offset or the limit isn't a non negative integer.
+    """
+    service_name = validate_service_route(service_route)
+    if 'uuid' not in request.args:
+        raise MissingParameterError('GET', '/result', 'uuid')
+    request_uuid = request.args['uuid']
+    validate_uuid(request_uuid, service_name)
+
+    settings = APP.config['RESULT_STREAMING']
+    offset = get_int_arg('offset', 0)
+    limit = min(get_int_arg('limit', settings['PAGE_SIZE']),
+                settings['MAX_PAGE_SIZE'])
+
+    page = result_stream.open_page(mongo.db, request_uuid, offset, limit)
+    if page is None:
+        state = get_task_state('status', service_route)
+        if state['status'] != 'SUCCESS':
+            return make_json_response(state)
+        if not result_stream.describe(mongo.db, request_uuid, None):
+            result_stream.store(mongo.db, request_uuid, state['result'],
+                                settings['CHECKPOINT_INTERVAL'])
+        page = result_stream.open_page(mongo.db, request_uuid, offset, limit)
+
+    count, lines = page
+    response = APP.response_class(lines, mimetype='application/x-ndjson')
+    response.headers['X-Total-Count'] = str(count)
+    if offset + limit < count:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response
+
+
+def get_task_expiry(service):
+    """
+    Get the time after which a submitted task must not be run anymore.
+
+    This is the earliest of the expiry configured for the service by
+    *task_expires* and of the *deadline* given by the client, either as a
+    number of seconds or as a UTC time formatted like 2015-01-01T00:00:00Z,
+    which must be in the future and at most MAX_DEADLINE seconds away.
+
+    :param service: Descriptor of the service
+    :returns: UTC datetime or None if the task doesn't expire.
+    :raises: :py:exc:`~.vesta_exceptions.InvalidParameterError`
+    """
+    now = datetime.datetime.utcnow()
+    expiries = []
+    if service.task_expires:
+        expiries.append(now + datetime.timedelta(
+            seconds=service.task_expires))
+
+    deadline = request.values.get('deadline')
+    if deadline is not None:
+        max_deadline = APP.config['MAX_DEADLINE']
+        try:
+            seconds = float(deadline)
+        except ValueError:
+            try:
+                seconds = (datetime.datetime.strptime(
+                    deadline, '%Y-%m-%dT%H:%M:%SZ') - now).total_seconds()
+            except ValueError:
+                raise InvalidParameterError('deadline', deadline)
+        # NaN fails both comparisons
+        if not 0 < seconds <= max_deadline:
+            raise InvalidParameterError('deadline', deadline)
+        expiries.append(now + datetime.timedelta(seconds=seconds))
+
+    if not expiries:
+        return None
+    return min(expiries)
+
+
+def get_client_id():
+    """
+    Get the identity of the client making the current request.
+
+    Depending on CLIENT_IDENTITY, this is the remote address of the client or
+    the CLIENT_IDENTITY_CLAIM of the validated JWT it gave in the
+    Authorization header, *anonymous* if it has none.
+
+    :returns: Client identity
+    """
+    logger = logging.getLogger(__name__)
+    if APP.config['CLIENT_IDENTITY'] != 'jwt':
+        return request.remote_addr
+
+    token = request.headers.get('Authorization')
+    if token:
+        jwt_settings = APP.config['SECURITY'].get('JWT', {})
+        try:
+            claims = decode_token(token,
+                                  jwt_settings['JWT_SIGNATURE_KEY'],
+                                  jwt_settings['JWT_AUDIENCE'])
+        except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+            logger.debug("Cannot validate token %s", token)
+        else:
+            client_id = claims.get(APP.config['CLIENT_IDENTITY_CLAIM'])
+            if isinstance(client_id, string_types):
+                return client_id
+    return u'anonymous'
+
+
+def get_task_priority(service):
+    """
+    Get the broker priority of a submitted task.
+
+    The *priority* given by the client is bounded by its limit in
+    PRIORITIES. Services without *max_priority* don't use priorities.
+
+    :param service: Descriptor of the service
+    :returns: Priority or None if the service doesn't use priorities.
+    :raises: :py:exc:`~.vesta_exceptions.InvalidParameterError`
+    """
+    logger = logging.getLogger(__name__)
+    if service.max_priority is None:
+        return None
+
+    settings = APP.config['PRIORITIES']
+    priority = request.values.get('priority')
+    if priority is None:
+        return settings['DEFAULT_PRIORITY']
+    try:
+        priority = int(priority)
+    except ValueError:
+        raise InvalidParameterError('priority', priority)
+    if priority < 0:
+        raise InvalidParameterError('priority', priority)
+
+    client_id = get_client_id()
+    limit = min(settings['CLIENT_LIMITS'].get(client_id,
+                                              settings['DEFAULT_LIMIT']),
+                service.max_priority)
+    if priority > limit:
+        logger.info("Lowering priority %s of client %s to its limit %s",
+                    priority, client_id, limit)
+        priority = limit
+    return priority
+
+
 def validate_url(url):
     """
     Check if URL is invalid.
@@ -311,8 +1136,10 @@ def submit_task(storage_doc_id, task_name, service_route='.', **extra_params):
     :raises: :py:exc:`~.vesta_exceptions.MissingParameterError`
     """
     logger = logging.getLogger(__name__)
-    service_name = validate_service_route(service_route)
+    service = get_service(service_route)
+    service_name = service.service_name
     params = extra_params
+    record_fields = {}
     logger.debug("Extra params are : %s", params)
     no_params_needed = params.get('no_params_needed', False)
     logger.debug("no_params_needed is set to %s", no_params_needed)
@@ -353,7 +1180,8 @@ def submit_task(storage_doc_id, task_name, service_route='.', **extra_params):
         return x.startswith('storage_') and x.endswith('_id')
 
     def is_url_arg(x):
-        return x.endswith('_url') and x != 'doc_url'
+        return x.endswith('_url') and x != 'doc_url' and \
+            x not in SUBMISSION_CONTROL_ARGS
 
     storage_args = list(filter(is_storage_arg, list(request.values.keys())))
     url_args = list(filter(is_url_arg, list(request.values.keys())))
@@ -399,12 +1227,25 @@ def submit_task(storage_doc_id, task_name, service_route='.', **extra_params):
             logger.info("Using argument %s=%s", url_arg, url_)
             params['misc'][url_arg] = url_
 
+    callback_url = request.values.get('callback_url')
+    if callback_url is not None:
+        if APP.config['CALLBACKS']['ENABLED']:
+            validate_url(callback_url)
+            if not callbacks.is_allowed_url(callback_url):
+                raise InvalidParameterError('callback_url', callback_url)
+            record_fields['callback_url'] = callback_url
+            record_fields['callback_pending'] = True
+        else:
+            logger.warning("Ignoring callback_url since callbacks are "
+                           "disabled")
+
     log_request(service_name, 'POST {request} request on {doc_url}'
                 .format(request=task_name, doc_url=doc_url))
 
     other_args = {}
     for key, value in request.values.items():
-        if not is_storage_arg(key) and not is_url_arg(key):
+        if not is_storage_arg(key) and not is_url_arg(key) and \
+           key not in SUBMISSION_CONTROL_ARGS:
             other_args[key] = value
 
     # Add this so that all workers can know where the default associated
@@ -412,33 +1253,207 @@ def submit_task(storage_doc_id, task_name, service_route='.', **extra_params):
     other_args['upload_url'] = APP.config['POST_STORAGE_DOC_REQ_URL']
     logger.debug("Other arbitrary arguments: %s", other_args)
 
-    worker_config = APP.config['WORKER_SERVICES'][service_name]
-    celery_task_name = worker_config['celery_task_name']
     params['url'] = doc_url
-    params['name'] = celery_task_name
+    params['name'] = service.celery_task_name
     params['app'] = CELERY_APP
-    params['queue'] = worker_config['celery_queue_name']
+    if service.compression:
+        params['compression'] = service.compression
+        params['compression_min_size'] = service.compression_min_size
+        if service.compression_min_size is None:
+            params['compression_min_size'] = \
+                APP.config['COMPRESSION_MIN_SIZE']
+
+    # Workers discard the task instead of running it once it expired.
+    expires = get_task_expiry(service)
+    if expires is not None:
+        params['expires'] = \
+            (expires - datetime.datetime.utcnow()).total_seconds()
+        record_fields['expires'] = expires
+
+    priority = get_task_priority(service)
+    if priority is not None:
+        params['priority'] = priority
+        record_fields['priority'] = priority
+
     params['misc'].update(other_args)
+
+    # Identical submissions of a document already processed get the cached
+    # result without running the worker.
+    cache_key = None
+    cache_config = APP.config['RESULT_CACHE']
+    if cache_config['ENABLED']:
+        doc_identity = result_cache.get_document_identity(
+            storage_doc_id, doc_url, PREFLIGHT)
+        if doc_identity is not None:
+            cache_key = result_cache.get_cache_key(service_name,
+                                                   service.version,
+                                                   params['misc'],
+                                                   doc_identity)
+            if mongo.db.ResultCache.find_one({'_id': cache_key},
+                                             projection={'_id': True}):
+                cached_uuid = str(uuid4())
+                logger.info('"%s" task result for %s is cached -> UUID = %s',
+                            friendly_task_name, doc_url, cached_uuid)
+                store_uuid(cached_uuid, service_name,
+                           cache_key=cache_key, cached=True, **record_fields)
+                return make_json_response({'uuid': cached_uuid})
+
+    # Retried submissions get the UUID of the first one instead of being
+    # published again.
+    idempotency_settings = APP.config['IDEMPOTENCY']
+    idempotency_key = idempotency.get_idempotency_key(
+        idempotency_settings, request.headers, service_name, get_client_id(),
+        doc_url, params['misc'])
+    if idempotency_key is not None:
+        params['task_id'] = str(uuid4())
+        known_uuid = idempotency.claim_key(
+            mongo.db.Submissions, idempotency_key, params['task_id'],
+            idempotency_settings.get('PENDING_TIMEOUT', 60))
+        if known_uuid is not None:
+            logger.info('"%s" task already submitted for %s -> UUID = %s',
+                        friendly_task_name, doc_url, known_uuid)
+            return make_json_response({'uuid': known_uuid})
+
+    # Large payloads are fetched by workers instead of going through the
+    # broker.
+    claim_config = APP.config['CLAIM_CHECK']
+    if claim_config['ENABLED']:
+        params['misc'] = claim_check.offload(mongo.db,
+                                             params['misc'],
+                                             claim_config['THRESHOLD'],
+                                             get_claim_url)
+
     logger.debug("Final param structure : %s", params)
-    async_result = async_call(send_task_request, **params)
+    try:
+        if service.fair_scheduling:
+            task_id = hold_task(service_name, params, expires)
+        else:
+            params['queue'] = select_queue(service, doc_url)
+            if len(service.service_queues) > 1:
+                record_fields['queue'] = params['queue']
+            task_id = async_call(publish_task, **params).task_id
+    except:
+        if idempotency_key is not None:
+            idempotency.release_key(mongo.db.Submissions,
+                                    idempotency_key,
+                                    params['task_id'])
+        raise
 
     logger.info('"%s" task submitted for %s -> UUID = %s',
-                friendly_task_name, doc_url, async_result.task_id)
+                friendly_task_name, doc_url, task_id)
 
-    store_uuid(async_result.task_id, service_name)
+    if cache_key is not None:
+        record_fields['cache_key'] = cache_key
+    store_uuid(task_id, service_name, **record_fields)
+    if idempotency_key is not None:
+        idempotency.confirm_key(mongo.db.Submissions, idempotency_key, task_id)
 
-    return jsonify({'uuid': async_result.task_id})
+    return make_json_response({'uuid': task_id})
 
 
 def uuid_task(task, service_route='.'):
     """
     Get the status or cancel a task identified by a UUID.
 
+    The state is projected on the fields given by the *fields* argument, if
+    any, as a comma separated list of dotted paths (e.g.:
+    ``status,result.current``). The result isn't read from the status store
+    when it isn't requested.
+
     :param task: status or cancel
     :param service_route: service route to obtain the requested service name
     :returns: JSON object with latest status or error response.
     :raises: :py:exc:`~.vesta_exceptions.MissingParameterError`
     """
+    return get_projected_state(task, service_route)[1]
+
+
+def get_projected_state(task, service_route='.'):
+    """
+    Get the state of a task and its projection on the requested fields.
+
+    :param task: status or cancel
+    :param service_route: service route to obtain the requested service name
+    :returns: Tuple of the state and of the projected state.
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        state = get_task_state(task, service_route)
+        return state, state
+    projection = compile_projection(fields)
+    state = get_task_state(task, service_route, 'result' in projection)
+    return state, apply_projection(state, projection)
+
+
+def get_state_version(state, fields=None):
+    """
+    Get a cheap summary of a task state changing whenever its body does.
+
+    Apart from the progress of running tasks, the body of a state only changes
+    with its status, e.g.: results are never updated.
+
+    :param state: Task state before its projection.
+    :param fields: The *fields* argument of the request, if any.
+    """
+    result = state.get('result')
+    progress = None
+    if isinstance(result, dict) and state.get('status') == 'PROGRESS':
+        progress = (result.get('current'), result.get('total'))
+    return (state.get('uuid'), state.get('status'), progress, fields)
+
+
+def conditional_response(version, build_response):
+    """
+    Answer a GET request with an ETag derived from the version of the
+    response, or with *304 Not Modified* if the client already has it.
+
+    :param version: Hashable summary of all that the response depends on.
+    :param build_response: Callable returning the response, only called when
+                           the client doesn't have it.
+    :returns: Flask response.
+    """
+    # The body also depends on the negotiated format
+    version = (version, request_wants_json(), request_wants_xml())
+    etag = hashlib.sha1(repr(version).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        METRICS.incr('conditional.not_modified')
+        response = APP.response_class(status=304)
+    else:
+        response = make_response(build_response())
+    response.set_etag(etag)
+    return response
+
+
+def make_status_response(task, service_route='.'):
+    """
+    Get the status or cancel a task identified by a UUID, as a JSON or XML
+    response.
+
+    Status responses have an ETag derived from the status and progress of the
+    task so that pollers get *304 Not Modified* until the state changes.
+
+    :param task: status or cancel
+    :param service_route: service route to obtain the requested service name
+    :returns: Flask response.
+    """
+    state, projected_state = get_projected_state(task, service_route)
+    if task != 'status':
+        return make_data_response(projected_state)
+    version = get_state_version(state, request.args.get('fields'))
+    return conditional_response(
+        version, lambda: make_data_response(projected_state))
+
+
+def get_task_state(task, service_route='.', include_result=True):
+    """
+    Get the state or cancel a task identified by a UUID.
+
+    :param task: status or cancel
+    :param service_route: service route to obtain the requested service name
+    :param include_result: Whether the result of the task is requested.
+    :returns: Dictionary containing task status.
+    :raises: :py:exc:`~.vesta_exceptions.MissingParameterError`
+    """
     logger = logging.getLogger(__name__)
     service_name = validate_service_route(service_route)
     if 'uuid' not in request.args:
@@ -450,15 +1465,79 @@ def uuid_task(task, service_route='.'):
 
     logger.info('%s request on task %s for %s',
                 task, request_uuid, service_name)
-    validate_uuid(request_uuid, service_name)
+    data = validate_uuid(request_uuid, service_name)
+
+    if data.get('cached'):
+        return get_cached_state(request_uuid, data['cache_key'])
 
     if task == 'cancel':
+        if fair_scheduler.drop(get_backlog(), request_uuid):
+            logger.info("Dropped held submission %s", request_uuid)
         async_call(cancel_request, request_uuid, CELERY_APP)
-    state = async_call(get_request_info, request_uuid, CELERY_APP)
-    state = validate_state(request_uuid, service_name, state)
+
+    # Results stored out of band are described without being loaded
+    streaming = APP.config['RESULT_STREAMING']
+    if streaming['ENABLED']:
+        result_url = get_result_url(request_uuid, service_route)
+        description = result_stream.describe(mongo.db, request_uuid,
+                                             result_url)
+        if description is not None:
+            return {'uuid': request_uuid,
+                    'status': 'SUCCESS',
+                    'result': description}
+    # Results are cached and streamed whole, then bounded for the response
+    whole = include_result and bool(streaming['ENABLED'] or
+                                    data.get('cache_key'))
+    try:
+        state = async_call(STATUS_STORE.get, request_uuid, include_result,
+                           not whole)
+    except WorkerExceptionWrapper as exc:
+        # Workers discard expired tasks by revoking them
+        if exc.task_status == 'REVOKED' and is_past_expiry(data):
+            return {'uuid': request_uuid, 'status': 'EXPIRED', 'result': None}
+        raise
+    state = validate_state(request_uuid, service_name, state, data)
+    if not include_result:
+        return state
+
+    if state['status'] == 'SUCCESS':
+        resolve_result(state)
+
+    if state['status'] == 'SUCCESS' and data.get('cache_key'):
+        cache_config = APP.config['RESULT_CACHE']
+        result_cache.store(mongo.db.ResultCache,
+                           data['cache_key'],
+                           state['result'],
+                           cache_config['MAX_RESULT_SIZE'],
+                           cache_config['MAX_ENTRIES'])
+
+    if state['status'] == 'SUCCESS' and streaming['ENABLED']:
+        state['result'] = result_stream.offload(
+            mongo.db, request_uuid, state['result'], streaming['MIN_SIZE'],
+            streaming['CHECKPOINT_INTERVAL'], result_url)
+
+    if whole:
+        state['result'] = STATUS_STORE.bound(state['result'])
     return state
 
 
+def get_cached_state(uuid, cache_key):
+    """
+    Get the state of a request answered from the result cache.
+
+    :param uuid: UUID of a given request
+    :param cache_key: Key of the cached result
+    :returns: Dictionary containing task status, which is EXPIRED if the
+              result has been evicted from the cache meanwhile.
+    """
+    logger = logging.getLogger(__name__)
+    result = result_cache.lookup(mongo.db.ResultCache, cache_key)
+    if result is None:
+        logger.info("Cached result of request %s has been evicted", uuid)
+        return {'uuid': uuid, 'status': 'EXPIRED', 'result': None}
+    return {'uuid': uuid, 'status': 'SUCCESS', 'result': result}
+
+
 def get_canarie_api_response(service_route, canarie_api_request):
     """
     Provide a valid HTML response for the CANARIE API request based on the
@@ -472,20 +1551,34 @@ def get_canarie_api_response(service_route, canarie_api_request):
     """
 
     service_name = validate_service_route(service_route)
+    key = ('canarie', service_name, canarie_api_request, request.script_root)
+    return CONFIGURATION_CACHE.get_response(
+        APP.response_class, key,
+        lambda: build_canarie_api_response(service_name, canarie_api_request))
+
+
+def build_canarie_api_response(service_name, canarie_api_request):
+    """
+    Build the response to a CANARIE API request from the configuration of a
+    service.
 
+    :param service_name: Name of the service.
+    :param canarie_api_request: The request specified in the URL
+    :returns: A valid HTML response
+    """
     # The service config should return either :
     #      - A valid URL (in which case a redirection is performed)
     #      - A relative template file from which an HTML page is rendered
     #      - A comma separated list corresponding to the response tuple
     #      (response, status)
-    worker_config = APP.config['WORKER_SERVICES'][service_name]
-    cfg_val = worker_config[canarie_api_request]
+    cfg_val = get_registry().get_by_name(service_name).canarie.get(
+        canarie_api_request, '')
 
     template_folder = APP.template_folder
     if cfg_val.find('http') == 0:
         return redirect(cfg_val)
     elif path.isfile(path.join(template_folder, cfg_val.rsplit('#', 1)[0])):
-        return render_template(cfg_val)
+        return make_response(render_template(cfg_val))
     elif len(cfg_val.split(',')) == 2:
         return make_response(*(cfg_val.split(',')))
     else:
@@ -608,7 +1701,7 @@ def make_error_response(html_status=None,
                 format(html_resp=html_response_header,
                        vesta_exc=vesta_exc_log_msg))
 
-    if request_wants_json():
+    if request_wants_json() or request_wants_xml():
         # Line break doesn't make sense in JSON
         vesta_exc_message = vesta_exc_message.replace("\\n", " ")
         # Replace double quote by single one because JSON uses double quotes
@@ -625,7 +1718,7 @@ def make_error_response(html_status=None,
             }
             # Worker exceptions have a FAILURE status in the body but are sent
             # as a 200 response
-            return jsonify(status_response), 200
+            return make_data_response(status_response, 200)
         else:
             response = {
                 'status': html_status,
@@ -636,7 +1729,7 @@ def make_error_response(html_status=None,
                 }
             }
             logger.debug("response is %s", response)
-            return jsonify(response), html_status
+            return make_data_response(response, html_status)
     else:
         # Escapes message properly for HTML
         html_escape_table = {
@@ -681,7 +1774,8 @@ def log_request(service_name, url):
             "service": service_name,
             "client": request.remote_addr,
             "request": url}
-    logger.info("Log into DB : %s", json. dumps(data,default=json_util.default))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Log into DB : %s", serialization.dumps(data))
 
     mongo.db.Invocations.insert_one(data)
 
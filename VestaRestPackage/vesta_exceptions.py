@@ -74,6 +74,14 @@ class VestaExceptions(object):
                           status=httplib.BAD_REQUEST),
             ExceptionInfo(code=207, exc_type='DocumentUrlNotValidException',
                           status=httplib.BAD_REQUEST),
+            ExceptionInfo(code=208, exc_type='ExpiredUUIDError',
+                          status=httplib.GONE),
+            ExceptionInfo(code=209, exc_type='InvalidParameterError',
+                          status=httplib.BAD_REQUEST),
+            ExceptionInfo(code=210, exc_type='UnknownClaimError',
+                          status=httplib.NOT_FOUND),
+            ExceptionInfo(code=211, exc_type='PendingSubmissionError',
+                          status=httplib.CONFLICT),
 
             # -----------------------------------------------------------------
             # 3xx exception codes are reserved for Service package
@@ -228,6 +236,16 @@ class UnknownUUIDError(VRPException):
         super(UnknownUUIDError, self).__init__(msg)
 
 
+class ExpiredUUIDError(VRPException):
+    """
+    Indicates that the requested UUID existed but its request has expired.
+    """
+    def __init__(self, uuid):
+        msg = ('User requested a UUID which has expired : {uuid}'
+               .format(uuid=uuid))
+        super(ExpiredUUIDError, self).__init__(msg, status_code=410)
+
+
 class MissingParameterError(VRPException):
     """
     Indicates that a required parameter is missing.
@@ -240,6 +258,37 @@ class MissingParameterError(VRPException):
         super(MissingParameterError, self).__init__(msg)
 
 
+class InvalidParameterError(VRPException):
+    """
+    Indicates that a parameter has an invalid value.
+    """
+    def __init__(self, param, value):
+        msg = ('The parameter {param} has an invalid value : {value}'
+               .format(param=param, value=value))
+        super(InvalidParameterError, self).__init__(msg)
+
+
+class UnknownClaimError(VRPException):
+    """
+    Indicates that the requested claim of an offloaded payload doesn't exist.
+    """
+    def __init__(self, claim_id):
+        msg = ('User requested a claim which did not exist : {claim_id}'
+               .format(claim_id=claim_id))
+        super(UnknownClaimError, self).__init__(msg, status_code=404)
+
+
+class PendingSubmissionError(VRPException):
+    """
+    Indicates that a submission with the same idempotency key is still being
+    submitted.
+    """
+    def __init__(self):
+        msg = ('A submission with the same idempotency key is in progress, '
+               'retry later')
+        super(PendingSubmissionError, self).__init__(msg, status_code=409)
+
+
 class VersionMismatchError(VRPException):
     """
     Indicates that a service version declared in the REST configuration
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Benchmark of the response compression middleware on a large JSON status
+response, sent whole or streamed by chunks, against the uncompressed
+response.
+"""
+
+from __future__ import print_function
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.compressed_responses import CompressedResponses
+from VestaRestPackage import serialization
+from harness import make_parser, make_status_payload, measure, report
+
+SETTINGS = {'MIN_SIZE': 1024,
+            'SKIP_TYPES': ['image/', 'video/', 'audio/', 'application/zip']}
+
+CHUNK_SIZE = 65536
+
+
+def make_app(body, streamed):
+    """
+    Make a WSGI application answering a JSON body.
+
+    :param body: Encoded body of the responses.
+    :param streamed: Whether the body is sent by chunks of unknown length.
+    """
+    def app(environ, start_response):
+        headers = [('Content-Type', 'application/json')]
+        if streamed:
+            start_response('200 OK', headers)
+            return (body[start:start + CHUNK_SIZE]
+                    for start in range(0, len(body), CHUNK_SIZE))
+        headers.append(('Content-Length', str(len(body))))
+        start_response('200 OK', headers)
+        return [body]
+    return app
+
+
+def get_size(app, encoding):
+    """
+    Call a WSGI application and get the size of its response body.
+    """
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': encoding}
+    return sum(len(chunk) for chunk in app(environ, lambda *args: None))
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    args = make_parser(__doc__).parse_args()
+    body = serialization.dumps_json(
+        make_status_payload(args.items)).encode('utf-8')
+    results = []
+    for streamed in (False, True):
+        mode = 'streamed' if streamed else 'whole'
+        app = make_app(body, streamed)
+        results.append(('{0} identity'.format(mode),
+                        measure(lambda: get_size(app, 'identity'),
+                                args.number)))
+        for level in (1, 6, 9):
+            compressed_app = CompressedResponses(app, dict(SETTINGS,
+                                                           LEVEL=level))
+            for encoding in ('gzip', 'deflate'):
+                size = get_size(compressed_app, encoding)
+                results.append((
+                    '{0} {1} {2} ({3:.1%})'.format(mode, encoding, level,
+                                                   float(size) / len(body)),
+                    measure(lambda: get_size(compressed_app, encoding),
+                            args.number)))
+    print("{0} bytes status response".format(len(body)))
+    report(results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Benchmark of the installed JSON encoders and of the XML encoding on a large
+status payload.
+"""
+
+from __future__ import print_function
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage import serialization
+from harness import make_parser, make_status_payload, measure, report
+
+
+def benchmark(value, number):
+    """
+    Time the installed encoders and the XML encoding.
+
+    :param value: Value to encode.
+    :param number: Number of encodings by encoder.
+    :returns: List of (encoder name, seconds by encoding) tuples.
+    """
+    encoders = serialization.ENCODERS + [('xml', serialization.dumps_xml)]
+    return [(name, measure(lambda: encoder_dumps(value), number))
+            for name, encoder_dumps in encoders]
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    args = make_parser(__doc__).parse_args()
+    payload = make_status_payload(args.items)
+    print("{0} bytes status payload".format(
+        len(serialization.dumps_json(payload))))
+    report(benchmark(payload, args.number))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Helpers shared by the benchmarks of the gateway.
+
+Each benchmark is a script run from the root of the repository, e.g.::
+
+   python benchmarks/bench_serialization.py -n 20 -i 100000
+"""
+
+from __future__ import print_function
+
+# -- Standard lib ------------------------------------------------------------
+from argparse import ArgumentParser
+import threading
+import datetime
+import timeit
+import time
+
+
+def make_parser(description, number=20, items=100000):
+    """
+    Make the parser of the arguments common to the benchmarks.
+
+    :param description: Description of the benchmark.
+    :param number: Default number of runs of each measure.
+    :param items: Default number of items of the status payload.
+    :returns: Instance of :py:class:`argparse.ArgumentParser`.
+    """
+    parser = ArgumentParser(description=description)
+    parser.add_argument("-n",
+                        action='store',
+                        type=int,
+                        default=number,
+                        dest='number',
+                        help='Number of runs of each measure')
+    parser.add_argument("-i",
+                        action='store',
+                        type=int,
+                        default=items,
+                        dest='items',
+                        help='Number of items of the status payload')
+    return parser
+
+
+def make_status_payload(items):
+    """
+    Build a large status payload.
+
+    :param items: Number of items of the result.
+    """
+    start_time = datetime.datetime(2014, 9, 10, 12, 23, 19)
+    return {'uuid': 'f1b40709-ca76-4554-b19f-277b2f8d5d49',
+            'status': 'SUCCESS',
+            'result': [{'start': index * 0.5,
+                        'end': index * 0.5 + 0.5,
+                        'label': u'speaker_{0}'.format(index % 8),
+                        'confidence': 0.75,
+                        'time': start_time + datetime.timedelta(seconds=index),
+                        'tags': ['voice', 'male']}
+                       for index in range(items)]}
+
+
+def measure(function, number):
+    """
+    Time a function.
+
+    :param function: Callable without arguments.
+    :param number: Number of calls.
+    :returns: Mean duration of a call in seconds.
+    """
+    return timeit.timeit(function, number=number) / number
+
+
+def report(results):
+    """
+    Print the results of a benchmark.
+
+    :param results: List of (measure name, seconds) tuples.
+    """
+    for name, seconds in results:
+        print("{0:<28} {1:.2f} ms".format(name, seconds * 1000))
+
+
+def measure_concurrent(function, threads, number):
+    """
+    Time a function called concurrently by several threads.
+
+    :param function: Callable taking the index of the calling thread.
+    :param threads: Number of threads.
+    :param number: Number of calls by each thread.
+    :returns: Dict of the throughput in calls per second and of the 50th, 95th
+              and 99th percentiles of the call durations in seconds.
+    """
+    durations = [[] for _ in range(threads)]
+
+    def run(index):
+        for _ in range(number):
+            start = time.time()
+            function(index)
+            durations[index].append(time.time() - start)
+
+    workers = [threading.Thread(target=run, args=(index,))
+               for index in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    all_durations = sorted(sum(durations, []))
+
+    def percentile(rank):
+        return all_durations[min(len(all_durations) - 1,
+                                 int(len(all_durations) * rank / 100.0))]
+
+    return {'throughput': len(all_durations) / elapsed,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99)}
+
+
+def report_concurrent(results):
+    """
+    Print the results of a concurrent benchmark.
+
+    :param results: List of (measure name, dict given by
+                    :py:func:`measure_concurrent`) tuples.
+    """
+    print("{0:<28} {1:>10} {2:>10} {3:>10} {4:>10}".format(
+        '', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, result in results:
+        print("{0:<28} {1:>10.1f} {2:>10.2f} {3:>10.2f} {4:>10.2f}".format(
+            name, result['throughput'], result['p50'] * 1000,
+            result['p95'] * 1000, result['p99'] * 1000))
@@ -35,7 +35,8 @@ REQUIREMENTS = [
 
 TEST_REQUIREMENTS = [
     'nose',
-    'nose-exclude'
+    'nose-exclude',
+    'mongomock<4'
 ]
 
 setup(
@@ -81,6 +82,11 @@ setup(
         'console_scripts':
             ['vrp_default_config='
              'VestaRestPackage.print_example_configuration:main',
-             'run_service=VestaRestPackage.run_process:main']
+             'run_service=VestaRestPackage.run_process:main',
+             'vrp_archive=VestaRestPackage.retention:main',
+             'vrp_migrate_requests=VestaRestPackage.request_records:main',
+             'vrp_callback_dispatcher=VestaRestPackage.callbacks:main',
+             'vrp_sweeper=VestaRestPackage.sweeper:main',
+             'vrp_fair_scheduler=VestaRestPackage.fair_scheduler:main']
     }
 )
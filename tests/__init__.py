@@ -0,0 +1,5 @@
+# coding:utf-8
+
+"""
+Tests of the service gateway package.
+"""
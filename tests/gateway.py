@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Gateway under test, whose MongoDB clients are backed by mongomock and whose
+task states are kept by the in-memory status store, so that its routes are
+tested without a MongoDB server nor an AMQP broker.
+
+This module must be imported before any module of the gateway: the gateway
+connects to MongoDB and reads its configuration when it is imported. The
+clients created by the gateway, e.g.: after a fork, share the same in-memory
+server.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from os.path import abspath, dirname, join
+import os
+
+# -- 3rd party ---------------------------------------------------------------
+import flask_pymongo
+import mongomock
+
+THIS_DIR = abspath(dirname(__file__))
+
+os.environ['VRP_CONFIGURATION'] = join(THIS_DIR, 'gateway_configuration.py')
+
+_SERVER = mongomock.mongo_client.ServerStore()
+
+
+def make_client(*args, **kwargs):
+    """
+    Make a MongoDB client of the in-memory server.
+    """
+    return mongomock.MongoClient(*args, _store=_SERVER, **kwargs)
+
+flask_pymongo.MongoClient = make_client
+
+# Regular collections have no options
+if not hasattr(mongomock.Collection, 'options'):
+    mongomock.Collection.options = lambda self: {}
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.generic_rest_api import APP
+from VestaRestPackage import utility_rest
+
+# Instance of :py:class:`~VestaRestPackage.status_store.MemoryStatusStore`
+STATUS_STORE = utility_rest.STATUS_STORE
+
+# Service of the configuration
+SERVICE_NAME = 'my_service'
+
+
+def get_client():
+    """
+    Get a test client of the gateway.
+    """
+    return APP.test_client()
+
+
+def submit(uuid, status='PENDING', result=None):
+    """
+    Store the request record of a task of the service along with its state.
+
+    :param uuid: UUID of the task.
+    :param status: Status of the task.
+    :param result: Result of the task.
+    """
+    utility_rest.store_uuid(uuid, SERVICE_NAME)
+    STATUS_STORE.set(uuid, status, result)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Configuration of the gateway under test (see :py:mod:`tests.gateway`).
+"""
+
+MONGO_URI = "mongodb://localhost:27017/vrp_tests"
+
+CELERY = {
+    'BROKER_URL': "memory://",
+    'CELERY_RESULT_BACKEND': "cache+memory://",
+    'CELERY_TASK_SERIALIZER': "json",
+    'CELERY_RESULT_SERIALIZER': "json",
+    'CELERY_ACCEPT_CONTENT': ["json"],
+    'CELERY_TASK_RESULT_EXPIRES': 7200}
+
+# States are set by the tests
+STATUS_STORE = {
+    'TYPE': 'memory',
+    'TASKMETA_COLLECTION': 'celery_taskmeta',
+    'MAX_RESULT_SIZE': 0}
+
+# Background workers are run by the tests which need them
+SWEEPER = {
+    'ENABLED': False,
+    'IN_GATEWAY': False,
+    'INTERVAL': 60,
+    'BATCH_SIZE': 500,
+    'ORPHAN_AGE': 86400,
+    'REVOKE_ORPHANS': False}
+
+WORKER_SERVICES = {
+    'my_service': {
+        'route_keyword': 'my_service',
+        'celery_task_name': 'my_service',
+        'celery_queue_name': 'my_service',
+        'version': '1.0.0',
+        'name': 'My service',
+        'synopsis': 'Does something',
+        'institution': 'CRIM',
+        'releaseTime': '2015-01-01T00:00:00Z',
+        'supportEmail': 'support@example.com',
+        'category': 'Data Manipulation',
+        'researchSubject': 'Multimedia',
+        'tags': 'audio,speech'}}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Local HTTP server standing in for the services called by the gateway, e.g.:
+the receivers of completion callbacks or the document servers.
+"""
+
+from future.standard_library import install_aliases
+install_aliases()
+
+# -- Standard lib ------------------------------------------------------------
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Handler recording the requests and answering the next queued response.
+    """
+    def do_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        server = self.server
+        with server.lock:
+            server.requests.append({'method': self.command,
+                                    'path': self.path,
+                                    'headers': dict(self.headers.items()),
+                                    'body': body})
+            if server.responses:
+                status, headers, content = server.responses.pop(0)
+            else:
+                status, headers, content = server.default_response
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        # HEAD responses may describe a body which isn't sent
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_GET = do_request
+    do_HEAD = do_request
+    do_POST = do_request
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(object):
+    """
+    HTTP server running in a thread on a free local port.
+    """
+    def __init__(self, status=200, headers=None, content=b''):
+        """
+        :param status: Status of the responses which aren't queued.
+        :param headers: Headers of the responses which aren't queued.
+        :param content: Body of the responses which aren't queued.
+        """
+        self.server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.responses = []
+        self.server.default_response = (status, headers or {}, content)
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path='/'):
+        """
+        Get the URL of a path of the server.
+        """
+        return 'http://127.0.0.1:{0}{1}'.format(self.server.server_port, path)
+
+    def queue_response(self, status, headers=None, content=b''):
+        """
+        Queue the response to the next request.
+        """
+        with self.server.lock:
+            self.server.responses.append((status, headers or {}, content))
+
+    @property
+    def requests(self):
+        """
+        Requests received so far.
+        """
+        with self.server.lock:
+            return list(self.server.requests)
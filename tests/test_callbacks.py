@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the delivery of completion callbacks to a local HTTP stand-in.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import unittest
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.request_records import open_records
+from VestaRestPackage.callbacks import (CallbackDispatcher, is_allowed_url,
+                                        sign_payload)
+from .stand_in import StandInServer
+
+SETTINGS = {'ENABLED': True,
+            'IN_GATEWAY': False,
+            'POLL_INTERVAL': 5,
+            'CONCURRENCY': 1,
+            'QUEUE_SIZE': 10,
+            'TIMEOUT': 5,
+            'MAX_RETRIES': 2,
+            'RETRY_BACKOFF': 0,
+            'LEASE': 300}
+
+KEY = 'aed9yhfapgaegaeg'
+
+UUID = 'f1b40709-ca76-4554-b19f-277b2f8d5d49'
+OTHER_UUID = '0b5e1a39-9b83-4a0c-9d4b-0e8c2f6f2e11'
+
+
+class TestCallbacks(unittest.TestCase):
+    """
+    Deliveries of the dispatcher with both request record layouts.
+    """
+    layout = 'legacy'
+
+    def setUp(self):
+        self.records = open_records(mongomock.MongoClient().db.Requests,
+                                    self.layout)
+        self.states = {}
+        self.reads = []
+
+    def make_dispatcher(self):
+        return CallbackDispatcher(lambda: self.records,
+                                  self.get_states,
+                                  SETTINGS,
+                                  KEY)
+
+    def get_states(self, records):
+        self.reads.append([data['uuid'] for data in records])
+        return dict((data['uuid'], self.states[data['uuid']])
+                    for data in records)
+
+    def submit(self, uuid, url, status='SUCCESS'):
+        self.records.insert(uuid,
+                            service='my_service',
+                            datetime=datetime.datetime.utcnow(),
+                            activity=False,
+                            callback_url=url,
+                            callback_pending=True)
+        self.states[uuid] = {'uuid': uuid, 'status': status, 'result': None}
+
+    def test_allowed_url(self):
+        self.assertTrue(is_allowed_url('http://example.com/done'))
+        self.assertTrue(is_allowed_url('HTTPS://example.com/done'))
+        self.assertFalse(is_allowed_url('file:///etc/passwd'))
+        self.assertFalse(is_allowed_url('ftp://example.com/done'))
+        self.assertFalse(is_allowed_url('http:///done'))
+
+    def test_signed_delivery(self):
+        with StandInServer() as server:
+            self.submit(UUID, server.url('/done'))
+            dispatcher = self.make_dispatcher()
+            dispatcher.poll()
+            dispatcher.send_next()
+
+            self.assertEqual(len(server.requests), 1)
+            received = server.requests[0]
+        self.assertEqual(received['path'], '/done')
+        self.assertEqual(json.loads(received['body'].decode('utf-8')),
+                         self.states[UUID])
+        signature = dict((name.lower(), value) for name, value in
+                         received['headers'].items())['x-vesta-signature']
+        self.assertEqual(signature, 'sha256={0}'.format(
+            sign_payload(received['body'], KEY)))
+
+        data = self.records.find(UUID)
+        self.assertEqual(data['callback_status'], 'delivered')
+        self.assertNotIn('callback_pending', data)
+
+    def test_retried_delivery(self):
+        with StandInServer() as server:
+            server.queue_response(500)
+            server.queue_response(503)
+            self.submit(UUID, server.url())
+            dispatcher = self.make_dispatcher()
+            dispatcher.poll()
+            dispatcher.send_next()
+            self.assertEqual(len(server.requests), 3)
+        self.assertEqual(self.records.find(UUID)['callback_status'],
+                         'delivered')
+
+    def test_failed_delivery(self):
+        with StandInServer(status=500) as server:
+            self.submit(UUID, server.url())
+            dispatcher = self.make_dispatcher()
+            dispatcher.poll()
+            dispatcher.send_next()
+            self.assertEqual(len(server.requests),
+                             SETTINGS['MAX_RETRIES'] + 1)
+        data = self.records.find(UUID)
+        self.assertEqual(data['callback_status'], 'failed')
+        self.assertNotIn('callback_pending', data)
+
+    def test_scheme_not_allowed(self):
+        self.submit(UUID, 'file:///etc/passwd')
+        self.assertFalse(self.make_dispatcher().deliver(
+            UUID, 'file:///etc/passwd', self.states[UUID]))
+        self.assertEqual(self.records.find(UUID)['callback_status'], 'failed')
+
+    def test_pending_until_delivered(self):
+        with StandInServer() as server:
+            self.submit(UUID, server.url())
+            self.submit(OTHER_UUID, server.url(), status='PROGRESS')
+            dispatcher = self.make_dispatcher()
+            dispatcher.poll()
+
+            # Queued callbacks stay pending and are left alone by the other
+            # dispatchers.
+            self.assertTrue(self.records.find(UUID)['callback_pending'])
+            other_dispatcher = self.make_dispatcher()
+            other_dispatcher.poll()
+            self.assertTrue(other_dispatcher._deliveries.empty())
+
+            dispatcher.send_next()
+            self.assertTrue(dispatcher._deliveries.empty())
+            self.assertEqual(len(server.requests), 1)
+        self.assertNotIn('callback_pending', self.records.find(UUID))
+        self.assertTrue(self.records.find(OTHER_UUID)['callback_pending'])
+
+    def test_expired_lease(self):
+        with StandInServer() as server:
+            self.submit(UUID, server.url())
+            # The callback was leased by a dispatcher which crashed
+            self.records.update(UUID, callback_lease=datetime.datetime(2000, 1,
+                                                                       1))
+            dispatcher = self.make_dispatcher()
+            dispatcher.poll()
+            dispatcher.send_next()
+            self.assertEqual(len(server.requests), 1)
+        self.assertEqual(self.records.find(UUID)['callback_status'],
+                         'delivered')
+
+    def test_batched_states(self):
+        with StandInServer() as server:
+            self.submit(UUID, server.url())
+            self.submit(OTHER_UUID, server.url(), status='PROGRESS')
+            self.make_dispatcher().poll()
+        self.assertEqual([sorted(uuids) for uuids in self.reads],
+                         [sorted([UUID, OTHER_UUID])])
+
+
+class TestCompactCallbacks(TestCallbacks):
+    """
+    Deliveries of the dispatcher with the compact request record layout.
+    """
+    layout = 'compact'
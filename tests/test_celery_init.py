@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the compression and sizes of the task messages published through an
+in-memory broker.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+from kombu.compression import compress
+from celery import Celery
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.celery_init import SizedAMQP
+from VestaRestPackage.metrics import METRICS
+
+QUEUE = 'my_service'
+
+MISC = {'text': 'x' * 4000}
+
+
+class TestSizedTaskProducer(unittest.TestCase):
+    """
+    Messages published with the sized task producer.
+    """
+    def setUp(self):
+        METRICS.reset()
+        self.app = Celery('test', amqp=SizedAMQP, broker='memory://')
+        self.app.conf.CELERY_TASK_SERIALIZER = 'json'
+
+    def tearDown(self):
+        self.app.close()
+
+    def publish(self, **options):
+        self.app.send_task('test.my_service', args=(MISC,), queue=QUEUE,
+                           **options)
+        with self.app.connection() as connection:
+            return connection.SimpleQueue(QUEUE).get(timeout=1)
+
+    def test_compressed(self):
+        message = self.publish(compression='zlib',
+                               compression_min_size=1024,
+                               metric_name='my_service')
+        self.assertEqual(message.headers['compression'],
+                         'application/x-gzip')
+        self.assertEqual(message.payload['args'], [MISC])
+
+        metrics = METRICS.snapshot()
+        size = metrics['messages.bytes.my_service']['sum']
+        wire_size = metrics['messages.wire_bytes.my_service']['sum']
+        # Received bodies are decompressed by kombu
+        self.assertEqual(size, len(message.body))
+        self.assertEqual(wire_size, len(compress(message.body, 'zlib')[0]))
+        self.assertLess(wire_size, size)
+
+    def test_below_min_size(self):
+        message = self.publish(compression='zlib',
+                               compression_min_size=1000000,
+                               metric_name='my_service')
+        self.assertNotIn('compression', message.headers)
+        self.assertEqual(message.payload['args'], [MISC])
+
+        metrics = METRICS.snapshot()
+        self.assertEqual(metrics['messages.bytes.my_service']['sum'],
+                         len(message.body))
+        self.assertEqual(metrics['messages.wire_bytes.my_service']['sum'],
+                         len(message.body))
+
+    def test_not_sized(self):
+        message = self.publish()
+        self.assertNotIn('compression', message.headers)
+        self.assertNotIn('compression_min_size', message.properties)
+        self.assertEqual(METRICS.snapshot(), {})
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the claim-check tokens and uploads.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage import claim_check
+
+KEY = 'aed9yhfapgaegaeg'
+
+CLAIM_ID = '5b9f6f3b2f6e4a1d3c8b4567'
+
+
+class TestClaimCheck(unittest.TestCase):
+    """
+    Claim tokens, uploads and references.
+    """
+    def test_token(self):
+        token = claim_check.sign(CLAIM_ID, KEY)
+        self.assertNotIn(KEY, token)
+        self.assertTrue(claim_check.is_valid_token(CLAIM_ID, token, KEY))
+        self.assertTrue(claim_check.is_valid_token(CLAIM_ID, u'' + token, KEY))
+
+    def test_invalid_token(self):
+        token = claim_check.sign(CLAIM_ID, KEY)
+        other_id = '5b9f6f3b2f6e4a1d3c8b4568'
+        self.assertFalse(claim_check.is_valid_token(other_id, token, KEY))
+        self.assertFalse(claim_check.is_valid_token(CLAIM_ID, None, KEY))
+        self.assertFalse(claim_check.is_valid_token(CLAIM_ID, KEY, KEY))
+        self.assertFalse(claim_check.is_valid_token(CLAIM_ID, token, None))
+        self.assertFalse(claim_check.is_valid_token(CLAIM_ID, u'\xe9', KEY))
+
+    def test_upload_not_json(self):
+        for body in (b'', b'{"result": ', b'\xff\xfe'):
+            self.assertRaises(ValueError, claim_check.upload, None, body)
+
+    def test_resolve_not_reference(self):
+        for value in (None, [1, 2], {'claim_check': {}, 'other': 1}):
+            self.assertEqual(claim_check.resolve(None, value), value)
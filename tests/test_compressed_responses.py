@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the middleware compressing the responses.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+import zlib
+
+# -- 3rd party ---------------------------------------------------------------
+from werkzeug.test import create_environ
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.compressed_responses import (CompressedResponses,
+                                                   negotiate, WBITS)
+
+SETTINGS = {'ENABLED': True,
+            'MIN_SIZE': 100,
+            'LEVEL': 6,
+            'SKIP_TYPES': ['image/', 'application/zip']}
+
+BODY = b'{"index": 1}\n' * 20
+
+
+def decompress(body, encoding):
+    """
+    Decompress a body encoded with gzip or deflate.
+    """
+    return zlib.decompress(body, WBITS[encoding])
+
+
+class TestNegotiation(unittest.TestCase):
+    """
+    Encodings chosen from the Accept-Encoding header.
+    """
+    def test_none(self):
+        self.assertIsNone(negotiate(''))
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate('br'))
+
+    def test_preference(self):
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('deflate'), 'deflate')
+        self.assertEqual(negotiate('gzip;q=0.5, deflate;q=0.8'), 'deflate')
+        self.assertEqual(negotiate('GZIP ; q=0.9'), 'gzip')
+
+    def test_refused(self):
+        self.assertEqual(negotiate('gzip;q=0, deflate'), 'deflate')
+        self.assertIsNone(negotiate('gzip;q=0, deflate;q=0'))
+        self.assertIsNone(negotiate('gzip;q=invalid'))
+
+    def test_wildcard(self):
+        self.assertEqual(negotiate('*'), 'gzip')
+        self.assertEqual(negotiate('*;q=0.5, gzip;q=0'), 'deflate')
+        self.assertIsNone(negotiate('*;q=0'))
+
+    def test_identity_refused(self):
+        # Refusing the identity doesn't make an encoding acceptable
+        self.assertIsNone(negotiate('identity;q=0'))
+        self.assertEqual(negotiate('identity;q=0, gzip'), 'gzip')
+        self.assertEqual(negotiate('identity;q=0, *'), 'gzip')
+
+
+class TestCompressedResponses(unittest.TestCase):
+    """
+    Responses of an application through the middleware.
+    """
+    def setUp(self):
+        self.status = '200 OK'
+        self.headers = [('Content-Type', 'application/json')]
+        self.chunks = [BODY]
+        self.started = None
+
+    def app(self, environ, start_response):
+        start_response(self.status, list(self.headers))
+        return iter(self.chunks)
+
+    def start_response(self, status, headers, exc_info=None):
+        self.started = (status, dict(headers))
+
+    def call(self, accept_encoding='gzip', method='GET'):
+        """
+        Get the headers and the body of a response of the application.
+        """
+        environ = create_environ('/', method=method, headers={
+            'Accept-Encoding': accept_encoding})
+        middleware = CompressedResponses(self.app, SETTINGS)
+        body = b''.join(middleware(environ, self.start_response))
+        return self.started[1], body
+
+    def test_compressed(self):
+        for encoding in ('gzip', 'deflate'):
+            headers, body = self.call(encoding)
+            self.assertEqual(headers['Content-Encoding'], encoding)
+            self.assertEqual(headers['Vary'], 'Accept-Encoding')
+            self.assertNotIn('Content-Length', headers)
+            self.assertEqual(decompress(body, encoding), BODY)
+
+    def test_not_accepted(self):
+        for accept_encoding in ('', 'identity;q=0', 'gzip;q=0'):
+            headers, body = self.call(accept_encoding)
+            self.assertNotIn('Content-Encoding', headers)
+            self.assertEqual(body, BODY)
+
+    def test_content_length(self):
+        self.headers.append(('Content-Length', str(len(BODY))))
+        headers, body = self.call()
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', headers)
+
+        # Declared shorter than MIN_SIZE
+        self.chunks = [b'{}']
+        self.headers[-1] = ('Content-Length', '2')
+        headers, body = self.call()
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(headers['Content-Length'], '2')
+        self.assertEqual(body, b'{}')
+
+    def test_buffered(self):
+        # Streamed chunks are buffered until they reach MIN_SIZE
+        self.chunks = [b'{"index": 1}\n'] * 5
+        headers, body = self.call()
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, b''.join(self.chunks))
+
+        self.chunks = [b'{"index": 1}\n'] * 10
+        headers, body = self.call()
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(decompress(body, 'gzip'), b''.join(self.chunks))
+
+    def test_skipped_types(self):
+        for content_type in ('image/png', 'application/zip'):
+            self.headers = [('Content-Type', content_type)]
+            headers, body = self.call()
+            self.assertNotIn('Content-Encoding', headers)
+            self.assertEqual(body, BODY)
+
+    def test_already_encoded(self):
+        self.headers.append(('Content-Encoding', 'br'))
+        headers, body = self.call()
+        self.assertEqual(headers['Content-Encoding'], 'br')
+        self.assertEqual(body, BODY)
+
+    def test_no_body(self):
+        for status in ('204 NO CONTENT', '304 NOT MODIFIED'):
+            self.status = status
+            headers, body = self.call()
+            self.assertNotIn('Content-Encoding', headers)
+
+        self.status = '200 OK'
+        headers, body = self.call(method='HEAD')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_vary(self):
+        self.headers.append(('Vary', 'Accept'))
+        headers, body = self.call()
+        self.assertEqual(headers['Vary'], 'Accept, Accept-Encoding')
+
+    def test_etag(self):
+        self.headers.append(('ETag', '"abc"'))
+        headers, body = self.call()
+        self.assertEqual(headers['ETag'], 'W/"abc"')
+
+        self.headers[-1] = ('ETag', 'W/"abc"')
+        headers, body = self.call()
+        self.assertEqual(headers['ETag'], 'W/"abc"')
+
+        # Uncompressed responses keep their strong ETag
+        self.headers[-1] = ('ETag', '"abc"')
+        headers, body = self.call('identity')
+        self.assertEqual(headers['ETag'], '"abc"')
+
+    def test_streamed_chunks(self):
+        # Each chunk of a streamed body is decompressed as soon as received
+        lines = [(b'{"index": ' + str(index).encode('ascii') + b'}\n') * 5
+                 for index in range(5)]
+        self.chunks = lines
+        environ = create_environ('/', headers={'Accept-Encoding': 'gzip'})
+        middleware = CompressedResponses(self.app, SETTINGS)
+        decompressor = zlib.decompressobj(WBITS['gzip'])
+        received = []
+        for chunk in middleware(environ, self.start_response):
+            received.append(decompressor.decompress(chunk))
+        # Including the chunks buffered until they reached MIN_SIZE
+        self.assertEqual(received[:5], lines)
+        self.assertEqual(b''.join(received[5:]), b'')
+        self.assertEqual(decompressor.flush(), b'')
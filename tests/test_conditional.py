@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the ETags and conditional GET of the status, info and stats
+responses.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from uuid import uuid4
+import unittest
+import json
+
+# -- Project specific --------------------------------------------------------
+from . import gateway
+from VestaRestPackage.utility_rest import get_state_version
+
+UUID = 'f1b40709-ca76-4554-b19f-277b2f8d5d49'
+
+JSON = {'Accept': 'application/json'}
+
+XML = {'Accept': 'application/xml'}
+
+
+def progress(current):
+    """
+    Get the result of a running task.
+    """
+    return {'current': current, 'total': 100, 'worker_id_version': '1.0.0'}
+
+
+class TestStatusVersion(unittest.TestCase):
+    """
+    Versions of the task states.
+    """
+    def test_status(self):
+        pending = {'uuid': UUID, 'status': 'PENDING', 'result': None}
+        success = {'uuid': UUID, 'status': 'SUCCESS', 'result': [1, 2]}
+        self.assertNotEqual(get_state_version(pending),
+                            get_state_version(success))
+
+    def test_progress(self):
+        self.assertNotEqual(
+            get_state_version({'uuid': UUID, 'status': 'PROGRESS',
+                               'result': progress(10)}),
+            get_state_version({'uuid': UUID, 'status': 'PROGRESS',
+                               'result': progress(20)}))
+
+    def test_fields(self):
+        state = {'uuid': UUID, 'status': 'SUCCESS', 'result': [1, 2]}
+        self.assertNotEqual(get_state_version(state),
+                            get_state_version(state, 'status'))
+
+
+class TestConditionalStatus(unittest.TestCase):
+    """
+    Status requests polling a task.
+    """
+    def setUp(self):
+        self.client = gateway.get_client()
+        self.uuid = str(uuid4())
+        gateway.submit(self.uuid, 'PROGRESS', progress(10))
+
+    def get(self, headers=JSON, route='/my_service/status', **args):
+        args.setdefault('uuid', self.uuid)
+        return self.client.get(route, query_string=args, headers=headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data.decode('utf-8'))['status'],
+                         'PROGRESS')
+        etag = response.headers['ETag']
+
+        response = self.get(dict(JSON, **{'If-None-Match': etag}))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_status_changed(self):
+        etag = self.get().headers['ETag']
+        gateway.STATUS_STORE.set(self.uuid, 'PROGRESS', progress(20))
+        progressed = self.get(dict(JSON, **{'If-None-Match': etag}))
+        self.assertEqual(progressed.status_code, 200)
+        self.assertNotEqual(progressed.headers['ETag'], etag)
+
+        gateway.STATUS_STORE.set(self.uuid, 'SUCCESS', [1, 2])
+        finished = self.get(dict(JSON, **{
+            'If-None-Match': progressed.headers['ETag']}))
+        self.assertEqual(finished.status_code, 200)
+        self.assertEqual(json.loads(finished.data.decode('utf-8'))['result'],
+                         [1, 2])
+
+    def test_format(self):
+        json_response = self.get()
+        xml_response = self.get(XML)
+        self.assertEqual(xml_response.mimetype, 'application/xml')
+        self.assertNotEqual(json_response.headers['ETag'],
+                            xml_response.headers['ETag'])
+        # The ETag of a format doesn't match the other one
+        response = self.get(dict(XML, **{
+            'If-None-Match': json_response.headers['ETag']}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/xml')
+
+    def test_fields(self):
+        etag = self.get().headers['ETag']
+        response = self.get(dict(JSON, **{'If-None-Match': etag}),
+                            fields='status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data.decode('utf-8')),
+                         {'status': 'PROGRESS'})
+
+    def test_cancel_not_conditional(self):
+        response = self.get(route='/my_service/cancel')
+        self.assertNotIn('ETag', response.headers)
+
+
+class TestConditionalInfo(unittest.TestCase):
+    """
+    Info and stats requests.
+    """
+    def setUp(self):
+        self.client = gateway.get_client()
+
+    def test_info(self):
+        response = self.client.get('/my_service/info', headers=JSON)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/my_service/info', headers=dict(
+            JSON, **{'If-None-Match': response.headers['ETag']}))
+        self.assertEqual(response.status_code, 304)
+
+    def test_stats_format(self):
+        json_response = self.client.get('/my_service/stats', headers=JSON)
+        html_response = self.client.get('/my_service/stats')
+        self.assertEqual(html_response.mimetype, 'text/html')
+        self.assertNotEqual(json_response.headers['ETag'],
+                            html_response.headers['ETag'])
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the weighted fair scheduling of held submissions.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.fair_scheduler import (FairScheduler, hold,
+                                             get_client_backlog)
+from VestaRestPackage.vesta_exceptions import SettingsException
+from VestaRestPackage.background import Lease
+
+SETTINGS = {'IN_GATEWAY': False,
+            'INTERVAL': 1,
+            'DEFAULT_WEIGHT': 1,
+            'CLIENT_WEIGHTS': {'heavy': 2, 'blocked': 0}}
+
+
+class TestFairScheduler(unittest.TestCase):
+    """
+    Releases of the submissions held in the backlog.
+    """
+    def setUp(self):
+        self.database = mongomock.MongoClient().db
+        self.published = []
+        self.depths = {'my_service': 0}
+        self.start = datetime.datetime.utcnow()
+        self.count = 0
+
+    def make_scheduler(self, settings=SETTINGS, publish=None):
+        return FairScheduler(lambda: self.database.Backlog,
+                             lambda: {'my_service': 10},
+                             self.depths.get,
+                             publish or self.publish,
+                             settings)
+
+    def publish(self, service_name, params):
+        self.published.append(params['client'])
+
+    def hold(self, client_id, number=1, expires=None):
+        for _ in range(number):
+            self.count += 1
+            task_id = '{0}-{1}'.format(client_id, self.count)
+            hold(self.database.Backlog, task_id, 'my_service', client_id,
+                 {'task_id': task_id, 'client': client_id}, expires)
+            # Submissions are released oldest first
+            self.database.Backlog.update_one(
+                {'_id': task_id},
+                {'$set': {'datetime': self.start + datetime.timedelta(
+                    seconds=self.count)}})
+
+    def test_weights(self):
+        self.hold('heavy', 6)
+        self.hold('light', 6)
+        self.assertEqual(self.make_scheduler().release('my_service', 6), 6)
+        self.assertEqual(self.published, ['heavy', 'heavy', 'light',
+                                          'heavy', 'heavy', 'light'])
+        self.assertEqual(get_client_backlog(self.database.Backlog,
+                                            'my_service'),
+                         {'heavy': 2, 'light': 4})
+
+    def test_oldest_first(self):
+        self.hold('light', 3)
+        self.hold('other')
+        released = []
+        scheduler = self.make_scheduler(
+            publish=lambda service_name, params:
+            released.append(params['task_id']))
+        scheduler.release('my_service', 2)
+        scheduler.release('my_service', 1)
+        self.assertEqual(released, ['light-1', 'other-4', 'light-2'])
+
+    def test_room(self):
+        self.hold('heavy', 3)
+        self.hold('light', 3)
+        # The queue holds 8 of its 10 messages
+        self.depths['my_service'] = 8
+        scheduler = self.make_scheduler()
+        scheduler.release_all()
+        self.assertEqual(self.published, ['heavy', 'heavy'])
+
+        # Full queue
+        self.depths['my_service'] = 10
+        scheduler.release_all()
+        self.assertEqual(len(self.published), 2)
+
+    def test_no_starvation(self):
+        self.hold('heavy', 100)
+        self.hold('light')
+        self.make_scheduler().release('my_service', 3)
+        self.assertEqual(self.published, ['heavy', 'heavy', 'light'])
+
+    def test_blocked_client(self):
+        self.hold('blocked', 2)
+        self.hold('light')
+        self.assertEqual(self.make_scheduler().release('my_service', 10), 1)
+        self.assertEqual(self.published, ['light'])
+        self.assertEqual(get_client_backlog(self.database.Backlog,
+                                            'my_service'),
+                         {'blocked': 2})
+
+    def test_expired(self):
+        self.hold('light', expires=self.start - datetime.timedelta(seconds=1))
+        self.hold('light')
+        self.assertEqual(self.make_scheduler().release('my_service', 10), 1)
+        self.assertEqual(self.database.Backlog.count_documents({}), 0)
+
+    def test_publish_failure(self):
+        def publish(service_name, params):
+            raise IOError('Broker unreachable')
+        self.hold('heavy', 2)
+        self.hold('light')
+        self.assertEqual(
+            self.make_scheduler(publish=publish).release('my_service', 10), 0)
+        # The submission is held again and the round stopped
+        self.assertEqual(get_client_backlog(self.database.Backlog,
+                                            'my_service'),
+                         {'heavy': 2, 'light': 1})
+
+    def test_released_once(self):
+        self.hold('light')
+        submission = self.database.Backlog.find_one()
+        scheduler = self.make_scheduler()
+        other_scheduler = self.make_scheduler()
+        self.assertTrue(scheduler.release_one(self.database.Backlog,
+                                              submission))
+        self.assertFalse(other_scheduler.release_one(self.database.Backlog,
+                                                     submission))
+        self.assertEqual(self.published, ['light'])
+
+    def test_lease_handover(self):
+        lease = Lease(lambda: self.database.Leases, 'fair_scheduler', 10)
+        other_lease = Lease(lambda: self.database.Leases, 'fair_scheduler',
+                            10)
+        self.assertTrue(lease.acquire())
+        self.assertFalse(other_lease.acquire())
+        # Renewed by its holder
+        self.assertTrue(lease.acquire())
+
+        # The holder stopped and its lease expired
+        self.database.Leases.update_one(
+            {'_id': 'fair_scheduler'},
+            {'$set': {'expires': datetime.datetime.utcnow() -
+                      datetime.timedelta(seconds=1)}})
+        self.assertTrue(other_lease.acquire())
+        self.assertFalse(lease.acquire())
+
+    def test_invalid_weight(self):
+        for weight in (-1, float('inf'), 'high', True):
+            settings = dict(SETTINGS, CLIENT_WEIGHTS={'heavy': weight})
+            self.assertRaises(SettingsException, self.make_scheduler,
+                              settings)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the gateway processes forked under concurrent load, which must
+re-create their connections and start their own background workers.
+
+The forked processes of the whole gateway serve concurrent status requests
+through its test client, the gateway of :py:mod:`tests.gateway` being backed
+by mongomock and the in-memory status store.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from uuid import uuid4
+import threading
+import unittest
+import json
+import os
+
+# -- Project specific --------------------------------------------------------
+from . import gateway
+from VestaRestPackage import background
+from VestaRestPackage import forking
+
+# Number of forked processes of each test
+PROCESSES = 4
+
+# Number of threads loading each process
+THREADS = 8
+
+# Seconds during which each forked process is loaded
+LOAD_DURATION = 0.5
+
+
+def start_forked(function):
+    """
+    Start a function in a forked process.
+
+    :param function: Callable taking no argument and returning a JSON
+                     serializable value.
+    :returns: Process id and pipe to read with :py:func:`wait_forked`.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            output = {'result': function()}
+        except BaseException as exc:
+            output = {'error': repr(exc)}
+        os.write(write_fd, json.dumps(output).encode('utf-8'))
+        os.close(write_fd)
+        # Leave without running the cleanups of the test runner
+        os._exit(0)
+
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def run_forked(function, processes=PROCESSES):
+    """
+    Run a function in concurrent forked processes.
+
+    :param function: Callable taking no argument and returning a JSON
+                     serializable value.
+    :returns: List of the values returned by the function in each forked
+              process.
+    """
+    children = [start_forked(function) for _ in range(processes)]
+    return [wait_forked(pid, read_fd) for pid, read_fd in children]
+
+
+def wait_forked(pid, read_fd):
+    """
+    Wait for a forked process started by :py:func:`start_forked`.
+
+    :returns: Value returned by the function in the forked process.
+    """
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    output = json.loads(b''.join(chunks).decode('utf-8'))
+    if 'error' in output:
+        raise AssertionError('Forked process failed : {0}'.format(
+            output['error']))
+    return output['result']
+
+
+class Load(object):
+    """
+    Threads calling a function in a loop until they are stopped, recording
+    the distinct values it returned.
+    """
+    def __init__(self, function, threads=THREADS):
+        self.function = function
+        self.calls = 0
+        self.values = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = [threading.Thread(target=self.run)
+                         for _ in range(threads)]
+
+    def run(self):
+        while not self._stopped.is_set():
+            value = self.function()
+            with self._lock:
+                self.calls += 1
+                self.values.add(value)
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def load(function, duration=LOAD_DURATION):
+    """
+    Call a function from concurrent threads during a while.
+
+    :returns: The stopped :py:class:`Load`.
+    """
+    with Load(function) as running:
+        threading.Event().wait(duration)
+    return running
+
+
+class TestForking(unittest.TestCase):
+    """
+    Hooks and background workers of forked processes.
+    """
+    def setUp(self):
+        # Only the hook and the worker of the test run in forked processes
+        self.hooks = list(forking._HOOKS)
+        del forking._HOOKS[:]
+        background.stop_workers()
+
+        self.resource = {'connection': object()}
+        self.ticks = []
+        forking.register_after_fork(self.reconnect)
+        forking.prepare_fork()
+        background.start_worker('test_forking', 0.01,
+                                lambda: self.ticks.append(os.getpid()))
+
+    def tearDown(self):
+        forking._HOOKS[:] = self.hooks
+        background.stop_workers()
+        background.start_deferred_workers()
+
+    def reconnect(self):
+        self.resource['connection'] = object()
+
+    def run_child(self):
+        inherited = self.resource['connection']
+        forking.after_fork()
+        connections = load(lambda: id(self.resource['connection']))
+        for _ in range(500):
+            if os.getpid() in self.ticks:
+                break
+            threading.Event().wait(0.01)
+        return {'reconnected': self.resource['connection'] is not inherited,
+                'loaded': connections.calls > 0,
+                'shared': len(connections.values) == 1,
+                'ticked': os.getpid() in self.ticks}
+
+    def test_after_fork(self):
+        # The parent process keeps running threads while it is forked
+        with Load(lambda: self.resource['connection']):
+            results = run_forked(self.run_child)
+        for result in results:
+            self.assertEqual(result, {'reconnected': True,
+                                      'loaded': True,
+                                      'shared': True,
+                                      'ticked': True})
+        # Deferred workers only run in the forked processes
+        self.assertEqual(self.ticks, [])
+
+
+class TestForkedGateway(unittest.TestCase):
+    """
+    Connections of the gateway processes forked after its import, each
+    serving concurrent status requests.
+    """
+    @classmethod
+    def setUpClass(cls):
+        forking.prepare_fork()
+        cls.uuid = str(uuid4())
+        gateway.submit(cls.uuid, 'SUCCESS', [1, 2])
+
+    @classmethod
+    def tearDownClass(cls):
+        background.stop_workers()
+        background.start_deferred_workers()
+
+    def get_status(self):
+        response = gateway.get_client().get(
+            '/my_service/status', query_string={'uuid': self.uuid},
+            headers={'Accept': 'application/json'})
+        return (id(gateway.utility_rest.mongo.cx),
+                response.status_code,
+                json.loads(response.data.decode('utf-8'))['status'])
+
+    def run_child(self):
+        mongo = gateway.utility_rest.mongo
+        celery_app = gateway.utility_rest.CELERY_APP
+        inherited = {'mongo': mongo.cx,
+                     'pool': celery_app.pool,
+                     'backend': celery_app.backend}
+        forking.after_fork()
+
+        requests = load(self.get_status)
+        return {'mongo': mongo.cx is not inherited['mongo'],
+                'pool': celery_app.pool is not inherited['pool'],
+                'backend': celery_app.backend is not inherited['backend'],
+                'loaded': requests.calls > 0,
+                'responses': sorted(set(
+                    (status_code, status) for
+                    _, status_code, status in requests.values)),
+                'shared': len(set(
+                    client for client, _, _ in requests.values)) == 1}
+
+    def test_after_fork(self):
+        self.assertEqual(self.get_status()[1:], (200, 'SUCCESS'))
+        results = run_forked(self.run_child)
+        for result in results:
+            self.assertEqual(result, {'mongo': True,
+                                      'pool': True,
+                                      'backend': True,
+                                      'loaded': True,
+                                      'responses': [[200, 'SUCCESS']],
+                                      'shared': True})
+        # The parent process keeps its own connections
+        self.assertEqual(self.get_status()[1:], (200, 'SUCCESS'))
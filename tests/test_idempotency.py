@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the claims of the idempotency keys of submissions.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.idempotency import (claim_key, confirm_key, release_key,
+                                          get_idempotency_key)
+from VestaRestPackage.vesta_exceptions import PendingSubmissionError
+
+KEY = u'my_service:key:1234'
+
+UUID = 'f1b40709-ca76-4554-b19f-277b2f8d5d49'
+OTHER_UUID = '0b5e1a39-9b83-4a0c-9d4b-0e8c2f6f2e11'
+
+PENDING_TIMEOUT = 60
+
+
+class TestClaims(unittest.TestCase):
+    """
+    Claims, confirmations and releases of a key.
+    """
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.Submissions
+
+    def claim(self, task_uuid):
+        return claim_key(self.collection, KEY, task_uuid, PENDING_TIMEOUT)
+
+    def test_first_claim(self):
+        self.assertIsNone(self.claim(UUID))
+        self.assertTrue(self.collection.find_one({'_id': KEY})['pending'])
+
+    def test_confirmed(self):
+        self.claim(UUID)
+        confirm_key(self.collection, KEY, UUID)
+        self.assertEqual(self.claim(OTHER_UUID), UUID)
+
+    def test_concurrent_duplicate(self):
+        # The first submission claimed the key and is publishing its task
+        self.assertIsNone(self.claim(UUID))
+        # A duplicate arriving before the request record is stored doesn't
+        # get a UUID which can't be looked up yet.
+        self.assertRaises(PendingSubmissionError, self.claim, OTHER_UUID)
+        self.assertEqual(self.collection.find_one({'_id': KEY})['uuid'], UUID)
+
+        # Once the first submission stored its request record
+        confirm_key(self.collection, KEY, UUID)
+        self.assertEqual(self.claim(OTHER_UUID), UUID)
+
+    def test_pending_timeout(self):
+        self.claim(UUID)
+        # The process submitting the first task crashed
+        self.collection.update_one(
+            {'_id': KEY},
+            {'$set': {'datetime': datetime.datetime.utcnow() -
+                      datetime.timedelta(seconds=PENDING_TIMEOUT + 1)}})
+        self.assertIsNone(self.claim(OTHER_UUID))
+        data = self.collection.find_one({'_id': KEY})
+        self.assertEqual(data['uuid'], OTHER_UUID)
+        self.assertTrue(data['pending'])
+
+        # The crashed claim can't confirm nor release the key anymore
+        confirm_key(self.collection, KEY, UUID)
+        release_key(self.collection, KEY, UUID)
+        self.assertTrue(self.collection.find_one({'_id': KEY})['pending'])
+
+    def test_released_on_failure(self):
+        self.claim(UUID)
+        # The task could not be published
+        release_key(self.collection, KEY, UUID)
+        self.assertIsNone(self.collection.find_one({'_id': KEY}))
+        self.assertIsNone(self.claim(OTHER_UUID))
+
+
+class TestKeys(unittest.TestCase):
+    """
+    Keys of the submissions.
+    """
+    settings = {'ENABLED': True,
+                'HEADER': 'Idempotency-Key',
+                'FINGERPRINT': True,
+                'PENDING_TIMEOUT': PENDING_TIMEOUT}
+
+    def get_key(self, headers, client_id='client',
+                doc_url='http://example.com/doc.wav', params=None):
+        return get_idempotency_key(self.settings, headers, 'my_service',
+                                   client_id, doc_url, params or {})
+
+    def test_header(self):
+        key = self.get_key({'Idempotency-Key': 'abc'})
+        self.assertTrue(key.startswith('my_service:key:'))
+        self.assertEqual(key, self.get_key({'Idempotency-Key': 'abc'},
+                                           doc_url='http://example.com/b'))
+        # Scoped by client
+        self.assertNotEqual(key, self.get_key({'Idempotency-Key': 'abc'},
+                                              client_id='other'))
+
+    def test_fingerprint(self):
+        key = self.get_key({})
+        self.assertTrue(key.startswith('my_service:fp:'))
+        self.assertEqual(key, self.get_key({}))
+        self.assertNotEqual(key, self.get_key({}, params={'lang': 'fr'}))
+
+    def test_disabled(self):
+        self.settings = dict(self.settings, ENABLED=False)
+        self.assertIsNone(self.get_key({'Idempotency-Key': 'abc'}))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the document preflight and size classes against a local HTTP
+stand-in of the document server.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.preflight import Preflight, match_size_class
+from .stand_in import StandInServer
+
+SETTINGS = {'TIMEOUT': 5,
+            'MAX_AGE': 300,
+            'MAX_ENTRIES': 2}
+
+SIZE_CLASSES = [{'max_size': 1000,
+                 'content_types': ['audio/'],
+                 'celery_queue_name': 'my_service_fast'},
+                {'max_size': 100000,
+                 'celery_queue_name': 'my_service_medium'}]
+
+DOCUMENT = {'Content-Length': '512',
+            'Content-Type': 'audio/wav',
+            'ETag': '"v1"'}
+
+
+def get_header(received, name):
+    """
+    Get a header of a received request, whatever the case of its name.
+    """
+    return dict((key.lower(), value) for key, value in
+                received['headers'].items()).get(name.lower())
+
+
+class TestPreflight(unittest.TestCase):
+    """
+    HEAD requests and their cache.
+    """
+    def test_head(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            doc_info = Preflight(SETTINGS).head(server.url('/doc.wav'))
+            self.assertEqual(server.requests[0]['method'], 'HEAD')
+        self.assertEqual(doc_info, {'content_length': 512,
+                                    'content_type': 'audio/wav',
+                                    'etag': '"v1"',
+                                    'last_modified': None})
+
+    def test_cached(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            preflight = Preflight(SETTINGS)
+            first = preflight.head(server.url('/doc.wav'))
+            second = preflight.head(server.url('/doc.wav'))
+            self.assertEqual(len(server.requests), 1)
+        self.assertEqual(first, second)
+
+    def test_revalidated(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            preflight = Preflight(SETTINGS)
+            first = preflight.head(server.url('/doc.wav'))
+            server.queue_response(304)
+            second = preflight.head(server.url('/doc.wav'), max_age=0)
+            self.assertEqual(len(server.requests), 2)
+            self.assertEqual(get_header(server.requests[1], 'If-None-Match'),
+                             '"v1"')
+        self.assertEqual(first, second)
+
+    def test_modified(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            preflight = Preflight(SETTINGS)
+            preflight.head(server.url('/doc.wav'))
+            server.queue_response(200, {'Content-Length': '4096',
+                                        'Content-Type': 'audio/wav',
+                                        'ETag': '"v2"'})
+            doc_info = preflight.head(server.url('/doc.wav'), max_age=0)
+            self.assertEqual(preflight.head(server.url('/doc.wav')), doc_info)
+            self.assertEqual(len(server.requests), 2)
+        self.assertEqual(doc_info['content_length'], 4096)
+        self.assertEqual(doc_info['etag'], '"v2"')
+
+    def test_failed(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            preflight = Preflight(SETTINGS)
+            preflight.head(server.url('/doc.wav'))
+            server.queue_response(404)
+            self.assertIsNone(preflight.head(server.url('/doc.wav'),
+                                             max_age=0))
+            # The failed document is requested again
+            preflight.head(server.url('/doc.wav'))
+            self.assertEqual(len(server.requests), 3)
+
+    def test_unreachable(self):
+        with StandInServer() as server:
+            url = server.url('/doc.wav')
+        self.assertIsNone(Preflight(SETTINGS).head(url))
+
+    def test_evicted(self):
+        with StandInServer(headers=DOCUMENT) as server:
+            preflight = Preflight(SETTINGS)
+            for name in ('a', 'b', 'c', 'a'):
+                preflight.head(server.url('/' + name))
+            self.assertEqual(len(server.requests), 4)
+
+
+class TestSizeClasses(unittest.TestCase):
+    """
+    Routing of documents to the size classes of a service.
+    """
+    def match(self, headers):
+        with StandInServer(headers=headers) as server:
+            doc_info = Preflight(SETTINGS).head(server.url('/doc'))
+        size_class = match_size_class(SIZE_CLASSES, doc_info)
+        return size_class and size_class['celery_queue_name']
+
+    def test_fast_lane(self):
+        self.assertEqual(self.match(DOCUMENT), 'my_service_fast')
+
+    def test_content_type(self):
+        self.assertEqual(self.match({'Content-Length': '512',
+                                     'Content-Type': 'video/mp4'}),
+                         'my_service_medium')
+
+    def test_large(self):
+        self.assertIsNone(self.match({'Content-Length': '1000000',
+                                      'Content-Type': 'audio/wav'}))
+
+    def test_unknown_size(self):
+        self.assertIsNone(match_size_class(SIZE_CLASSES, None))
+        self.assertIsNone(match_size_class(
+            SIZE_CLASSES, {'content_length': None,
+                           'content_type': 'audio/wav'}))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the reload of the service registry from a configuration file and
+from a MongoDB collection.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import tempfile
+import unittest
+import shutil
+import os
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.registry_reload import (FileSource, MongoSource,
+                                              RegistryReloader)
+from VestaRestPackage.vesta_exceptions import SettingsException
+
+SETTINGS = {'INTERVAL': 5}
+
+
+class Registry(object):
+    """
+    Stand-in of a service registry.
+    """
+    def __init__(self, worker_services):
+        self.worker_services = worker_services
+        self.generation = 1
+
+    def routes(self):
+        return list(self.worker_services)
+
+
+class TestRegistryReload(unittest.TestCase):
+    """
+    Reloads of the services keeping the current ones on invalid
+    configurations.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'services.py')
+        self.versions = 0
+        self.loaded = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load_registry(self, worker_services):
+        if 'invalid' in worker_services:
+            raise SettingsException('Invalid service')
+        self.loaded.append(worker_services)
+        return Registry(worker_services)
+
+    def make_reloader(self, source):
+        return RegistryReloader(source, self.load_registry, lambda _: None,
+                                SETTINGS)
+
+    def write(self, text):
+        with open(self.path, 'w') as config_file:
+            config_file.write(text)
+        # Each version of the file gets a distinct modification time
+        self.versions += 1
+        os.utime(self.path, (self.versions, self.versions))
+
+    def test_file(self):
+        reloader = self.make_reloader(FileSource(self.path))
+        self.write("WORKER_SERVICES = {'my_service': {}}\n")
+        self.assertIsNotNone(reloader.check())
+        self.assertIsNone(reloader.check())
+
+        for text in ("WORKER_SERVICES = {}\n",
+                     "OTHER_SETTING = 1\n",
+                     "WORKER_SERVICES = None\n",
+                     "WORKER_SERVICES = {'invalid': {}}\n"):
+            self.write(text)
+            self.assertIsNone(reloader.check())
+        self.assertEqual(self.loaded, [{'my_service': {}}])
+
+    def test_mongo(self):
+        collection = mongomock.MongoClient().db.Services
+        reloader = self.make_reloader(MongoSource(lambda: collection))
+        collection.insert_one({'_id': 'my_service', 'version': '1'})
+        self.assertIsNotNone(reloader.check())
+
+        collection.delete_many({})
+        self.assertIsNone(reloader.check())
+        self.assertEqual(self.loaded, [{'my_service': {'version': '1'}}])
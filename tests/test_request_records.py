@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the conversion of request records to the compact layout.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import BulkWriteError
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.request_records import (RequestRecords,
+                                              CompactRequestRecords, migrate)
+
+UUIDS = ['f1b40709-ca76-4554-b19f-277b2f8d5d49',
+         '0b5e1a39-9b83-4a0c-9d4b-0e8c2f6f2e11',
+         '5c1f3e0a-7d2b-4a8e-9f10-3b6c2d4e5f60']
+
+
+class TestMigrate(unittest.TestCase):
+    """
+    Conversions of legacy request records.
+    """
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.Requests
+        self.legacy = RequestRecords(self.collection)
+        self.compact = CompactRequestRecords(self.collection)
+        self.now = datetime.datetime(2020, 1, 1)
+        for uuid in UUIDS:
+            self.legacy.insert(uuid, service='my_service', datetime=self.now,
+                               activity=False)
+
+    def test_migrate(self):
+        self.assertEqual(migrate(self.collection, 2), len(UUIDS))
+        self.assertEqual(self.collection.count_documents({}), len(UUIDS))
+        for uuid in UUIDS:
+            self.assertIsNone(self.legacy.find(uuid))
+            data = self.compact.find(uuid)
+            self.assertEqual(data['service'], 'my_service')
+            self.assertEqual(data['datetime'], self.now)
+
+    def test_resumed(self):
+        # An interrupted migration stored this conversion without deleting
+        # the legacy record.
+        self.compact.insert(UUIDS[0], service='my_service',
+                            datetime=self.now, activity=False)
+        self.assertEqual(migrate(self.collection, 10), len(UUIDS))
+        self.assertEqual(self.collection.count_documents({}), len(UUIDS))
+        for uuid in UUIDS:
+            self.assertIsNone(self.legacy.find(uuid))
+            self.assertIsNotNone(self.compact.find(uuid))
+
+    def test_failed_insert(self):
+        def insert_many(documents, ordered=True):
+            raise BulkWriteError({'writeErrors': [
+                {'index': 0, 'code': 11000, 'errmsg': 'duplicate key'},
+                {'index': 1, 'code': 121, 'errmsg': 'validation failed'}],
+                                  'writeConcernErrors': []})
+        self.collection.insert_many = insert_many
+
+        self.assertRaises(BulkWriteError, migrate, self.collection, 10)
+        # No legacy record is deleted
+        for uuid in UUIDS:
+            self.assertIsNotNone(self.legacy.find(uuid))
+
+    def test_unconfirmed(self):
+        def insert_many(documents, ordered=True):
+            raise BulkWriteError({'writeErrors': [
+                {'index': 0, 'code': 11000, 'errmsg': 'duplicate key'}],
+                                  'writeConcernErrors': []})
+        self.collection.insert_many = insert_many
+
+        self.assertRaises(RuntimeError, migrate, self.collection, 10)
+        for uuid in UUIDS:
+            self.assertIsNotNone(self.legacy.find(uuid))
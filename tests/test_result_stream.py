@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the pages of the streamed results, against the MongoDB server given
+by the VRP_TEST_MONGO environment variable (default localhost).
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from os import environ
+import unittest
+import json
+
+# -- 3rd party ---------------------------------------------------------------
+from pymongo.errors import ConnectionFailure
+from pymongo import MongoClient
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage import result_stream
+
+UUID = 'f1b40709-ca76-4554-b19f-277b2f8d5d49'
+
+RESULT = [{'index': index} for index in range(25)]
+
+
+class TestPages(unittest.TestCase):
+    """
+    Pages of a stored result.
+    """
+    def setUp(self):
+        self.client = MongoClient(environ.get('VRP_TEST_MONGO',
+                                              'mongodb://localhost:27017/'),
+                                  serverSelectionTimeoutMS=500)
+        try:
+            self.client.admin.command('ping')
+        except ConnectionFailure:
+            self.client.close()
+            raise unittest.SkipTest('No MongoDB server')
+        self.database = self.client.vrp_test_result_stream
+        result_stream.store(self.database, UUID, RESULT, 10)
+
+    def tearDown(self):
+        self.client.drop_database(self.database)
+        self.client.close()
+
+    def read_page(self, offset, limit):
+        count, lines = result_stream.open_page(self.database, UUID, offset,
+                                               limit)
+        self.assertEqual(count, len(RESULT))
+        return [json.loads(line.decode('utf-8')) for line in lines]
+
+    def test_pages(self):
+        for offset, limit in ((0, 10), (3, 4), (9, 2), (18, 10), (24, 1)):
+            self.assertEqual(self.read_page(offset, limit),
+                             RESULT[offset:offset + limit])
+
+    def test_past_the_end(self):
+        self.assertEqual(self.read_page(len(RESULT), 10), [])
+        self.assertEqual(self.read_page(10 ** 12, 10), [])
+        self.assertEqual(self.read_page(0, 0), [])
+
+    def test_unknown(self):
+        self.assertIsNone(result_stream.open_page(self.database, 'unknown',
+                                                  0, 10))
+
+
+class TestInvalidPages(unittest.TestCase):
+    """
+    Pages with a negative offset or limit.
+    """
+    def test_negative(self):
+        self.assertRaises(ValueError, result_stream.open_page, None, UUID, -1,
+                          10)
+        self.assertRaises(ValueError, result_stream.open_page, None, UUID, 0,
+                          -10)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the date formats of the JSON encoders and of the streamed XML
+documents.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+from collections import OrderedDict
+from xml.dom import minidom
+import datetime
+import unittest
+import json
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage import serialization
+from VestaRestPackage.vesta_exceptions import SettingsException
+
+VALUE = {'time': datetime.datetime(2014, 9, 10, 12, 23, 19),
+         'day': datetime.date(2014, 9, 10)}
+
+
+class TestDateFormats(unittest.TestCase):
+    """
+    Dates encoded by every installed encoder.
+    """
+    def tearDown(self):
+        serialization.configure('json')
+
+    def encode(self, date_format=None):
+        documents = []
+        for name, _ in serialization.ENCODERS:
+            if date_format is None:
+                serialization.configure(name)
+            else:
+                serialization.configure(name, date_format)
+            documents.append(json.loads(serialization.dumps(VALUE)))
+        return documents
+
+    def test_http_by_default(self):
+        for document in self.encode():
+            self.assertEqual(document,
+                             {'time': 'Wed, 10 Sep 2014 12:23:19 GMT',
+                              'day': 'Wed, 10 Sep 2014 00:00:00 GMT'})
+
+    def test_iso(self):
+        for document in self.encode('iso'):
+            self.assertEqual(document, {'time': '2014-09-10T12:23:19',
+                                        'day': '2014-09-10'})
+
+    def test_unknown_format(self):
+        self.assertRaises(SettingsException, serialization.configure, 'json',
+                          'rfc3339')
+
+
+NESTED = OrderedDict([
+    ('name', u'Th\xe9\xe2tre \u6f22\u5b57 <&>'),
+    ('time', datetime.datetime(2014, 9, 10, 12, 23, 19)),
+    ('results', [OrderedDict([('day', datetime.date(2014, 9, 10)),
+                              ('scores', [1, 2.5, None, True])]),
+                 [u'caf\xe9', []],
+                 {}]),
+    ('options', OrderedDict([('2 pass', False), ('xml', u'\xe9')]))])
+
+XML = (u'<?xml version="1.0" encoding="UTF-8" ?>'
+       u'<root type="dict">'
+       u'<name type="str">Th\xe9\xe2tre \u6f22\u5b57 &lt;&amp;&gt;</name>'
+       u'<time type="str">Wed, 10 Sep 2014 12:23:19 GMT</time>'
+       u'<results type="list">'
+       u'<item type="dict">'
+       u'<day type="str">Wed, 10 Sep 2014 00:00:00 GMT</day>'
+       u'<scores type="list"><item type="int">1</item>'
+       u'<item type="float">2.5</item><item type="null"></item>'
+       u'<item type="bool">true</item></scores>'
+       u'</item>'
+       u'<item type="list"><item type="str">caf\xe9</item>'
+       u'<item type="list"></item></item>'
+       u'<item type="dict"></item>'
+       u'</results>'
+       u'<options type="dict">'
+       u'<key name="2_pass" type="bool">false</key>'
+       u'<key name="xml" type="str">\xe9</key>'
+       u'</options>'
+       u'</root>').encode('utf-8')
+
+
+class TestXml(unittest.TestCase):
+    """
+    XML documents encoded as a whole or by chunks.
+    """
+    def setUp(self):
+        self.chunk_size = serialization.XML_CHUNK_SIZE
+
+    def tearDown(self):
+        serialization.XML_CHUNK_SIZE = self.chunk_size
+
+    def test_document(self):
+        document = serialization.dumps_xml(NESTED)
+        self.assertEqual(document, XML)
+        minidom.parseString(document)
+
+    def test_chunks(self):
+        document = serialization.dumps_xml(NESTED)
+        # Chunks as short as possible, i.e.: one element per chunk
+        serialization.XML_CHUNK_SIZE = 1
+        chunks = list(serialization.iter_xml(NESTED))
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(b''.join(chunks), document)
+        # Characters aren't split across chunks
+        for chunk in chunks:
+            self.assertIsInstance(chunk, bytes)
+            chunk.decode('utf-8')
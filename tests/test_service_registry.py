@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the validation of the services configuration.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+import pickle
+import copy
+import json
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.service_registry import ServiceRegistry
+from VestaRestPackage.vesta_exceptions import SettingsException
+
+SERVICE = {'route_keyword': 'my_service',
+           'celery_task_name': 'my_service',
+           'celery_queue_name': 'my_service',
+           'version': '1.0.0',
+           'name': 'My service',
+           'synopsis': 'Does something',
+           'institution': 'CRIM',
+           'releaseTime': '2015-01-01T00:00:00Z',
+           'supportEmail': 'support@example.com',
+           'category': 'Data Manipulation',
+           'researchSubject': 'Multimedia',
+           'tags': 'audio,speech'}
+
+
+class TestServiceRegistry(unittest.TestCase):
+    """
+    Registries of valid and malformed services.
+    """
+    def assertInvalid(self, **changes):
+        worker_config = dict(SERVICE, **changes)
+        self.assertRaises(SettingsException, ServiceRegistry,
+                          {'my_service': worker_config})
+
+    def test_valid(self):
+        registry = ServiceRegistry({'my_service': dict(
+            SERVICE, celery_queue_name=[{'name': 'fast', 'weight': 2}, 'slow'],
+            compression='zlib')})
+        service = registry.get('my_service')
+        self.assertEqual(service.queues, (('fast', 2), ('slow', 1)))
+        self.assertEqual(service.compression, 'zlib')
+
+    def test_size_classes(self):
+        registry = ServiceRegistry({'my_service': dict(
+            SERVICE, size_classes=[
+                {'max_size': 1024, 'celery_queue_name': 'my_service_fast'},
+                {'max_size': 4096, 'celery_queue_name': [
+                    {'name': 'medium', 'weight': 2}, 'my_service']}])})
+        service = registry.get('my_service')
+        self.assertEqual([size_class['queues'] for
+                          size_class in service.size_classes],
+                         [(('my_service_fast', 1),),
+                          (('medium', 2), ('my_service', 1))])
+        self.assertEqual(service.service_queues,
+                         (('my_service', 1), ('my_service_fast', 1),
+                          ('medium', 2)))
+
+    def test_read_only(self):
+        worker_config = dict(SERVICE, home='http://example.com',
+                             size_classes=[{'max_size': 1024,
+                                            'content_types': ['audio/'],
+                                            'celery_queue_name': 'fast'}])
+        service = ServiceRegistry({'my_service': worker_config}).get(
+            'my_service')
+        for settings in (service.config, service.canarie,
+                         service.size_classes[0]):
+            self.assertRaises(TypeError, settings.__setitem__, 'key', 1)
+            self.assertRaises(TypeError, settings.update, {'key': 1})
+            self.assertRaises(TypeError, settings.pop, 'key', None)
+        self.assertRaises(TypeError, service.config['size_classes'][0].clear)
+
+        # The configuration is copied
+        worker_config['version'] = '2.0.0'
+        worker_config['size_classes'][0]['content_types'].append('video/')
+        self.assertEqual(service.config['version'], '1.0.0')
+        self.assertEqual(service.size_classes[0]['content_types'],
+                         ('audio/',))
+
+        # Copies are still serialized as the configuration
+        self.assertEqual(json.loads(json.dumps(service.config))['tags'],
+                         SERVICE['tags'])
+        self.assertEqual(pickle.loads(pickle.dumps(service.canarie)),
+                         {'home': 'http://example.com'})
+        self.assertIs(copy.deepcopy(service.config), service.config)
+
+    def test_missing_setting(self):
+        worker_config = dict(SERVICE)
+        del worker_config['celery_task_name']
+        self.assertRaises(SettingsException, ServiceRegistry,
+                          {'my_service': worker_config})
+
+    def test_malformed_queue(self):
+        self.assertInvalid(celery_queue_name=[{'weight': 2}])
+        self.assertInvalid(size_classes=[{'celery_queue_name': [{}]}])
+
+    def test_unknown_compression(self):
+        self.assertInvalid(compression='rot13')
+
+    def test_not_a_dict(self):
+        self.assertRaises(SettingsException, ServiceRegistry,
+                          {'my_service': 'my_service'})
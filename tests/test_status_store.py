@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the bounded and whole results of the status stores.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.status_store import (MemoryStatusStore,
+                                           MongoStatusStore,
+                                           get_encoded_size)
+
+UUID = 'f1b40709-ca76-4554-b19f-277b2f8d5d49'
+
+RESULT = {'segments': ['speaker_{0}'.format(index) for index in range(100)]}
+
+MAX_RESULT_SIZE = 100
+
+
+class TestMemoryStatusStore(unittest.TestCase):
+    """
+    Results of the memory status store.
+    """
+    def make_store(self):
+        store = MemoryStatusStore(MAX_RESULT_SIZE)
+        store.set(UUID, 'SUCCESS', RESULT)
+        return store
+
+    def test_bounded(self):
+        self.assertEqual(self.make_store().get(UUID)['result'],
+                         {'truncated': True,
+                          'size': get_encoded_size(RESULT)})
+
+    def test_whole(self):
+        store = self.make_store()
+        self.assertEqual(store.get(UUID, bounded=False)['result'], RESULT)
+        self.assertEqual(store.get_many([UUID], bounded=False)[UUID]['result'],
+                         RESULT)
+
+    def test_bound(self):
+        store = self.make_store()
+        self.assertEqual(store.bound(RESULT), store.get(UUID)['result'])
+        self.assertEqual(store.bound([1, 2]), [1, 2])
+        self.assertEqual(MemoryStatusStore().bound(RESULT), RESULT)
+
+
+class TestMongoStatusStore(TestMemoryStatusStore):
+    """
+    Results of the mongo status store.
+    """
+    def make_store(self):
+        database = mongomock.MongoClient().db
+        database.celery_taskmeta.insert_one({'_id': UUID,
+                                             'status': 'SUCCESS',
+                                             'result': RESULT})
+        return MongoStatusStore(lambda: database, 'celery_taskmeta', None,
+                                MAX_RESULT_SIZE)
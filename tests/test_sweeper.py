@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+"""
+Tests of the sweeps of the request records of unfinished tasks.
+"""
+
+# -- Standard lib ------------------------------------------------------------
+import datetime
+import unittest
+
+# -- 3rd party ---------------------------------------------------------------
+import mongomock
+
+# -- Project specific --------------------------------------------------------
+from VestaRestPackage.request_records import open_records
+from VestaRestPackage.sweeper import Sweeper
+
+SETTINGS = {'ENABLED': True,
+            'IN_GATEWAY': False,
+            'INTERVAL': 60,
+            'BATCH_SIZE': 2,
+            'ORPHAN_AGE': 3600,
+            'REVOKE_ORPHANS': True}
+
+HORIZON = 7200
+
+UUIDS = ['f1b40709-ca76-4554-b19f-277b2f8d5d49',
+         '0b5e1a39-9b83-4a0c-9d4b-0e8c2f6f2e11',
+         '5c1f3e0a-7d2b-4a8e-9f10-3b6c2d4e5f60',
+         'a3d4e5f6-0718-4293-a4b5-c6d7e8f90a1b',
+         '2e4f6a8c-1b3d-4f5a-8c7e-9d0b1a2c3e4f']
+
+
+class TestSweeper(unittest.TestCase):
+    """
+    Sweeps with both request record layouts.
+    """
+    layout = 'legacy'
+
+    def setUp(self):
+        self.records = open_records(mongomock.MongoClient().db.Requests,
+                                    self.layout)
+        self.states = {}
+        self.read = []
+        self.revoked = []
+        self.sweeper = Sweeper(lambda: self.records,
+                               self.get_states,
+                               self.revoked.append,
+                               SETTINGS,
+                               horizon=HORIZON)
+
+    def get_states(self, records):
+        self.read.extend(data['uuid'] for data in records)
+        return dict((data['uuid'], self.states[data['uuid']])
+                    for data in records)
+
+    def submit(self, uuid, age, status='PENDING', activity=False):
+        self.records.insert(uuid,
+                            service='my_service',
+                            datetime=datetime.datetime.utcnow() -
+                            datetime.timedelta(seconds=age),
+                            activity=activity)
+        self.states[uuid] = {'uuid': uuid, 'status': status, 'result': None}
+
+    def test_sweep(self):
+        self.submit(UUIDS[0], 10, 'SUCCESS')
+        self.submit(UUIDS[1], 10, 'PROGRESS')
+        self.submit(UUIDS[2], 10)
+        self.submit(UUIDS[3], 5000)
+        self.sweeper.sweep()
+
+        # Started tasks are scanned again with their activity flag on
+        self.assertEqual(sorted(set(self.read)), sorted(UUIDS[:4]))
+        self.assertEqual(self.records.find(UUIDS[0])['final_status'],
+                         'SUCCESS')
+        self.assertTrue(self.records.find(UUIDS[1])['activity'])
+        self.assertNotIn('final_status', self.records.find(UUIDS[1]))
+        self.assertNotIn('final_status', self.records.find(UUIDS[2]))
+        # Orphaned task
+        self.assertEqual(self.records.find(UUIDS[3])['final_status'],
+                         'EXPIRED')
+        self.assertEqual(self.revoked, [UUIDS[3]])
+
+    def test_finished_not_scanned(self):
+        self.submit(UUIDS[0], 10, 'SUCCESS')
+        self.sweeper.sweep()
+        del self.read[:]
+        self.sweeper.sweep()
+        self.assertEqual(self.read, [])
+
+    def test_past_horizon(self):
+        self.submit(UUIDS[0], 10)
+        self.submit(UUIDS[1], HORIZON + 10)
+        self.submit(UUIDS[2], HORIZON + 10, 'SUCCESS', activity=True)
+        self.assertEqual(self.sweeper.expire_records(), 2)
+        self.sweeper.sweep()
+
+        # Records past the horizon are expired without reading their state
+        self.assertEqual(self.read, [UUIDS[0]])
+        for uuid in UUIDS[1:3]:
+            self.assertEqual(self.records.find(uuid)['final_status'],
+                             'EXPIRED')
+        self.assertEqual(self.revoked, [])
+
+    def test_no_horizon(self):
+        self.sweeper.horizon = None
+        self.submit(UUIDS[0], HORIZON + 10, 'SUCCESS')
+        self.assertEqual(self.sweeper.expire_records(), 0)
+        self.sweeper.sweep()
+        self.assertEqual(self.records.find(UUIDS[0])['final_status'],
+                         'SUCCESS')
+
+    def test_same_datetime(self):
+        now = datetime.datetime.utcnow()
+        for uuid in UUIDS:
+            self.records.insert(uuid, service='my_service', datetime=now,
+                                activity=False)
+            self.states[uuid] = {'uuid': uuid, 'status': 'SUCCESS',
+                                 'result': None}
+        self.sweeper.sweep()
+        self.assertEqual(sorted(self.read), sorted(UUIDS))
+
+
+class TestCompactSweeper(TestSweeper):
+    """
+    Sweeps with the compact request record layout.
+    """
+    layout = 'compact'